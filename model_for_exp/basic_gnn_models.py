@@ -3,6 +3,10 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch_geometric.nn import LGConv, GCNConv, SAGEConv
 
+def is_sparse_adjacency(graph) -> bool:
+    """True for a normalized sparse adjacency (GraphBuilder.build_normalized_adjacency), False for an edge_index"""
+    return graph.layout != torch.strided
+
 class LightGCNRecommender(nn.Module):
     """LightGCN: Simplified GCN for recommendation"""
     def __init__(self, num_users: int, num_items: int, embedding_dim: int, num_layers: int = 3):
@@ -24,18 +28,32 @@ class LightGCNRecommender(nn.Module):
     def forward(self, edge_index):
         # Get initial embeddings
         x = torch.cat([self.user_embedding.weight, self.item_embedding.weight], dim=0)
+        x = self._propagate(x, edge_index)
         
+        users, items = x[:self.num_users], x[self.num_users:]
+        return users, items
+
+    def forward_subgraph(self, n_id, adjacency):
+        """Propagate over a sampled computation subgraph and return the embeddings of its nodes (ordered as n_id)"""
+        is_user = n_id < self.num_users
+        x = self.user_embedding.weight.new_empty((n_id.size(0), self.user_embedding.embedding_dim))
+        x[is_user] = self.user_embedding(n_id[is_user])
+        x[~is_user] = self.item_embedding(n_id[~is_user] - self.num_users)
+        return self._propagate(x, adjacency)
+
+    def _propagate(self, x, edge_index):
         # Multi-layer propagation
         all_embeddings = [x]
         for _ in range(self.num_layers):
-            x = self.conv(x, edge_index)
+            # edge_index may be the 'sym' normalized sparse adjacency: one SpMM per layer
+            if is_sparse_adjacency(edge_index):
+                x = edge_index @ x
+            else:
+                x = self.conv(x, edge_index)
             all_embeddings.append(x)
         
         # Average all layers
-        x = torch.stack(all_embeddings, dim=0).mean(dim=0)
-        
-        users, items = x[:self.num_users], x[self.num_users:]
-        return users, items
+        return torch.stack(all_embeddings, dim=0).mean(dim=0)
 
 class GCNRecommender(nn.Module):
     """Graph Convolutional Network for recommendation"""
@@ -48,7 +66,13 @@ class GCNRecommender(nn.Module):
         
     def forward(self, x, edge_index):
         for i, conv in enumerate(self.convs):
-            x = conv(x, edge_index)
+            if is_sparse_adjacency(edge_index):
+                # Precomputed 'sym' adjacency with self loops: same as GCNConv without renormalizing
+                x = edge_index @ conv.lin(x)
+                if conv.bias is not None:
+                    x = x + conv.bias
+            else:
+                x = conv(x, edge_index)
             if i < len(self.convs) - 1:
                 x = F.relu(x)
                 x = F.dropout(x, p=0.5, training=self.training)
@@ -65,7 +89,11 @@ class GraphSAGERecommender(nn.Module):
     
     def forward(self, x, edge_index):
         for i, conv in enumerate(self.convs):
-            x = conv(x, edge_index)
+            if is_sparse_adjacency(edge_index):
+                # Precomputed 'mean' adjacency: SAGEConv = lin_l(mean of neighbours) + lin_r(x)
+                x = conv.lin_l(edge_index @ x) + conv.lin_r(x)
+            else:
+                x = conv(x, edge_index)
             if i < len(self.convs) - 1:
                 x = F.relu(x)
                 x = F.dropout(x, p=0.5, training=self.training)
@@ -21,6 +21,8 @@ class GraphBuilder:
 		self.num_enrollments = len(data['enrollments'])
 
 		self.unenrolled_rate = unenrolled_rate
+		# Normalized sparse adjacencies keyed by (normalization, add_self_loops); see get_normalized_adjacency
+		self._adjacency_cache = {}
 
 	def build_visualization_graph(self, include_will_enroll: bool = True,
 				 is_save_gexf: bool = True, built_graph_filepath_prefix: str = './data/built-graph') -> nx.Graph:
@@ -209,6 +211,57 @@ class GraphBuilder:
 		graph.num_courses = self.num_courses
 		return graph
 
+	@staticmethod
+	def build_normalized_adjacency(edge_index: torch.Tensor, num_nodes: int, normalization: str = 'sym',
+								   add_self_loops: bool = False) -> torch.Tensor:
+		"""
+		Build a normalized sparse adjacency so that one propagation step is `adj @ x`.
+		Rows are destination nodes and columns are sources. Duplicate edges are merged
+		into a single entry holding their count, so degrees and sums are the same as
+		message passing over the raw edge_index.
+		Args:
+			edge_index: LongTensor of shape (2, E) with (source, destination) rows
+			num_nodes: total number of nodes in the graph
+			normalization: 'sym' for D^-1/2 A D^-1/2 (LGConv, GCNConv) or 'mean' for D^-1 A (SAGEConv mean aggregation)
+			add_self_loops: add a self loop to every node that has none before normalizing (GCNConv)
+		Returns:
+			torch sparse CSR tensor of shape (num_nodes, num_nodes)
+		"""
+		src, dst = edge_index[0].long(), edge_index[1].long()
+		if add_self_loops:
+			has_loop = torch.zeros(num_nodes, dtype=torch.bool)
+			has_loop[src[src == dst]] = True
+			missing = torch.nonzero(~has_loop).view(-1)
+			src = torch.cat([src, missing])
+			dst = torch.cat([dst, missing])
+		adj = torch.sparse_coo_tensor(torch.stack([dst, src]), torch.ones(src.size(0)), (num_nodes, num_nodes)).coalesce()
+		rows, cols = adj.indices()
+		values = adj.values()
+		deg = torch.zeros(num_nodes).index_add_(0, rows, values)
+		if normalization == 'sym':
+			deg_inv_sqrt = deg.pow(-0.5)
+			deg_inv_sqrt[torch.isinf(deg_inv_sqrt)] = 0.0
+			values = deg_inv_sqrt[rows] * values * deg_inv_sqrt[cols]
+		elif normalization == 'mean':
+			values = values / deg.clamp(min=1.0)[rows]
+		else:
+			raise ValueError(f"Unknown normalization: {normalization}")
+		return torch.sparse_coo_tensor(adj.indices(), values, (num_nodes, num_nodes)).coalesce().to_sparse_csr()
+
+	def get_normalized_adjacency(self, edge_index: torch.Tensor, normalization: str = 'sym',
+								 add_self_loops: bool = False) -> torch.Tensor:
+		"""
+		Cached build_normalized_adjacency over this builder's nodes (students first, then courses).
+		The adjacency is rebuilt only when a different edge_index tensor is passed in.
+		"""
+		key = (normalization, add_self_loops)
+		cached = self._adjacency_cache.get(key)
+		if cached is None or cached[0] is not edge_index:
+			num_nodes = self.num_students + self.num_courses
+			cached = (edge_index, GraphBuilder.build_normalized_adjacency(edge_index, num_nodes, normalization, add_self_loops))
+			self._adjacency_cache[key] = cached
+		return cached[1]
+
 	@staticmethod
 	def get_subgraph_for_students(G: nx.Graph, student_ids, radius: int = 1) -> nx.Graph:
 		"""
@@ -4,9 +4,14 @@ from graph_builder import GraphBuilder
 from data_preprocessor import DataPreprocessor
 from data_loader import DataLoader
 from model import CourseRecommendationModel
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import io
 import time
 import os
 import json
+import torch
+import torch.multiprocessing
 
 # Get the directory of the current Python file (e.g., main.py)
 BASE_DIR = Path(__file__).resolve().parent
@@ -93,6 +98,11 @@ EMBEDDING_DIM = config.get('EMBEDDING_DIM', 128)
 NUM_LAYERS = config.get('NUM_LAYERS', 5)
 EVAL_INTERVAL = config.get('EVAL_INTERVAL', 10)
 TOP_K = config.get('TOP_K', 10)
+# Neighbours sampled per hop for neighbour-sampled training on Amazon, one per layer; empty trains on the full graph
+NEIGHBOR_FANOUTS = config.get('NEIGHBOR_FANOUTS', [])
+# Train the models of a comparison concurrently in worker processes (0 workers: one per model)
+COMPARE_IN_PARALLEL = config.get('COMPARE_IN_PARALLEL', False)
+COMPARE_WORKERS = config.get('COMPARE_WORKERS', 0)
 
 # Runtime overrides: allow Kaggle notebook cells to set environment variables or write
 # a JSON file and point to it via RUNTIME_CONFIG_PATH. This lets users change
@@ -168,65 +178,140 @@ BATCH_SIZE = int(_get_override('BATCH_SIZE', BATCH_SIZE, int))
 EMBEDDING_DIM = int(_get_override('EMBEDDING_DIM', EMBEDDING_DIM, int))
 NUM_LAYERS = int(_get_override('NUM_LAYERS', NUM_LAYERS, int))
 K_LIST = _get_override('K_LIST', K_LIST, list)
+NEIGHBOR_FANOUTS = [int(f) for f in _get_override('NEIGHBOR_FANOUTS', NEIGHBOR_FANOUTS, list)]
+COMPARE_IN_PARALLEL = _get_override('COMPARE_IN_PARALLEL', COMPARE_IN_PARALLEL, bool)
+COMPARE_WORKERS = int(_get_override('COMPARE_WORKERS', COMPARE_WORKERS, int))
 
 
-# Helper to train & evaluate all models on a given preprocessed dataset
-def run_models_on_preprocessed(preprocessed_dataset: dict, dataset_name: str = 'dataset'):
-    results = {}
-    print(f"\n[4] Running models on preprocessed '{dataset_name}' dataset...")
-    for model_type in MODEL_LIST:
-        print(f"\n--- Model: {model_type} on {dataset_name} ---")
-        model_filepath = TRAINED_MODEL_FILEPATH.replace('.pth', f'_{model_type}_{dataset_name}.pth')
-
-        model = CourseRecommendationModel(data=preprocessed_dataset, embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS,
-                                            using_unenrolled_for_test=True, unenrolled_rate_in_graph=0.0,
-                                            test_split=TEST_SPLIT, valid_split=VALID_SPLIT, model_type=model_type)
-
-        # Decide evaluation ks for Amazon runs. If the sample rates are the small
-        # quick-test defaults (0.1, 0.1), include @20 and @40 in evaluation.
-        if AMAZON_SAMPLE_USER_RATE == 0.1 and AMAZON_SAMPLE_ITEM_RATE == 0.1:
-            ks_for_amazon = sorted(set(K_LIST + [20, 40]))
-        else:
-            ks_for_amazon = K_LIST
-
-        start_time = time.time()
-        if IS_TRAIN_MODEL:
+def _evaluation_ks() -> list:
+    # Decide evaluation ks for Amazon runs. If the sample rates are the small
+    # quick-test defaults (0.1, 0.1), include @20 and @40 in evaluation.
+    if AMAZON_SAMPLE_USER_RATE == 0.1 and AMAZON_SAMPLE_ITEM_RATE == 0.1:
+        return sorted(set(K_LIST + [20, 40]))
+    return K_LIST
+
+
+def _train_and_evaluate(data: dict, shared_data: dict, dataset_name: str, model_type: str, ks: list,
+                        neighbor_fanouts: list = None):
+    """Train (or load) and evaluate one model on the shared graph and splits; returns (results or None, seconds)"""
+    model_start_time = time.time()
+    print(f"\n--- Model: {model_type} on {dataset_name} ---")
+    model_filepath = TRAINED_MODEL_FILEPATH.replace('.pth', f'_{model_type}_{dataset_name}.pth')
+
+    model = CourseRecommendationModel(data=data, embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS,
+                                        using_unenrolled_for_test=True, unenrolled_rate_in_graph=0.0,
+                                        test_split=TEST_SPLIT, valid_split=VALID_SPLIT, model_type=model_type,
+                                        shared_data=shared_data)
+
+    # Neighbour sampling keeps step time independent of the graph size (KGAT always trains full-graph)
+    neighbor_fanouts = neighbor_fanouts if neighbor_fanouts and model_type != 'kgat' else None
+
+    start_time = time.time()
+    if IS_TRAIN_MODEL:
+        model.train(num_epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
+                    num_negative=NUM_NEGATIVE,
+                    is_eval_during_training=False, ks=ks,
+                    is_save_model=True, filepath=model_filepath,
+                    early_stopping_patience=EARLY_STOPPING_PATIENCE,
+                    early_stopping_min_delta=EARLY_STOPPING_MIN_DELTA,
+                    use_early_stopping=USE_EARLY_STOPPING,
+                    neighbor_fanouts=neighbor_fanouts)
+    else:
+        try:
+            model.load_model(model_filepath)
+            print(f"Loaded model from '{model_filepath}'")
+        except Exception:
+            print(f"Could not load model from '{model_filepath}' — training instead.")
             model.train(num_epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
                         num_negative=NUM_NEGATIVE,
-                        is_eval_during_training=False, ks=ks_for_amazon,
+                        is_eval_during_training=False, ks=ks,
                         is_save_model=True, filepath=model_filepath,
                         early_stopping_patience=EARLY_STOPPING_PATIENCE,
                         early_stopping_min_delta=EARLY_STOPPING_MIN_DELTA,
-                        use_early_stopping=USE_EARLY_STOPPING)
-        else:
-            try:
-                model.load_model(model_filepath)
-                print(f"Loaded model from '{model_filepath}'")
-            except Exception:
-                print(f"Could not load model from '{model_filepath}' — training instead.")
-                model.train(num_epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
-                            num_negative=NUM_NEGATIVE,
-                            is_eval_during_training=False, ks=K_LIST,
-                            is_save_model=True, filepath=model_filepath,
-                            early_stopping_patience=EARLY_STOPPING_PATIENCE,
-                            early_stopping_min_delta=EARLY_STOPPING_MIN_DELTA,
-                            use_early_stopping=USE_EARLY_STOPPING)
-        train_time = time.time() - start_time
-
-        if IS_EVAL_MODEL:
-            evaluation = model.evaluate(ks=ks_for_amazon)
-            # Normalize keys to consistent naming for printing
-            model_result = {'mrr': evaluation.get('mrr', 0.0)}
-            for k in ks_for_amazon:
-                model_result[f'hit@{k}'] = evaluation.get(f'hit@{k}', 0.0)
-                model_result[f'recall@{k}'] = evaluation.get(f'recall@{k}', 0.0)
-                model_result[f'ndcg@{k}'] = evaluation.get(f'ndcg@{k}', 0.0)
-            model_result['train_time_sec'] = train_time
-            results[model_type] = model_result
-            print(f"  Results for {model_type} on {dataset_name}: MRR={model_result['mrr']:.4f}, time={train_time:.1f}s")
-            for k in ks_for_amazon:
-                print(f"    Hit@{k}: {model_result[f'hit@{k}']:.4f}, Recall@{k}: {model_result[f'recall@{k}']:.4f}, NDCG@{k}: {model_result[f'ndcg@{k}']:.4f}")
-    return results
+                        use_early_stopping=USE_EARLY_STOPPING,
+                        neighbor_fanouts=neighbor_fanouts)
+    train_time = time.time() - start_time
+
+    if not IS_EVAL_MODEL:
+        return None, time.time() - model_start_time
+    evaluation = model.evaluate(ks=ks)
+    # Normalize keys to consistent naming for printing
+    model_result = {'mrr': evaluation.get('mrr', 0.0)}
+    for k in ks:
+        model_result[f'hit@{k}'] = evaluation.get(f'hit@{k}', 0.0)
+        model_result[f'recall@{k}'] = evaluation.get(f'recall@{k}', 0.0)
+        model_result[f'ndcg@{k}'] = evaluation.get(f'ndcg@{k}', 0.0)
+    model_result['train_time_sec'] = train_time
+    print(f"  Results for {model_type} on {dataset_name}: MRR={model_result['mrr']:.4f}, time={train_time:.1f}s")
+    for k in ks:
+        print(f"    Hit@{k}: {model_result[f'hit@{k}']:.4f}, Recall@{k}: {model_result[f'recall@{k}']:.4f}, NDCG@{k}: {model_result[f'ndcg@{k}']:.4f}")
+    return model_result, time.time() - model_start_time
+
+
+# Dataset and shared data of the comparison, set once per worker process by _init_comparison_worker
+_worker_comparison = None
+
+
+def _init_comparison_worker(data: dict, shared_data: dict, threads: int):
+    global _worker_comparison
+    torch.set_num_threads(threads)
+    _worker_comparison = (data, shared_data)
+
+
+def _train_and_evaluate_in_worker(dataset_name: str, model_type: str, ks: list, neighbor_fanouts: list):
+    """_train_and_evaluate in a worker process; its output is returned so the parent prints each model's log whole"""
+    data, shared_data = _worker_comparison
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = _train_and_evaluate(data, shared_data, dataset_name, model_type, ks, neighbor_fanouts)
+    return result, log.getvalue()
+
+
+def compare_models(data: dict, dataset_name: str, ks: list, neighbor_fanouts: list = None) -> dict:
+    """Train and evaluate every model of MODEL_LIST on data; returns {model_type: results}
+
+    The graph, splits and positive-item index are built once and shared
+    read-only by all models. With COMPARE_IN_PARALLEL the models run at the same
+    time in spawned worker processes, each with an equal share of the cores:
+    the shared tensors reach the workers through shared memory, so a comparison
+    takes about as long as its slowest model instead of the sum of all of them.
+    """
+    start_time = time.time()
+    shared_data = CourseRecommendationModel.build_shared_data(
+        data, using_unenrolled_for_test=True, unenrolled_rate_in_graph=0.0,
+        test_split=TEST_SPLIT, valid_split=VALID_SPLIT)
+    print(f"  Built shared graph and splits in {time.time() - start_time:.1f}s "
+          f"({shared_data['graph'].num_edges} edges, {len(shared_data['train_samples'])} train pairs)")
+
+    outcomes = {}
+    workers = min(COMPARE_WORKERS or len(MODEL_LIST), len(MODEL_LIST))
+    if COMPARE_IN_PARALLEL and workers > 1:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"  Running {len(MODEL_LIST)} models in {workers} worker processes x {threads} thread(s)")
+        # spawn: forked workers would inherit the parent's torch thread pools
+        with ProcessPoolExecutor(max_workers=workers, mp_context=torch.multiprocessing.get_context('spawn'),
+                                 initializer=_init_comparison_worker,
+                                 initargs=(data, shared_data, threads)) as pool:
+            futures = {pool.submit(_train_and_evaluate_in_worker, dataset_name, model_type, ks,
+                                   neighbor_fanouts): model_type for model_type in MODEL_LIST}
+            for future in as_completed(futures):
+                outcomes[futures[future]], log = future.result()
+                print(log, end='')
+    else:
+        for model_type in MODEL_LIST:
+            outcomes[model_type] = _train_and_evaluate(data, shared_data, dataset_name, model_type, ks,
+                                                       neighbor_fanouts)
+
+    model_seconds = sum(seconds for _, seconds in outcomes.values())
+    print(f"\n  Compared {len(MODEL_LIST)} models on {dataset_name} in {time.time() - start_time:.1f}s "
+          f"(sum of model times {model_seconds:.1f}s)")
+    return {model_type: outcomes[model_type][0] for model_type in MODEL_LIST if outcomes[model_type][0] is not None}
+
+
+# Helper to train & evaluate all models on a given preprocessed dataset
+def run_models_on_preprocessed(preprocessed_dataset: dict, dataset_name: str = 'dataset'):
+    print(f"\n[4] Running models on preprocessed '{dataset_name}' dataset...")
+    return compare_models(preprocessed_dataset, dataset_name, _evaluation_ks())
 
 
 def sample_amazon_dataset(amazon_data: dict, user_rate: float = 1.0, item_rate: float = 1.0, seed: int = 36) -> dict:
@@ -277,90 +362,36 @@ def sample_amazon_dataset(amazon_data: dict, user_rate: float = 1.0, item_rate:
 
 # Helper to train & evaluate all models on Amazon dataset
 def run_models_on_amazon(amazon_dataset: dict, dataset_name: str = 'amazon'):
-    results = {}
     print(f"\n[Amazon] Running models on Amazon Books dataset...")
     print(f"  - Users: {amazon_dataset['num_users']}")
     print(f"  - Items: {amazon_dataset['num_items']}")
     print(f"  - Train interactions: {amazon_dataset['train_matrix'].nnz}")
     print(f"  - Test interactions: {amazon_dataset['test_matrix'].nnz}")
-    # Decide evaluation ks for Amazon runs. If the sample rates are the small
-    # quick-test defaults (0.1, 0.1), include @20 and @40 in evaluation.
-    if AMAZON_SAMPLE_USER_RATE == 0.1 and AMAZON_SAMPLE_ITEM_RATE == 0.1:
-        ks_for_amazon = sorted(set(K_LIST + [20, 40]))
-    else:
-        ks_for_amazon = K_LIST
-    
-    for model_type in MODEL_LIST:
-        print(f"\n--- Model: {model_type} on {dataset_name} ---")
-        model_filepath = TRAINED_MODEL_FILEPATH.replace('.pth', f'_{model_type}_{dataset_name}.pth')
-
-        # Some models (GCN, GraphSAGE) require node features. The Amazon dataset
-        # only contains interaction matrices; generate simple numeric features
-        # (log-degree) on-the-fly for quick testing if they are missing.
-        local_data = dict(amazon_dataset)  # shallow copy
-        if model_type in ['gcn', 'graphsage']:
-            if 'student_features' not in local_data or 'course_features' not in local_data:
-                try:
-                    import numpy as _np
-                    train_mat = amazon_dataset['train_matrix'].tocsr()
-                    # user degrees (number of interactions per user)
-                    user_deg = _np.asarray(train_mat.sum(axis=1)).reshape(-1)
-                    item_deg = _np.asarray(train_mat.sum(axis=0)).reshape(-1)
-                    # use log1p to compress large counts and cast to float32
-                    user_feat = _np.log1p(user_deg).astype(_np.float32).reshape(-1, 1)
-                    item_feat = _np.log1p(item_deg).astype(_np.float32).reshape(-1, 1)
-                    local_data['student_features'] = user_feat
-                    local_data['course_features'] = item_feat
-                    print(f"  → Generated simple features for model '{model_type}' (student/item dims: {user_feat.shape[1]}/{item_feat.shape[1]})")
-                except Exception as _e:
-                    print(f"  ! Failed to generate fallback features for '{model_type}': {_e}")
-                    raise
-
-        model = CourseRecommendationModel(data=local_data, embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS,
-                                            using_unenrolled_for_test=True, unenrolled_rate_in_graph=0.0,
-                                            test_split=TEST_SPLIT, valid_split=VALID_SPLIT, model_type=model_type)
-
-        start_time = time.time()
-        if IS_TRAIN_MODEL:
-            model.train(num_epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
-                        num_negative=NUM_NEGATIVE,
-                        is_eval_during_training=False, ks=ks_for_amazon,
-                        is_save_model=True, filepath=model_filepath,
-                        early_stopping_patience=EARLY_STOPPING_PATIENCE,
-                        early_stopping_min_delta=EARLY_STOPPING_MIN_DELTA,
-                        use_early_stopping=USE_EARLY_STOPPING)
-        else:
-            try:
-                model.load_model(model_filepath)
-                print(f"Loaded model from '{model_filepath}'")
-            except Exception:
-                print(f"Could not load model from '{model_filepath}' — training instead.")
-                model.train(num_epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
-                            num_negative=NUM_NEGATIVE,
-                            is_eval_during_training=False, ks=ks_for_amazon,
-                            is_save_model=True, filepath=model_filepath,
-                            early_stopping_patience=EARLY_STOPPING_PATIENCE,
-                            early_stopping_min_delta=EARLY_STOPPING_MIN_DELTA,
-                            use_early_stopping=USE_EARLY_STOPPING)
-
-        train_time = time.time() - start_time
-
-        if IS_EVAL_MODEL:
-            evaluation = model.evaluate(ks=ks_for_amazon)
-            # Normalize keys to consistent naming for printing
-            model_result = {
-                'mrr': evaluation.get('mrr', 0.0),
-            }
-            for k in ks_for_amazon:
-                model_result[f'hit@{k}'] = evaluation.get(f'hit@{k}', 0.0)
-                model_result[f'recall@{k}'] = evaluation.get(f'recall@{k}', 0.0)
-                model_result[f'ndcg@{k}'] = evaluation.get(f'ndcg@{k}', 0.0)
-            model_result['train_time_sec'] = train_time
-            results[model_type] = model_result
-            print(f"  Results for {model_type} on {dataset_name}: MRR={model_result['mrr']:.4f}, time={train_time:.1f}s")
-            for k in ks_for_amazon:
-                print(f"    Hit@{k}: {model_result[f'hit@{k}']:.4f}, Recall@{k}: {model_result[f'recall@{k}']:.4f}, NDCG@{k}: {model_result[f'ndcg@{k}']:.4f}")
-    return results
+
+    # Some models (GCN, GraphSAGE) require node features. The Amazon dataset
+    # only contains interaction matrices; generate simple numeric features
+    # (log-degree) once for quick testing if they are missing. Models without
+    # features ignore them.
+    local_data = dict(amazon_dataset)  # shallow copy
+    feature_models = [model_type for model_type in MODEL_LIST if model_type in ['gcn', 'graphsage']]
+    if feature_models and ('student_features' not in local_data or 'course_features' not in local_data):
+        try:
+            import numpy as _np
+            train_mat = amazon_dataset['train_matrix'].tocsr()
+            # user degrees (number of interactions per user)
+            user_deg = _np.asarray(train_mat.sum(axis=1)).reshape(-1)
+            item_deg = _np.asarray(train_mat.sum(axis=0)).reshape(-1)
+            # use log1p to compress large counts and cast to float32
+            user_feat = _np.log1p(user_deg).astype(_np.float32).reshape(-1, 1)
+            item_feat = _np.log1p(item_deg).astype(_np.float32).reshape(-1, 1)
+            local_data['student_features'] = user_feat
+            local_data['course_features'] = item_feat
+            print(f"  → Generated simple features for {feature_models} (student/item dims: {user_feat.shape[1]}/{item_feat.shape[1]})")
+        except Exception as _e:
+            print(f"  ! Failed to generate fallback features for {feature_models}: {_e}")
+            raise
+
+    return compare_models(local_data, dataset_name, _evaluation_ks(), neighbor_fanouts=NEIGHBOR_FANOUTS)
 
 def main():  
     # Step 1: Generate dataset if needed
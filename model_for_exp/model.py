@@ -1,6 +1,9 @@
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
+import math
 import torch
+import torch.distributed as dist
 from collections import defaultdict
+from functools import partial
 from sklearn.model_selection import train_test_split
 import numpy as np
 import json
@@ -10,12 +13,20 @@ from torch_geometric.data import Data, HeteroData
 
 from graph_builder import GraphBuilder
 from basic_gnn_models import LightGCNRecommender, GCNRecommender, GraphSAGERecommender, KGATRecommender
+from batch_producer import BatchProducer
+from neighbor_sampler import NeighborSampler, SampledSubgraph
 
 class CourseRecommendationModel:
     """Main recommendation system with multiple model support"""
+    # Attributes derived from the data alone, identical for every model type
+    _SHARED_ATTRIBUTES = ('graph_builder', 'graph', 'students_by_id', 'course_semesters', 'train_samples',
+                          'valid_samples', 'test_samples', 'user_positive_items', 'positive_keys',
+                          'saturated_users')
+
     def __init__(self, data: Dict, embedding_dim: int = 64, num_layers: int = 3,
                  using_unenrolled_for_test: bool = False, unenrolled_rate_in_graph: float = 0.0,
-                 test_split: float = 0.2, valid_split: float = 0.1, model_type: str = 'lightgcn'):
+                 test_split: float = 0.2, valid_split: float = 0.1, model_type: str = 'lightgcn',
+                 sparse_propagation: bool = True, shared_data: Optional[Dict] = None):
         """
         Args:
             data: Course dataset
@@ -26,6 +37,10 @@ class CourseRecommendationModel:
             test_split: Proportion of data to use for testing
             valid_split: Proportion of data to use for validation
             model_type: Type of GNN model to use ('lightgcn', 'gcn', 'graphsage', 'kgat')
+            sparse_propagation: Propagate with a cached normalized sparse adjacency (SpMM)
+                instead of message passing over edge_index (not used by KGAT)
+            shared_data: Graph, splits and positive-item index from build_shared_data() for the
+                same data and split settings; reused read-only instead of being rebuilt
         """
         self.data = data
         self.embedding_dim = embedding_dim
@@ -38,31 +53,84 @@ class CourseRecommendationModel:
         self.test_split = test_split
         self.valid_split = valid_split
         self.model_type = model_type
+        self.sparse_propagation = sparse_propagation
         
         # Determine if features are needed based on model type
         self.use_features = model_type in ['gcn', 'graphsage']
         
-        # Build graph
-        self.graph_builder = GraphBuilder(data, self.unenrolled_rate_in_graph)
-        self.graph = self.graph_builder.build_homogeneous_graph(use_features=self.use_features) # for LightGCN, GCN
-        # self.graph = self.graph_builder.build_heterogeneous_graph() # for KGAT, GraphSAGE
-
         self.num_students = len(data['students'])
         self.num_courses = len(data['courses'])
+        if shared_data is None:
+            self._build_data(use_features=self.use_features)
+        else:
+            self._adopt_shared_data(shared_data)
         
         # Build model
         self.model = self._build_model()
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
-        
+
+    @classmethod
+    def build_shared_data(cls, data: Dict, using_unenrolled_for_test: bool = False,
+                          unenrolled_rate_in_graph: float = 0.0, test_split: float = 0.2,
+                          valid_split: float = 0.1) -> Dict:
+        """Build the graph, splits and positive-item index of data once, for every model compared on it
+
+        Pass the result as shared_data to each CourseRecommendationModel built with
+        the same split settings. The graph carries the node features when data has
+        them, so one graph serves the feature models (GCN, GraphSAGE) and the
+        embedding models, which ignore x. Models only read the shared objects.
+        """
+        builder = cls.__new__(cls)
+        builder.data = data
+        builder.using_unenrolled_for_test = using_unenrolled_for_test
+        builder.unenrolled_rate_in_graph = builder.unenrolled_rate = unenrolled_rate_in_graph
+        builder.test_split = test_split
+        builder.valid_split = valid_split
+        builder.num_students = len(data['students'])
+        builder.num_courses = len(data['courses'])
+        has_features = 'student_features' in data and 'course_features' in data
+        builder._build_data(use_features=has_features)
+        # Read-only from here on: a model writing to it would change every other model's data
+        builder.positive_keys.setflags(write=False)
+        shared_data = {name: getattr(builder, name) for name in cls._SHARED_ATTRIBUTES}
+        shared_data['settings'] = builder._split_settings()
+        shared_data['has_features'] = has_features
+        return shared_data
+
+    def _build_data(self, use_features: bool):
+        """Build the graph, the id lookups and the train/validation/test split"""
+        self.graph_builder = GraphBuilder(self.data, self.unenrolled_rate_in_graph)
+        self.graph = self.graph_builder.build_homogeneous_graph(use_features=use_features) # for LightGCN, GCN
+        # self.graph = self.graph_builder.build_heterogeneous_graph() # for KGAT, GraphSAGE
+
+        # O(1) record lookup by dense id instead of scanning the dataset lists
+        self.students_by_id = {s['student_id']: s for s in self.data['students']}
+        # Amazon courses carry no semester; 0 is never later than a student's semester
+        self.course_semesters = torch.LongTensor([c.get('semester', 0) for c in sorted(self.data['courses'], key=lambda c: c['course_id'])])
+
         # Prepare training data
         self._prepare_training_data()
 
+    def _split_settings(self) -> Tuple:
+        return (self.using_unenrolled_for_test, self.unenrolled_rate_in_graph, self.test_split, self.valid_split)
+
+    def _adopt_shared_data(self, shared_data: Dict):
+        """Reference the objects of build_shared_data() instead of building them"""
+        if shared_data['settings'] != self._split_settings():
+            raise ValueError(f"shared_data was built with split settings {shared_data['settings']}, "
+                             f"this model uses {self._split_settings()}")
+        if self.use_features and not shared_data['has_features']:
+            raise ValueError("Preprocessed data with 'student_features' and 'course_features' is required when use_features=True")
+        for name in self._SHARED_ATTRIBUTES:
+            setattr(self, name, shared_data[name])
+        self.valid_negatives = None
+
     def train(self, num_epochs: int = 50, batch_size: int = 256,
             num_negative: int = 1,
             is_eval_during_training: bool = False, ks: List[int] = [1, 3, 10],
             is_save_model: bool = True, filepath: str = "./model/final_model_state.pth",
             early_stopping_patience: int = 10, early_stopping_min_delta: float = 0.0001,
-            use_early_stopping: bool = True):
+            use_early_stopping: bool = True, neighbor_fanouts: Optional[List[int]] = None):
         """Train the recommendation model.
 
         Args:
@@ -76,114 +144,155 @@ class CourseRecommendationModel:
             early_stopping_patience: Number of epochs to wait for improvement before stopping
             early_stopping_min_delta: Minimum change in validation loss to qualify as an improvement
             use_early_stopping: If True, enable early stopping based on validation loss; if False, train full epochs
+            neighbor_fanouts: Neighbours sampled per node at each hop, one entry per layer. When set, every
+                batch is propagated over a sampled computation subgraph around its users and items instead
+                of the full graph, so step time and memory depend on batch size rather than graph size
+                (not supported for KGAT). Validation and evaluation still use the full graph.
+
+        When torch.distributed is initialized (e.g. under torchrun), training is data-parallel:
+        every rank trains on its own shard of train_samples with batches of batch_size / world_size,
+        gradients are averaged with one all-reduce per step, and validation, early stopping and
+        the restore of the best weights happen on rank 0 and are broadcast to the other ranks.
         """
         best_val_loss = float('inf')
         best_model_state = None
         patience_counter = 0
         
-        for epoch in range(num_epochs):
-            self.model.train(mode=True)
-
-            total_loss = 0
-            num_batches = 0
+        # Draw validation negatives once for this run (see _validation_negatives)
+        self.valid_negatives = None
+
+        world_size, rank = (dist.get_world_size(), dist.get_rank()) if dist.is_initialized() else (1, 0)
+        train_samples = self.train_samples
+        if world_size > 1:
+            self._broadcast_parameters()
+            # Equal-sized shards keep the number of steps, and so the collectives, identical on every rank.
+            # Like DistributedSampler, the samples are padded by wrapping around to a multiple of world_size
+            # so none are dropped, and rank r takes every world_size-th sample starting at r
+            shard_size = math.ceil(len(train_samples) / world_size)
+            indices = torch.arange(shard_size * world_size) % len(train_samples)
+            train_samples = train_samples[indices[rank::world_size]]
+            batch_size = math.ceil(batch_size / world_size)
+
+        neighbor_sampler = self._build_neighbor_sampler(neighbor_fanouts) if neighbor_fanouts else None
+        sample_subgraph = partial(self._sample_batch_subgraph, neighbor_sampler) if neighbor_sampler else None
+
+        with BatchProducer(train_samples, batch_size, num_negative, self._negative_sampling,
+                           num_epochs, shuffle=True, sample_subgraph=sample_subgraph) as producer:
+            for epoch in range(num_epochs):
+                self.model.train(mode=True)
+
+                total_loss = 0
+                num_batches = 0
             
-            # Shuffle training samples
-            train_samples = self.train_samples.copy()
-            np.random.shuffle(train_samples)
-            
-            for i in range(0, len(train_samples), batch_size):
-                batch = train_samples[i:i + batch_size]
-                user_ids = [s[0] for s in batch]
-                positive_items = [s[1] for s in batch]
-                
-                # Negative sampling
-                negative_samples = self._negative_sampling(user_ids, num_negative)
-                negative_items = [s[1] for s in negative_samples]
+                # Batches are shuffled with randperm and negatives sampled by the producer thread,
+                # overlapping with the forward/backward pass of the previous batch
+                for batch in producer.epoch():
+                    user_ids, positive_items, negative_items = batch[:3]
+                    # Forward pass
+                    if neighbor_sampler is not None:
+                        users, positive_items_embedding, negative_items_embedding = \
+                            self._subgraph_batch_embeddings(batch[3], len(user_ids))
+                    elif self.model_type in ['lightgcn', 'kgat']:
+                        user_embedding, item_embedding = self.model(self._propagation_graph())
+                        users = user_embedding[user_ids]
+                        positive_items_embedding = item_embedding[positive_items]
+                        negative_items_embedding = item_embedding[negative_items]  
+                    else:  # GCN, GraphSAGE
+                        embeddings = self.model(self.graph.x, self._propagation_graph())
+                        users = embeddings[user_ids]
+                        positive_items_embedding = embeddings[positive_items + self.num_students]
+                        negative_items_embedding = embeddings[negative_items + self.num_students]
                 
-                # Forward pass
-                if self.model_type in ['lightgcn', 'kgat']:
-                    user_embedding, item_embedding = self.model(self.graph.edge_index)
-                    users = user_embedding[user_ids]
-                    positive_items_embedding = item_embedding[positive_items]
-                    negative_items_embedding = item_embedding[negative_items]  
-                else:  # GCN, GraphSAGE
-                    embeddings = self.model(self.graph.x, self.graph.edge_index)
-                    users = embeddings[user_ids]
-                    positive_items_embedding = embeddings[[p + self.num_students for p in positive_items]]
-                    negative_items_embedding = embeddings[[n + self.num_students for n in negative_items]]
-                
-                # BPR loss supporting multiple negatives per positive
-                # negative_items_embedding currently shape: (batch_size * num_negative, emb_dim)
-                # Reshape to (batch_size, num_negative, emb_dim) to align with users
-                if num_negative > 0:
-                    # Ensure we have the expected number of negatives
-                    expected = len(user_ids) * num_negative
-                    if negative_items_embedding.size(0) != expected:
-                        raise RuntimeError(
-                            f"Negative sampling size mismatch: got {negative_items_embedding.size(0)}, expected {expected}."
-                        )
-                    negative_items_embedding = negative_items_embedding.view(len(user_ids), num_negative, -1)
-                else:
-                    raise ValueError("num_negative must be >= 1")
-
-                # positive scores: (batch, 1)
-                positive_scores = (users * positive_items_embedding).sum(dim=1, keepdim=True)
-                # negative scores: (batch, num_negative)
-                negative_scores = (users.unsqueeze(1) * negative_items_embedding).sum(dim=2)
-                # BPR: average over all negatives
-                loss = -F.logsigmoid(positive_scores - negative_scores).mean()
+                    # BPR loss supporting multiple negatives per positive
+                    # negative_items_embedding currently shape: (batch_size * num_negative, emb_dim)
+                    # Reshape to (batch_size, num_negative, emb_dim) to align with users
+                    if num_negative > 0:
+                        # Ensure we have the expected number of negatives
+                        expected = len(user_ids) * num_negative
+                        if negative_items_embedding.size(0) != expected:
+                            raise RuntimeError(
+                                f"Negative sampling size mismatch: got {negative_items_embedding.size(0)}, expected {expected}."
+                            )
+                        negative_items_embedding = negative_items_embedding.view(len(user_ids), num_negative, -1)
+                    else:
+                        raise ValueError("num_negative must be >= 1")
+
+                    # positive scores: (batch, 1)
+                    positive_scores = (users * positive_items_embedding).sum(dim=1, keepdim=True)
+                    # negative scores: (batch, num_negative)
+                    negative_scores = (users.unsqueeze(1) * negative_items_embedding).sum(dim=2)
+                    # BPR: average over all negatives
+                    loss = -F.logsigmoid(positive_scores - negative_scores).mean()
                 
-                # Backward pass
-                self.optimizer.zero_grad()
-                loss.backward()
-                self.optimizer.step()
+                    # Backward pass
+                    self.optimizer.zero_grad()
+                    loss.backward()
+                    if world_size > 1:
+                        self._all_reduce_gradients(world_size)
+                    self.optimizer.step()
                 
-                total_loss += loss.item()
-                num_batches += 1
-            train_loss = total_loss / num_batches
+                    total_loss += loss.item()
+                    num_batches += 1
+                train_loss = total_loss / num_batches
             
-            # Compute validation loss for early stopping or for evaluation prints
-            if use_early_stopping or is_eval_during_training:
-                val_loss = self._compute_validation_loss(batch_size, num_negative)
-            else:
-                val_loss = None
-            
-            # Evaluate during training if requested
-            if is_eval_during_training:
-                eval_results = self.evaluate(ks)
-                eval_str = ', '.join([f"Hit@{k}: {eval_results[f'hit@{k}']:.4f}, NDCG@{k}: {eval_results[f'ndcg@{k}']:.4f}" for k in ks])
-                if val_loss is not None:
-                    print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f} \n {eval_str} \n MRR: {eval_results['mrr']:.4f}")
-                else:
-                    print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f} \n {eval_str} \n MRR: {eval_results['mrr']:.4f}")
-            else:
-                if val_loss is not None:
-                    print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
-                else:
-                    print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}")
+                if world_size > 1:
+                    train_loss = self._average_over_ranks(train_loss)
+
+                # Validation, early stopping and best-state bookkeeping run on rank 0 only
+                stop = False
+                if rank == 0:
+                    # Compute validation loss for early stopping or for evaluation prints
+                    if use_early_stopping or is_eval_during_training:
+                        val_loss = self._compute_validation_loss(num_negative)
+                    else:
+                        val_loss = None
             
-            # Early stopping logic (only when enabled)
-            if use_early_stopping:
-                # If val_loss couldn't be computed for some reason, skip early stopping for this epoch
-                if val_loss is None:
-                    print("  → Early stopping is enabled but validation loss was not computed for this epoch; skipping early-stopping check.")
-                else:
-                    if val_loss < best_val_loss - early_stopping_min_delta:
-                        best_val_loss = val_loss
-                        best_model_state = self.model.state_dict().copy()
-                        patience_counter = 0
-                        print(f"  → Validation loss improved to {val_loss:.4f}. Saving best model.")
+                    # Evaluate during training if requested
+                    if is_eval_during_training:
+                        eval_results = self.evaluate(ks)
+                        eval_str = ', '.join([f"Hit@{k}: {eval_results[f'hit@{k}']:.4f}, NDCG@{k}: {eval_results[f'ndcg@{k}']:.4f}" for k in ks])
+                        if val_loss is not None:
+                            print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f} \n {eval_str} \n MRR: {eval_results['mrr']:.4f}")
+                        else:
+                            print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f} \n {eval_str} \n MRR: {eval_results['mrr']:.4f}")
                     else:
-                        patience_counter += 1
-                        print(f"  → No improvement. Patience: {patience_counter}/{early_stopping_patience}")
+                        if val_loss is not None:
+                            print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
+                        else:
+                            print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}")
+            
+                    # Early stopping logic (only when enabled)
+                    if use_early_stopping:
+                        # If val_loss couldn't be computed for some reason, skip early stopping for this epoch
+                        if val_loss is None:
+                            print("  → Early stopping is enabled but validation loss was not computed for this epoch; skipping early-stopping check.")
+                        else:
+                            if val_loss < best_val_loss - early_stopping_min_delta:
+                                best_val_loss = val_loss
+                                # state_dict() returns references to the live parameters: clone them
+                                best_model_state = {name: tensor.detach().clone()
+                                                    for name, tensor in self.model.state_dict().items()}
+                                patience_counter = 0
+                                print(f"  → Validation loss improved to {val_loss:.4f}. Saving best model.")
+                            else:
+                                patience_counter += 1
+                                print(f"  → No improvement. Patience: {patience_counter}/{early_stopping_patience}")
+
+                                if patience_counter >= early_stopping_patience:
+                                    print(f"Early stopping triggered after {epoch+1} epochs.")
+                                    # Restore best model
+                                    if best_model_state is not None:
+                                        self.model.load_state_dict(best_model_state)
+                                        print("Restored best model from early stopping.")
+                                    stop = True
+                if world_size > 1:
+                    stop = self._broadcast_flag(stop)
+                if stop:
+                    break
 
-                        if patience_counter >= early_stopping_patience:
-                            print(f"Early stopping triggered after {epoch+1} epochs.")
-                            # Restore best model
-                            if best_model_state is not None:
-                                self.model.load_state_dict(best_model_state)
-                                print("Restored best model from early stopping.")
-                            break
+        if world_size > 1:
+            # Ranks other than 0 pick up the best weights restored by rank 0
+            self._broadcast_parameters()
 
         # if is_save_model:
             # # Save final (or best) model state into a file
@@ -227,9 +336,9 @@ class CourseRecommendationModel:
         
         with torch.no_grad():
             if self.model_type in ['lightgcn', 'kgat']:
-                user_embedding, item_embedding = self.model(self.graph.edge_index)
+                user_embedding, item_embedding = self.model(self._propagation_graph())
             else:
-                embeddings = self.model(self.graph.x, self.graph.edge_index)
+                embeddings = self.model(self.graph.x, self._propagation_graph())
                 user_embedding = embeddings[:self.num_students]
                 item_embedding = embeddings[self.num_students:]
         
@@ -303,14 +412,14 @@ class CourseRecommendationModel:
         self.model.eval()
         
         # Get student's current semester
-        student_info = next(s for s in self.data['students'] if s['student_id'] == student_id)
+        student_info = self.students_by_id[student_id]
         student_semester = student_info['semester']
         
         with torch.no_grad():
             if self.model_type in ['lightgcn', 'kgat']:
-                user_embedding, item_embedding = self.model(self.graph.edge_index)
+                user_embedding, item_embedding = self.model(self._propagation_graph())
             else:
-                embeddings = self.model(self.graph.x, self.graph.edge_index)
+                embeddings = self.model(self.graph.x, self._propagation_graph())
                 user_embedding = embeddings[:self.num_students]
                 item_embedding = embeddings[self.num_students:]
             
@@ -323,15 +432,10 @@ class CourseRecommendationModel:
             scores[enrolled_courses] = -float('inf')
             
             # Remove courses from higher semesters
-            for course_id in range(len(scores)):
-                course_info = next(c for c in self.data['courses'] if c['course_id'] == course_id)
-
-                if semester_filter > 0:
-                    if course_info['semester'] != semester_filter:
-                        scores[course_id] = -float('inf')
-                else:
-                    if course_info['semester'] > student_semester:
-                        scores[course_id] = -float('inf')
+            if semester_filter > 0:
+                scores[self.course_semesters != semester_filter] = -float('inf')
+            else:
+                scores[self.course_semesters > student_semester] = -float('inf')
             
             # Get more recommendations than needed in case some are filtered
             top_scores, candidate_items = torch.topk(scores, min(k * 2, len(scores)))
@@ -386,6 +490,80 @@ class CourseRecommendationModel:
         self.heterogeneous_graph = new_graph
         self._prepare_training_data()
 
+    def _compute_embeddings(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Run the model over the full graph and return (user_embedding, item_embedding)"""
+        if self.model_type in ['lightgcn', 'kgat']:
+            return self.model(self._propagation_graph())
+        embeddings = self.model(self.graph.x, self._propagation_graph())
+        return embeddings[:self.num_students], embeddings[self.num_students:]
+
+    def _propagation_graph(self) -> torch.Tensor:
+        """Graph argument for the model's forward: the cached normalized sparse adjacency, or edge_index"""
+        if not self.sparse_propagation or self.model_type == 'kgat':
+            return self.graph.edge_index
+        normalization, add_self_loops = self._propagation_normalization()
+        return self.graph_builder.get_normalized_adjacency(self.graph.edge_index, normalization, add_self_loops)
+
+    def _broadcast_parameters(self):
+        """Overwrite the model weights on every rank with those of rank 0"""
+        for tensor in self.model.state_dict().values():
+            dist.broadcast(tensor, src=0)
+
+    def _all_reduce_gradients(self, world_size: int):
+        """Average the gradients over all ranks with one all-reduce of a flattened buffer"""
+        params = [p for p in self.model.parameters() if p.requires_grad]
+        grads = [p.grad if p.grad is not None else torch.zeros_like(p) for p in params]
+        flat = torch.cat([g.reshape(-1) for g in grads])
+        dist.all_reduce(flat)
+        flat /= world_size
+        offset = 0
+        for p in params:
+            p.grad = flat[offset:offset + p.numel()].view_as(p)
+            offset += p.numel()
+
+    def _average_over_ranks(self, value: float) -> float:
+        """Mean of a per-rank scalar over all ranks"""
+        tensor = torch.tensor([value], dtype=torch.float64)
+        dist.all_reduce(tensor)
+        return tensor.item() / dist.get_world_size()
+
+    def _broadcast_flag(self, flag: bool) -> bool:
+        """Rank 0's value of flag, on every rank"""
+        tensor = torch.tensor([int(flag)])
+        dist.broadcast(tensor, src=0)
+        return bool(tensor.item())
+
+    def _propagation_normalization(self) -> Tuple[str, bool]:
+        """(normalization, add_self_loops) of the model's propagation"""
+        # LGConv and GCNConv use symmetric normalization (GCNConv with self loops), SAGEConv a neighbour mean
+        return {'lightgcn': ('sym', False), 'gcn': ('sym', True), 'graphsage': ('mean', False)}[self.model_type]
+
+    def _build_neighbor_sampler(self, fanouts: List[int]) -> NeighborSampler:
+        """Neighbour sampler over the training graph, normalized like _propagation_graph"""
+        if self.model_type == 'kgat':
+            raise ValueError("Neighbour-sampled training is not supported for KGAT")
+        if len(fanouts) != self.num_layers:
+            raise ValueError(f"neighbor_fanouts needs one fan-out per layer ({self.num_layers}), got {fanouts}")
+        normalization, add_self_loops = self._propagation_normalization()
+        return NeighborSampler(self.graph.edge_index, self.num_students + self.num_courses, fanouts,
+                               normalization, add_self_loops)
+
+    def _sample_batch_subgraph(self, sampler: NeighborSampler, user_ids: torch.Tensor, positive_items: torch.Tensor,
+                               negative_items: torch.Tensor, rng: np.random.RandomState) -> SampledSubgraph:
+        """Computation subgraph around a batch's users, positive and negative items"""
+        seeds = torch.cat([user_ids, positive_items + self.num_students, negative_items + self.num_students])
+        return sampler.sample(seeds, rng)
+
+    def _subgraph_batch_embeddings(self, subgraph: SampledSubgraph,
+                                   batch_size: int) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """(users, positive items, negative items) embeddings of a batch, propagated over its sampled subgraph"""
+        if self.model_type == 'lightgcn':
+            embeddings = self.model.forward_subgraph(subgraph.n_id, subgraph.adjacency)
+        else:
+            embeddings = self.model(self.graph.x[subgraph.n_id], subgraph.adjacency)
+        seeds = embeddings[subgraph.seed_index]
+        return seeds[:batch_size], seeds[batch_size:2 * batch_size], seeds[2 * batch_size:]
+
     def _build_model(self):
         """Build the specified model"""
         if self.model_type == 'lightgcn':
@@ -410,52 +588,37 @@ class CourseRecommendationModel:
         else:
             raise ValueError(f"Unknown model type: {self.model_type}")
     
-    def _compute_validation_loss(self, batch_size: int = 256, num_negative: int = 1) -> float:
-        """Compute validation loss on validation set for early stopping."""
+    def _validation_negatives(self, num_negative: int) -> torch.Tensor:
+        """(num_valid, num_negative) validation negatives, sampled once per training run and then reused"""
+        if self.valid_negatives is None or self.valid_negatives.size(1) != num_negative:
+            user_ids = torch.LongTensor([user_id for user_id, _ in self.valid_samples])
+            self.valid_negatives = self._negative_sampling(user_ids, num_negative).view(-1, num_negative)
+        return self.valid_negatives
+
+    def _compute_validation_loss(self, num_negative: int = 1) -> float:
+        """Compute validation BPR loss for early stopping.
+
+        The weights do not change during validation, so the graph is propagated
+        once and the loss is computed over the whole validation set in one shot.
+        Negatives are fixed for the whole run, so epoch-to-epoch changes in the
+        loss reflect the weights only.
+        """
+        if len(self.valid_samples) == 0:
+            return float('inf')
+        if num_negative < 1:
+            raise ValueError("num_negative must be >= 1")
         self.model.eval()
-        total_val_loss = 0
-        num_batches = 0
-        
+
         with torch.no_grad():
-            for i in range(0, len(self.valid_samples), batch_size):
-                batch = self.valid_samples[i:i + batch_size]
-                user_ids = [s[0] for s in batch]
-                positive_items = [s[1] for s in batch]
-                
-                # Negative sampling for validation
-                negative_samples = self._negative_sampling(user_ids, num_negative)
-                negative_items = [s[1] for s in negative_samples]
-                
-                # Forward pass
-                if self.model_type in ['lightgcn', 'kgat']:
-                    user_embedding, item_embedding = self.model(self.graph.edge_index)
-                    users = user_embedding[user_ids]
-                    positive_items_embedding = item_embedding[positive_items]
-                    negative_items_embedding = item_embedding[negative_items]
-                else:  # GCN, GraphSAGE
-                    embeddings = self.model(self.graph.x, self.graph.edge_index)
-                    users = embeddings[user_ids]
-                    positive_items_embedding = embeddings[[p + self.num_students for p in positive_items]]
-                    negative_items_embedding = embeddings[[n + self.num_students for n in negative_items]]
-                
-                # Reshape negatives
-                if num_negative > 0:
-                    expected = len(user_ids) * num_negative
-                    if negative_items_embedding.size(0) == expected:
-                        negative_items_embedding = negative_items_embedding.view(len(user_ids), num_negative, -1)
-                    else:
-                        # Handle edge case where batch doesn't divide evenly
-                        continue
-                
-                # Compute BPR loss
-                positive_scores = (users * positive_items_embedding).sum(dim=1, keepdim=True)
-                negative_scores = (users.unsqueeze(1) * negative_items_embedding).sum(dim=2)
-                loss = -F.logsigmoid(positive_scores - negative_scores).mean()
-                
-                total_val_loss += loss.item()
-                num_batches += 1
-        
-        return total_val_loss / num_batches if num_batches > 0 else float('inf')
+            user_embedding, item_embedding = self._compute_embeddings()
+            valid = torch.LongTensor(self.valid_samples)
+            user_ids, positive_items = valid[:, 0], valid[:, 1]
+            negative_items = self._validation_negatives(num_negative)
+
+            users = user_embedding[user_ids]
+            positive_scores = (users * item_embedding[positive_items]).sum(dim=1, keepdim=True)
+            negative_scores = (users.unsqueeze(1) * item_embedding[negative_items]).sum(dim=2)
+            return -F.logsigmoid(positive_scores - negative_scores).mean().item()
     
     def _prepare_training_data(self):
         """Prepare train/validation/test split"""
@@ -543,21 +706,44 @@ class CourseRecommendationModel:
                 self.valid_samples = [positive_samples[i] for i in valid_idx.tolist()]
                 self.test_samples = [positive_samples[i] for i in test_idx.tolist()]
             
+        self.train_samples = torch.LongTensor(self.train_samples).view(-1, 2)
+        self.valid_negatives = None
+
         # Create user-item matrix for negative sampling
         self.user_positive_items = defaultdict(set)
         for student_id, course_id in positive_samples:
             self.user_positive_items[student_id].add(course_id)
+        self._build_negative_sampling_index()
 
-    def _negative_sampling(self, user_ids: List[int], num_negative: int = 1) -> List[Tuple[int, int]]:
-        """Sample negative items for users"""
-        negative_samples = []
-        for user_id in user_ids:
-            positive_items = self.user_positive_items[user_id]
-
-            for _ in range(num_negative):
-                negative_item = np.random.randint(0, self.num_courses)
-                while negative_item in positive_items:
-                    negative_item = np.random.randint(0, self.num_courses)
+    def _negative_sampling(self, user_ids: List[int], num_negative: int = 1,
+                           rng: Optional[np.random.RandomState] = None) -> torch.Tensor:
+        """Sample num_negative items per user that are not among the user's positives
 
-                negative_samples.append((user_id, negative_item))
-        return negative_samples
\ No newline at end of file
+        All candidates are drawn at once; collisions with a positive are found by
+        binary search in the sorted (user * num_courses + item) keys and only those
+        are redrawn. Returns a LongTensor of len(user_ids) * num_negative item ids,
+        grouped by user. rng defaults to the global numpy RNG.
+        """
+        rng = np.random if rng is None else rng
+        if self.positive_keys is None:
+            self._build_negative_sampling_index()
+        users = np.repeat(np.asarray(user_ids, dtype=np.int64), num_negative)
+        if self.saturated_users and not self.saturated_users.isdisjoint(users.tolist()):
+            raise ValueError("Cannot sample negatives for a user who is positive on every course")
+
+        items = rng.randint(0, self.num_courses, size=len(users))
+        pending = np.arange(len(users))
+        while len(pending) and len(self.positive_keys):
+            keys = users[pending] * self.num_courses + items[pending]
+            positions = np.minimum(np.searchsorted(self.positive_keys, keys), len(self.positive_keys) - 1)
+            pending = pending[self.positive_keys[positions] == keys]
+            items[pending] = rng.randint(0, self.num_courses, size=len(pending))
+        return torch.from_numpy(items)
+
+    def _build_negative_sampling_index(self):
+        """Sorted (user * num_courses + item) keys of every positive pair, used by _negative_sampling"""
+        pairs = [(user_id, item) for user_id, items in self.user_positive_items.items() for item in items]
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self.positive_keys = np.unique(pairs[:, 0] * self.num_courses + pairs[:, 1])
+        counts = np.bincount(self.positive_keys // self.num_courses) if len(self.positive_keys) else np.zeros(0)
+        self.saturated_users = set(np.nonzero(counts >= self.num_courses)[0].tolist())
@@ -0,0 +1,107 @@
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+import torch
+
+
+class SampledSubgraph(NamedTuple):
+    """Computation subgraph of one training batch"""
+    n_id: torch.Tensor       # sorted global ids of the subgraph nodes; local id i is n_id[i]
+    adjacency: torch.Tensor  # (len(n_id), len(n_id)) normalized sparse CSR adjacency over local ids
+    seed_index: torch.Tensor # local id of every seed, in the order the seeds were passed to sample()
+
+
+class NeighborSampler:
+    """Sample fixed fan-out k-hop computation subgraphs around the nodes of a batch.
+
+    Hop h draws up to fanouts[h] incoming neighbours for every node first reached
+    at hop h - 1 (all of them when the node has fewer), so a subgraph has at most
+    seeds * (1 + f1 + f1*f2 + ...) nodes whatever the size of the graph. Nodes
+    with more neighbours than the fan-out are sampled uniformly with replacement.
+
+    The subgraph adjacency is normalized with full-graph degrees, and every
+    sampled edge into v is scaled by deg(v) / sampled(v). The sampled sum is then
+    an unbiased estimate of the full-graph propagation `adj @ x` (a plain mean of
+    the sampled neighbours for 'mean'), and nodes with deg(v) <= fan-out are exact.
+    """
+    def __init__(self, edge_index: torch.Tensor, num_nodes: int, fanouts: List[int],
+                 normalization: str = 'sym', add_self_loops: bool = False):
+        """
+        Args:
+            edge_index: (2, E) LongTensor of (source, destination) edges of the full graph
+            num_nodes: number of nodes of the full graph
+            fanouts: neighbours sampled per node at each hop, one entry per propagation layer
+            normalization: 'sym' (LGConv, GCNConv) or 'mean' (SAGEConv), as in
+                GraphBuilder.build_normalized_adjacency
+            add_self_loops: give every node a self loop counted in its degree (GCNConv)
+        """
+        if normalization not in ('sym', 'mean'):
+            raise ValueError(f"Unknown normalization: {normalization}")
+        if not fanouts or min(fanouts) < 1:
+            raise ValueError(f"fanouts must be positive integers, got {fanouts}")
+        src = edge_index[0].numpy().astype(np.int64)
+        dst = edge_index[1].numpy().astype(np.int64)
+        # CSR over destinations: indices[indptr[v]:indptr[v + 1]] are the sources of the edges into v
+        order = np.argsort(dst, kind='stable')
+        self.indices = src[order]
+        self.indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=num_nodes), out=self.indptr[1:])
+        self.num_nodes = num_nodes
+        self.fanouts = list(fanouts)
+        self.normalization = normalization
+        self.add_self_loops = add_self_loops
+        self.degree = np.diff(self.indptr).astype(np.float32) + (1.0 if add_self_loops else 0.0)
+
+    def sample(self, seeds: torch.Tensor, rng: Optional[np.random.RandomState] = None) -> SampledSubgraph:
+        """Build the computation subgraph of seeds (global node ids, duplicates allowed)"""
+        rng = np.random if rng is None else rng
+        seeds = np.asarray(seeds, dtype=np.int64)
+        visited = np.unique(seeds)
+        frontier = visited
+        srcs, dsts, scales = [], [], []
+        for fanout in self.fanouts:
+            if len(frontier) == 0:
+                break
+            src, dst, scale = self._sample_neighbors(frontier, fanout, rng)
+            srcs.append(src)
+            dsts.append(dst)
+            scales.append(scale)
+            frontier = np.setdiff1d(src, visited)
+            visited = np.union1d(visited, frontier)
+
+        n_id = visited
+        src, dst, scale = (np.concatenate(parts) for parts in (srcs, dsts, scales))
+        adjacency = self._normalized_adjacency(n_id, src, dst, scale)
+        return SampledSubgraph(torch.from_numpy(n_id), adjacency, torch.from_numpy(np.searchsorted(n_id, seeds)))
+
+    def _sample_neighbors(self, nodes: np.ndarray, fanout: int,
+                          rng: np.random.RandomState) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (source, destination, deg / sampled) of up to fanout sampled edges into every node"""
+        starts = self.indptr[nodes]
+        deg = self.indptr[nodes + 1] - starts
+        take = np.minimum(deg, fanout)
+        owner = np.repeat(np.arange(len(nodes)), take)
+        # Nodes with at most fanout neighbours keep all of them, in order; the others draw fanout offsets
+        position = np.arange(len(owner)) - np.repeat(np.cumsum(take) - take, take)
+        owner_deg = deg[owner]
+        offset = np.where(owner_deg <= fanout, position, (rng.random_sample(len(owner)) * owner_deg).astype(np.int64))
+        src = self.indices[starts[owner] + offset]
+        return src, nodes[owner], (owner_deg / take[owner]).astype(np.float32)
+
+    def _normalized_adjacency(self, n_id: np.ndarray, src: np.ndarray, dst: np.ndarray,
+                              scale: np.ndarray) -> torch.Tensor:
+        """Local sparse CSR adjacency with full-graph normalization and sampling correction"""
+        if self.normalization == 'sym':
+            deg_inv_sqrt = np.where(self.degree > 0, self.degree, np.inf) ** -0.5
+            values = deg_inv_sqrt[src] * deg_inv_sqrt[dst] * scale
+        else:
+            # Mean over the sampled neighbours of dst: scale / deg(dst) = 1 / sampled(dst)
+            values = scale / np.maximum(self.degree[dst], 1.0)
+        rows, cols = np.searchsorted(n_id, dst), np.searchsorted(n_id, src)
+        if self.add_self_loops:
+            loops = np.arange(len(n_id))
+            rows, cols = np.concatenate([rows, loops]), np.concatenate([cols, loops])
+            values = np.concatenate([values, 1.0 / self.degree[n_id]])
+        num_local = len(n_id)
+        adjacency = torch.sparse_coo_tensor(torch.from_numpy(np.stack([rows, cols])),
+                                            torch.from_numpy(values.astype(np.float32)), (num_local, num_local))
+        return adjacency.coalesce().to_sparse_csr()
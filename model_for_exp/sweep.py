@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+from data_loader import DataLoader
+from main import PREPROCESSED_DATASET_FILEPATH, EMBEDDING_DIM, NUM_LAYERS, NUM_NEGATIVE, BATCH_SIZE, K_LIST
+from model import CourseRecommendationModel
+
+# Values tried for each hyperparameter; a --space JSON file with the same keys replaces it
+DEFAULT_SEARCH_SPACE = {
+    'model_type': ['lightgcn'],
+    'embedding_dim': [32, 64, EMBEDDING_DIM],
+    'num_layers': [1, 2, 3, NUM_LAYERS],
+    'num_negative': [1, NUM_NEGATIVE],
+    'learning_rate': [0.001, 0.005, 0.02]
+}
+
+# Dataset loaded once per worker process by _init_worker
+_worker_data = None
+
+
+def sample_configs(space: Dict[str, List], num_trials: int, seed: int) -> List[Dict]:
+    """All grid points when the grid has at most num_trials of them, else num_trials distinct random ones"""
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    if len(grid) <= num_trials:
+        return grid
+    return random.Random(seed).sample(grid, num_trials)
+
+
+def _init_worker(dataset_filepath: str, threads: int):
+    global _worker_data
+    torch.set_num_threads(threads)
+    _worker_data = DataLoader.load_preprocessed_dataset(filepath=dataset_filepath)
+
+
+def run_trial(trial_id: int, config: Dict, epochs_done: int, target_epochs: int, state_filepath: str,
+              batch_size: int, val_negatives: int, seed: int, ks: Optional[List[int]] = None) -> Dict:
+    """Train one trial from epochs_done to target_epochs in a worker process
+
+    Model and optimizer state are kept in state_filepath between rungs. The
+    validation loss is computed with negatives drawn from a fixed seed, so all
+    trials of a sweep are scored on the same validation negatives. ks, when
+    given, also runs the test-set evaluation.
+    """
+    start_time = time.time()
+    torch.manual_seed(seed + trial_id)
+    model = CourseRecommendationModel(_worker_data, embedding_dim=config['embedding_dim'],
+                                      num_layers=config['num_layers'], model_type=config['model_type'])
+    if epochs_done > 0:
+        state = torch.load(state_filepath, weights_only=True)
+        model.model.load_state_dict(state['model'])
+        model.optimizer.load_state_dict(state['optimizer'])
+    for group in model.optimizer.param_groups:
+        group['lr'] = config['learning_rate']
+
+    np.random.seed(seed + 1000 * trial_id + epochs_done)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(num_epochs=target_epochs - epochs_done, batch_size=batch_size,
+                    num_negative=config['num_negative'], is_save_model=False, use_early_stopping=False)
+    torch.save({'model': model.model.state_dict(), 'optimizer': model.optimizer.state_dict()}, state_filepath)
+
+    np.random.seed(seed)
+    model.valid_negatives = None
+    result = {'val_loss': model._compute_validation_loss(val_negatives)}
+    if ks:
+        result['metrics'] = {key: float(value) for key, value in model.evaluate(ks).items()}
+    result['seconds'] = time.time() - start_time
+    return result
+
+
+def successive_halving(configs: List[Dict], pool: ProcessPoolExecutor, output_dir: str, min_epochs: int,
+                       max_epochs: int, eta: int, batch_size: int, val_negatives: int, seed: int,
+                       ks: List[int]) -> List[Dict]:
+    """Train every config for min_epochs, keep the best 1/eta by validation loss, multiply the budget by eta, repeat
+
+    Survivors continue from their saved state, so a trial reaching max_epochs
+    has trained exactly max_epochs epochs. Trials that fail are recorded with
+    their error and pruned.
+    """
+    trials = [{'trial_id': i, 'config': config, 'epochs': 0, 'rung': -1, 'val_loss': None, 'metrics': None,
+               'seconds': 0.0, 'history': [], 'error': None} for i, config in enumerate(configs)]
+    active = trials
+    target_epochs, rung = min_epochs, 0
+    while active:
+        is_last_rung = target_epochs >= max_epochs
+        print(f"Rung {rung}: {len(active)} trial(s) to {target_epochs} epochs")
+        futures = {trial['trial_id']: pool.submit(
+            run_trial, trial['trial_id'], trial['config'], trial['epochs'], target_epochs,
+            os.path.join(output_dir, 'trials', f"{trial['trial_id']}.pt"), batch_size, val_negatives, seed,
+            ks if is_last_rung else None) for trial in active}
+        for trial in active:
+            try:
+                result = futures[trial['trial_id']].result()
+            except Exception as e:
+                trial['error'] = f'{type(e).__name__}: {e}'
+                trial['val_loss'] = None
+                print(f"  trial {trial['trial_id']} failed: {trial['error']}")
+                continue
+            trial.update(epochs=target_epochs, rung=rung, val_loss=result['val_loss'],
+                         metrics=result.get('metrics'), seconds=trial['seconds'] + result['seconds'])
+            trial['history'].append([target_epochs, result['val_loss']])
+            print(f"  trial {trial['trial_id']} {trial['config']}: val loss {result['val_loss']:.4f}")
+
+        if is_last_rung:
+            break
+        ranked = sorted((t for t in active if t['error'] is None), key=lambda t: t['val_loss'])
+        active = ranked[:max(1, len(ranked) // eta)]
+        target_epochs, rung = min(target_epochs * eta, max_epochs), rung + 1
+    return trials
+
+
+def write_leaderboard(trials: List[Dict], output_dir: str, sweep_seconds: float) -> List[Dict]:
+    """Rank trials by furthest rung reached, then validation loss, and write leaderboard.json"""
+    leaderboard = sorted(trials, key=lambda t: (t['error'] is not None, -t['rung'],
+                                                t['val_loss'] if t['val_loss'] is not None else float('inf')))
+    with open(os.path.join(output_dir, 'leaderboard.json'), 'w', encoding='utf-8') as f:
+        json.dump({'sweep_seconds': sweep_seconds, 'trials': leaderboard}, f, indent=2)
+    return leaderboard
+
+
+def print_leaderboard(leaderboard: List[Dict], ks: List[int], top: int = 10):
+    keys = sorted(leaderboard[0]['config']) if leaderboard else []
+    metric_keys = ['mrr'] + [f'ndcg@{k}' for k in ks]
+    print(' '.join(f'{key:>14}' for key in ['trial'] + keys + ['epochs', 'val_loss', 'seconds'] + metric_keys))
+    for trial in leaderboard[:top]:
+        values = [trial['trial_id']] + [trial['config'][key] for key in keys] + [trial['epochs']]
+        values.append('error' if trial['error'] else f"{trial['val_loss']:.4f}")
+        values.append(f"{trial['seconds']:.1f}")
+        values += [f"{trial['metrics'][key]:.4f}" if trial['metrics'] else '-' for key in metric_keys]
+        print(' '.join(f'{str(value):>14}' for value in values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep with parallel trials and successive halving')
+    parser.add_argument('--dataset', default=PREPROCESSED_DATASET_FILEPATH, help='Preprocessed dataset JSON')
+    parser.add_argument('--space', help='JSON file mapping hyperparameter -> list of values (default: built-in space)')
+    parser.add_argument('--num-trials', type=int, default=27, help='Configurations sampled from the space')
+    parser.add_argument('--min-epochs', type=int, default=5, help='Epochs every trial trains in the first rung')
+    parser.add_argument('--max-epochs', type=int, default=45, help='Epochs of the trials that survive every rung')
+    parser.add_argument('--eta', type=int, default=3, help='Keep 1/eta of the trials per rung, train eta x longer')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2), help='Parallel trials')
+    parser.add_argument('--threads-per-trial', type=int, default=0,
+                        help='Intra-op threads per trial (default: cores / workers)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--val-negatives', type=int, default=NUM_NEGATIVE,
+                        help='Negatives per validation pair, the same for every trial')
+    parser.add_argument('--output', default='./sweeps/latest', help='Directory for trial states and leaderboard.json')
+    parser.add_argument('--seed', type=int, default=36)
+    args = parser.parse_args()
+
+    space = DEFAULT_SEARCH_SPACE
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            space = {**DEFAULT_SEARCH_SPACE, **json.load(f)}
+    configs = sample_configs(space, args.num_trials, args.seed)
+    threads = args.threads_per_trial or max(1, (os.cpu_count() or 1) // args.workers)
+    os.makedirs(os.path.join(args.output, 'trials'), exist_ok=True)
+    print(f"{len(configs)} trials, {args.workers} worker(s) x {threads} thread(s), "
+          f"epochs {args.min_epochs}..{args.max_epochs}, eta={args.eta}")
+
+    start_time = time.time()
+    # spawn: forked workers would inherit the parent's torch thread pools
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(args.dataset, threads)) as pool:
+        trials = successive_halving(configs, pool, args.output, args.min_epochs, args.max_epochs, args.eta,
+                                    args.batch_size, args.val_negatives, args.seed, K_LIST)
+    sweep_seconds = time.time() - start_time
+
+    leaderboard = write_leaderboard(trials, args.output, sweep_seconds)
+    trained_epochs = sum(t['epochs'] for t in trials)
+    print(f"\nSweep finished in {sweep_seconds:.1f}s, {trained_epochs} trial-epochs "
+          f"(a full grid at {args.max_epochs} epochs would train {len(trials) * args.max_epochs}); "
+          f"leaderboard written to '{os.path.join(args.output, 'leaderboard.json')}'")
+    print_leaderboard(leaderboard, K_LIST)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.distributed as dist
+
+from data_loader import DataLoader
+from main import PREPROCESSED_DATASET_FILEPATH, EMBEDDING_DIM, NUM_LAYERS, BATCH_SIZE, NUM_NEGATIVE, \
+    EARLY_STOPPING_PATIENCE, EARLY_STOPPING_MIN_DELTA
+from model import CourseRecommendationModel
+
+RESULT_PREFIX = 'RESULT '
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Data-parallel CPU training over torch.distributed (gloo). Run one training with '
+                    '`torchrun --standalone --nproc_per_node=N train_distributed.py`, or measure scaling '
+                    'with `python train_distributed.py --scaling 1,2,4`.')
+    parser.add_argument('--dataset', default=PREPROCESSED_DATASET_FILEPATH, help='Preprocessed dataset JSON')
+    parser.add_argument('--model', default='lightgcn', choices=['lightgcn', 'gcn', 'graphsage', 'kgat'])
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Global batch size, split across ranks')
+    parser.add_argument('--num-negative', type=int, default=NUM_NEGATIVE)
+    parser.add_argument('--embedding-dim', type=int, default=EMBEDDING_DIM)
+    parser.add_argument('--num-layers', type=int, default=NUM_LAYERS)
+    parser.add_argument('--no-early-stopping', action='store_true',
+                        help='Train every epoch (use for timing; --scaling always sets it)')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Intra-op threads per rank (default: cores / world size)')
+    parser.add_argument('--seed', type=int, default=36)
+    parser.add_argument('--scaling', default='',
+                        help='Comma-separated process counts; launches torchrun for each and reports efficiency')
+    return parser.parse_args()
+
+
+def train_worker(args):
+    """Body of one rank; under torchrun every rank runs this with its own RANK/WORLD_SIZE"""
+    distributed = 'WORLD_SIZE' in os.environ
+    if distributed:
+        dist.init_process_group(backend='gloo')
+    world_size, rank = (dist.get_world_size(), dist.get_rank()) if distributed else (1, 0)
+    torch.set_num_threads(args.threads or max(1, (os.cpu_count() or 1) // world_size))
+
+    data = DataLoader.load_preprocessed_dataset(filepath=args.dataset)
+    # Same initial weights on every rank (train() also broadcasts rank 0's); different negatives per rank
+    torch.manual_seed(args.seed)
+    model = CourseRecommendationModel(data, embedding_dim=args.embedding_dim, num_layers=args.num_layers,
+                                      model_type=args.model)
+    np.random.seed(args.seed + rank)
+
+    output = contextlib.nullcontext() if rank == 0 else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        if distributed:
+            dist.barrier()
+        start_time = time.time()
+        model.train(num_epochs=args.epochs, batch_size=args.batch_size, num_negative=args.num_negative,
+                    is_save_model=False, early_stopping_patience=EARLY_STOPPING_PATIENCE,
+                    early_stopping_min_delta=EARLY_STOPPING_MIN_DELTA,
+                    use_early_stopping=not args.no_early_stopping)
+        elapsed = time.time() - start_time
+
+    if rank == 0:
+        result = {'world_size': world_size, 'seconds': elapsed,
+                  'seconds_per_epoch': elapsed / args.epochs if args.no_early_stopping else None,
+                  'val_loss': model._compute_validation_loss(args.num_negative)}
+        print(RESULT_PREFIX + json.dumps(result))
+    if distributed:
+        dist.destroy_process_group()
+
+
+def run_scaling(args):
+    """Time a fixed number of epochs for each process count and report speedup and efficiency"""
+    worker_args, skip_value = [], False
+    for arg in sys.argv[1:]:
+        if skip_value or arg.startswith('--scaling='):
+            skip_value = False
+        elif arg == '--scaling':
+            skip_value = True
+        else:
+            worker_args.append(arg)
+    results = []
+    for nproc in [int(n) for n in args.scaling.split(',')]:
+        command = [sys.executable, '-m', 'torch.distributed.run', '--standalone', f'--nproc_per_node={nproc}',
+                   os.path.abspath(__file__), *worker_args, '--no-early-stopping']
+        completed = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if completed.returncode != 0 or not lines:
+            print(completed.stdout[-2000:], completed.stderr[-2000:], sep='\n')
+            raise RuntimeError(f"Distributed run with {nproc} processes failed")
+        results.append(json.loads(lines[-1][len(RESULT_PREFIX):]))
+
+    # Speedup and efficiency are relative to the first process count (normally 1)
+    reference = results[0]
+    print(f"{os.cpu_count()} cores, model={args.model}, global batch={args.batch_size}, epochs={args.epochs}")
+    print(f"{'procs':>5} {'s/epoch':>9} {'speedup':>8} {'efficiency':>10} {'val loss':>9}")
+    for result in results:
+        speedup = reference['seconds_per_epoch'] / result['seconds_per_epoch']
+        efficiency = speedup * reference['world_size'] / result['world_size']
+        print(f"{result['world_size']:>5} {result['seconds_per_epoch']:>9.3f} {speedup:>7.2f}x "
+              f"{efficiency:>10.0%} {result['val_loss']:>9.4f}")
+
+
+def main():
+    args = parse_args()
+    if args.scaling:
+        run_scaling(args)
+    else:
+        train_worker(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,10 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch_geometric.nn import LGConv, GCNConv, SAGEConv
 
+def is_sparse_adjacency(graph) -> bool:
+    """True for a normalized sparse adjacency (GraphBuilder.build_normalized_adjacency), False for an edge_index"""
+    return graph.layout != torch.strided
+
 class LightGCNRecommender(nn.Module):
     """LightGCN: Simplified GCN for recommendation"""
     def __init__(self, num_users: int, num_items: int, embedding_dim: int, num_layers: int = 3):
@@ -21,16 +25,28 @@ class LightGCNRecommender(nn.Module):
         nn.init.normal_(self.user_embedding.weight, std=0.1)
         nn.init.normal_(self.item_embedding.weight, std=0.1)
     
-    def forward(self, edge_index):
+    def propagate_layers(self, edge_index):
+        """Return the list of layer outputs [x_0, x_1, ..., x_L] for all nodes
+
+        edge_index may also be the 'sym' normalized sparse adjacency, in which case
+        each layer is a single SpMM instead of LGConv message passing.
+        """
         # Get initial embeddings
         x = torch.cat([self.user_embedding.weight, self.item_embedding.weight], dim=0)
-        
+
         # Multi-layer propagation
         all_embeddings = [x]
         for _ in range(self.num_layers):
-            x = self.conv(x, edge_index)
+            if is_sparse_adjacency(edge_index):
+                x = edge_index @ x
+            else:
+                x = self.conv(x, edge_index)
             all_embeddings.append(x)
-        
+        return all_embeddings
+
+    def forward(self, edge_index):
+        all_embeddings = self.propagate_layers(edge_index)
+
         # Average all layers
         x = torch.stack(all_embeddings, dim=0).mean(dim=0)
         
@@ -48,7 +64,30 @@ class GCNRecommender(nn.Module):
         
     def forward(self, x, edge_index):
         for i, conv in enumerate(self.convs):
-            x = conv(x, edge_index)
+            if is_sparse_adjacency(edge_index):
+                # Precomputed 'sym' adjacency with self loops: same as GCNConv without renormalizing
+                x = edge_index @ conv.lin(x)
+                if conv.bias is not None:
+                    x = x + conv.bias
+            else:
+                x = conv(x, edge_index)
+            if i < len(self.convs) - 1:
+                x = F.relu(x)
+                x = F.dropout(x, p=0.5, training=self.training)
+        return x
+
+    def forward_normalized(self, x, edge_index, edge_weight):
+        """Forward pass with a precomputed GCN normalization.
+
+        edge_index must already contain self loops and edge_weight the matching
+        1/sqrt(deg(i) * deg(j)) coefficients. This lets a k-hop subgraph reuse
+        the degrees of the full graph, so its centre node gets the same output
+        as a full-graph forward pass.
+        """
+        for i, conv in enumerate(self.convs):
+            x = conv.propagate(edge_index, x=conv.lin(x), edge_weight=edge_weight)
+            if conv.bias is not None:
+                x = x + conv.bias
             if i < len(self.convs) - 1:
                 x = F.relu(x)
                 x = F.dropout(x, p=0.5, training=self.training)
@@ -65,7 +104,11 @@ class GraphSAGERecommender(nn.Module):
     
     def forward(self, x, edge_index):
         for i, conv in enumerate(self.convs):
-            x = conv(x, edge_index)
+            if is_sparse_adjacency(edge_index):
+                # Precomputed 'mean' adjacency: SAGEConv = lin_l(mean of neighbours) + lin_r(x)
+                x = conv.lin_l(edge_index @ x) + conv.lin_r(x)
+            else:
+                x = conv(x, edge_index)
             if i < len(self.convs) - 1:
                 x = F.relu(x)
                 x = F.dropout(x, p=0.5, training=self.training)
@@ -0,0 +1,101 @@
+from typing import Callable, Iterator, Tuple
+import queue
+import threading
+
+import numpy as np
+import torch
+
+Batch = Tuple[torch.Tensor, torch.Tensor, torch.Tensor]
+
+_END_OF_EPOCH = object()
+
+
+class BatchProducer:
+    """Prepare BPR training batches in a background thread.
+
+    Each epoch the (N, 2) sample tensor is shuffled with randperm, sliced into
+    batches and handed to `sample_negatives`; the resulting (user_ids,
+    positive_items, negative_items) LongTensors are put on a bounded queue, so
+    the next batches are ready while the training thread runs forward/backward.
+    Shuffling and negative sampling use their own seeded generators, drawn from
+    the global RNGs when the producer is created, so a run is reproducible
+    regardless of how the two threads interleave.
+    """
+    def __init__(self, samples: torch.Tensor, batch_size: int, num_negative: int,
+                 sample_negatives: Callable[[torch.Tensor, int, np.random.RandomState], torch.Tensor],
+                 num_epochs: int, shuffle: bool = True, prefetch: int = 4):
+        """
+        Args:
+            samples: (N, 2) LongTensor of (user_id, item_id) training pairs
+            batch_size: pairs per batch
+            num_negative: negatives drawn per pair
+            sample_negatives: fn(user_ids, num_negative, rng) returning len(user_ids) * num_negative items
+            num_epochs: epochs produced before the thread exits
+            shuffle: shuffle the pairs at the start of every epoch
+            prefetch: maximum number of prepared batches waiting in the queue
+        """
+        self.samples = samples
+        self.batch_size = batch_size
+        self.num_negative = num_negative
+        self.sample_negatives = sample_negatives
+        self.num_epochs = num_epochs
+        self.shuffle = shuffle
+        self._generator = torch.Generator().manual_seed(int(np.random.randint(2 ** 31)))
+        self._rng = np.random.RandomState(np.random.randint(2 ** 31))
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bpr-batch-producer', daemon=True)
+        self._thread.start()
+
+    def epoch(self) -> Iterator[Batch]:
+        """Yield the batches of the next epoch; re-raises any error from the producer thread"""
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_EPOCH:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        """Stop the producer, e.g. after early stopping, and wait for the thread to exit"""
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    def __enter__(self) -> 'BatchProducer':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        try:
+            for _ in range(self.num_epochs):
+                if self.shuffle:
+                    samples = self.samples[torch.randperm(len(self.samples), generator=self._generator)]
+                else:
+                    samples = self.samples
+                for batch in samples.split(self.batch_size):
+                    user_ids, positive_items = batch[:, 0], batch[:, 1]
+                    negative_items = self.sample_negatives(user_ids, self.num_negative, self._rng)
+                    if not self._put((user_ids, positive_items, negative_items)):
+                        return
+                if not self._put(_END_OF_EPOCH):
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item) -> bool:
+        """Block until the queue has room; False once the producer has been closed"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
@@ -0,0 +1,96 @@
+import argparse
+import json
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from data_loader import DataLoader
+from main import get_serving_model, RECOMMENDATION_REQUESTED_FILEPATH, RECOMMENDATIONS_FILEPATH_PREFIX, TOP_K
+
+
+def run_batch(requests: List[Dict], k: int = TOP_K, batch_size: int = 4096) -> List[Dict]:
+    """Answer many recommendation requests with one model load.
+
+    Requests are grouped by semester_filter and scored in chunks of `batch_size`
+    students with a single masked top-k per chunk. Results keep the input order.
+    """
+    model = get_serving_model()
+    results: List[Dict] = [None] * len(requests)
+
+    groups = defaultdict(list)
+    student_ids: Dict[int, int] = {}
+    for idx, request in enumerate(requests):
+        student_id = request.get('student_id')
+        semester_filter = request.get('semester_filter', 0)
+        if student_id is None or semester_filter is None:
+            results[idx] = {'student_id': student_id, 'semester_filter': semester_filter,
+                            'error': 'missing student_id or semester_filter'}
+            continue
+        try:
+            student_ids[idx], semester_filter = int(student_id), int(semester_filter)
+        except (TypeError, ValueError):
+            results[idx] = {'student_id': student_id, 'semester_filter': semester_filter,
+                            'error': 'invalid student_id or semester_filter'}
+            continue
+        if not 0 <= student_ids[idx] < model.num_students:
+            results[idx] = {'student_id': student_id, 'semester_filter': semester_filter,
+                            'error': 'unknown student_id'}
+        else:
+            groups[semester_filter].append(idx)
+
+    for semester_filter, indices in groups.items():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            chunk_student_ids = [student_ids[i] for i in chunk]
+            recommendations = model.recommend_courses_batch(chunk_student_ids, semester_filter, k=k)
+            for i, student_id, recs in zip(chunk, chunk_student_ids, recommendations):
+                results[i] = {'student_id': student_id, 'semester_filter': semester_filter,
+                              'recommendations': recs}
+    return results
+
+
+def save_results(results: List[Dict], filepath: str):
+    """Write results as JSON Lines, or as Parquet when the path ends in '.parquet'"""
+    if filepath.endswith('.parquet'):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("Writing Parquet output requires pandas and pyarrow: pip install pandas pyarrow")
+        rows = [dict(r, recommendations=json.dumps(r.get('recommendations', []))) for r in results]
+        pd.DataFrame(rows).to_parquet(filepath, index=False)
+        return
+    with open(filepath, 'w', encoding='utf-8') as f:
+        for r in results:
+            f.write(json.dumps(r, ensure_ascii=False) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline batch course recommendations')
+    parser.add_argument('--input', default=RECOMMENDATION_REQUESTED_FILEPATH,
+                        help='JSON list or .jsonl file of {"student_id", "semester_filter"} requests')
+    parser.add_argument('--output', default=f'{RECOMMENDATIONS_FILEPATH_PREFIX}_batch.jsonl',
+                        help='Output .jsonl or .parquet file')
+    parser.add_argument('--k', type=int, default=TOP_K, help='Number of courses per request')
+    parser.add_argument('--batch-size', type=int, default=4096, help='Students scored per matmul')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    get_serving_model()
+    load_time = time.time() - start_time
+
+    requests = DataLoader.load_recommendation_requests(filepath=args.input)
+    start_time = time.time()
+    results = run_batch(requests, k=args.k, batch_size=args.batch_size)
+    elapsed = time.time() - start_time
+    save_results(results, args.output)
+
+    num_errors = sum(1 for r in results if 'error' in r)
+    throughput = len(requests) / elapsed if elapsed > 0 else float('inf')
+    print(f"Model loaded in {load_time:.2f}s")
+    print(f"Answered {len(requests)} request(s) ({num_errors} error(s)) in {elapsed:.3f}s "
+          f"- {throughput:.0f} requests/s")
+    print(f"Recommendations saved to '{args.output}'")
+
+
+if __name__ == '__main__':
+    main()
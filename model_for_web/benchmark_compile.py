@@ -0,0 +1,97 @@
+import argparse
+import contextlib
+import io
+import time
+
+import torch
+
+from compiled_forward import compile_module, flatten_output
+from data_loader import DataLoader
+from main import PREPROCESSED_DATASET_FILEPATH, EMBEDDING_DIM, NUM_LAYERS, BATCH_SIZE, NUM_NEGATIVE
+from model import CourseRecommendationModel
+
+
+def build_model(data, model_type: str, compiled: bool, seed: int = 36) -> CourseRecommendationModel:
+    torch.manual_seed(seed)
+    return CourseRecommendationModel(data, embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS,
+                                     model_type=model_type, compiled=compiled)
+
+
+def time_calls(forward, inputs, training: bool, steps: int) -> float:
+    """Average seconds of one forward (no_grad) or forward + backward (training) after one untimed call"""
+    def step():
+        if training:
+            flatten_output(forward(*inputs)).sum().backward()
+        else:
+            with torch.no_grad():
+                forward(*inputs)
+
+    step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    return (time.perf_counter() - start) / steps
+
+
+def benchmark_backend(model: CourseRecommendationModel, backend: str, steps: int):
+    """(compile seconds, fwd+bwd seconds, serving forward seconds, max |output - eager|) of one backend"""
+    inputs = model._forward_inputs()
+    results = {}
+    for training in (True, False):
+        model.model.train(training)
+        start = time.perf_counter()
+        forward = model.model if backend == 'eager' else compile_module(model.model, backend, inputs)
+        # The first call compiles (torch.compile) or runs the freshly traced graph
+        with torch.no_grad():
+            output = flatten_output(forward(*inputs))
+        results[training] = (time.perf_counter() - start, time_calls(forward, inputs, training, steps), output)
+    with torch.no_grad():
+        expected = flatten_output(model.model(*inputs))
+    compile_seconds = results[True][0] + results[False][0]
+    return compile_seconds, results[True][1], results[False][1], (results[False][2] - expected).abs().max().item()
+
+
+def time_epochs(model: CourseRecommendationModel, epochs: int) -> float:
+    """Average seconds per training epoch (BPR batches + validation), after the compiled forward's warm-up"""
+    if model.compiled_forward is not None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.compiled_forward.warm_up(model._forward_inputs(), training=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        model.train(num_epochs=epochs, batch_size=BATCH_SIZE, num_negative=NUM_NEGATIVE,
+                    is_save_model=False, early_stopping_patience=epochs + 1)
+    return (time.perf_counter() - start) / epochs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare eager, torch.compile and TorchScript forward passes')
+    parser.add_argument('--dataset', default=PREPROCESSED_DATASET_FILEPATH, help='Preprocessed dataset JSON')
+    parser.add_argument('--models', nargs='+', default=['lightgcn', 'gcn', 'graphsage', 'kgat'])
+    parser.add_argument('--steps', type=int, default=20, help='Forward(/backward) calls timed per backend')
+    parser.add_argument('--epochs', type=int, default=3, help='Training epochs timed per model, eager and compiled')
+    args = parser.parse_args()
+
+    data = DataLoader.load_preprocessed_dataset(filepath=args.dataset)
+    print(f"{len(data['students'])} students, {len(data['courses'])} courses, {len(data['enrollments'])} enrollments, "
+          f"{torch.get_num_threads()} threads")
+    print(f"{'model':<10} {'backend':<12} {'compile s':>9} {'fwd+bwd ms':>11} {'serve ms':>9} {'speedup':>8} {'max diff':>9}")
+    for model_type in args.models:
+        model = build_model(data, model_type, compiled=False)
+        results = {backend: benchmark_backend(model, backend, args.steps)
+                   for backend in ('eager', 'compile', 'torchscript')}
+        for backend, (compile_seconds, step_time, serve_time, difference) in results.items():
+            speedup = results['eager'][1] / step_time
+            print(f"{model_type:<10} {backend:<12} {compile_seconds:>9.2f} {step_time * 1000:>11.2f} "
+                  f"{serve_time * 1000:>9.2f} {speedup:>7.2f}x {difference:>9.1e}")
+
+        eager_epoch = time_epochs(build_model(data, model_type, compiled=False), args.epochs)
+        compiled_model = build_model(data, model_type, compiled=True)
+        compiled_epoch = time_epochs(compiled_model, args.epochs)
+        chosen = compiled_model.compiled_forward
+        print(f"{model_type:<10} epoch: eager {eager_epoch:.3f}s, compiled {compiled_epoch:.3f}s "
+              f"({eager_epoch / compiled_epoch:.2f}x; training uses {chosen.backend(True)}, "
+              f"eval uses {chosen.backend(False)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import io
+import time
+
+import torch
+
+from data_loader import DataLoader
+from main import PREPROCESSED_DATASET_FILEPATH, EMBEDDING_DIM, NUM_LAYERS, BATCH_SIZE, NUM_NEGATIVE
+from model import CourseRecommendationModel
+
+
+def build_model(data, model_type: str, sparse_propagation: bool, seed: int = 36) -> CourseRecommendationModel:
+    torch.manual_seed(seed)
+    return CourseRecommendationModel(data, embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS,
+                                     model_type=model_type, sparse_propagation=sparse_propagation)
+
+
+def time_forward_backward(model: CourseRecommendationModel, steps: int) -> float:
+    """Average seconds of one full-graph forward + backward, the cost paid by every training batch"""
+    model.model.train()
+
+    def step():
+        if model.model_type == 'lightgcn':
+            users, items = model.model(model._propagation_graph())
+            loss = users.sum() + items.sum()
+        else:
+            loss = model.model(model.graph.x, model._propagation_graph()).sum()
+        loss.backward()
+
+    step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    return (time.perf_counter() - start) / steps
+
+
+def time_epochs(model: CourseRecommendationModel, epochs: int) -> float:
+    """Average seconds per training epoch (mini-batch BPR + validation), training output suppressed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        model.train(num_epochs=epochs, batch_size=BATCH_SIZE, num_negative=NUM_NEGATIVE,
+                    is_save_model=False, early_stopping_patience=epochs + 1)
+    return (time.perf_counter() - start) / epochs
+
+
+def max_output_difference(data, model_type: str) -> float:
+    """Largest absolute difference between the edge_index and sparse-adjacency forward passes"""
+    reference, sparse = build_model(data, model_type, False), build_model(data, model_type, True)
+    outputs = []
+    for model in (reference, sparse):
+        model.model.eval()
+        with torch.no_grad():
+            if model_type == 'lightgcn':
+                outputs.append(torch.cat(model.model(model._propagation_graph()), dim=0))
+            else:
+                outputs.append(model.model(model.graph.x, model._propagation_graph()))
+    return (outputs[0] - outputs[1]).abs().max().item()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare edge_index message passing with cached sparse-adjacency SpMM')
+    parser.add_argument('--dataset', default=PREPROCESSED_DATASET_FILEPATH, help='Preprocessed dataset JSON')
+    parser.add_argument('--models', nargs='+', default=['lightgcn', 'gcn', 'graphsage'])
+    parser.add_argument('--steps', type=int, default=50, help='Forward/backward steps timed per model')
+    parser.add_argument('--epochs', type=int, default=3, help='Training epochs timed per model')
+    args = parser.parse_args()
+
+    data = DataLoader.load_preprocessed_dataset(filepath=args.dataset)
+    print(f"{len(data['students'])} students, {len(data['courses'])} courses, {len(data['enrollments'])} enrollments")
+    print(f"{'model':<10} {'path':<12} {'fwd+bwd ms':>11} {'epoch s':>9} {'speedup':>8}")
+    for model_type in args.models:
+        results = {}
+        for sparse_propagation, label in ((False, 'edge_index'), (True, 'sparse_adj')):
+            model = build_model(data, model_type, sparse_propagation)
+            results[label] = (time_forward_backward(model, args.steps), time_epochs(model, args.epochs))
+        for label, (step_time, epoch_time) in results.items():
+            speedup = results['edge_index'][1] / epoch_time
+            print(f"{model_type:<10} {label:<12} {step_time * 1000:>11.2f} {epoch_time:>9.3f} {speedup:>7.2f}x")
+        print(f"{model_type:<10} max |edge_index - sparse_adj| output difference: "
+              f"{max_output_difference(data, model_type):.2e}")
+
+
+if __name__ == '__main__':
+    main()
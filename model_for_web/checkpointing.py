@@ -0,0 +1,120 @@
+from typing import Any, Dict, Optional
+import os
+import threading
+
+import numpy as np
+import torch
+
+
+def clone_state(state: Any) -> Any:
+    """Copy a (nested) state dict, replacing every tensor with a detached clone
+
+    `state_dict().copy()` only copies the outer dict: its tensors are the live
+    parameters, which later optimizer steps keep changing. A cloned state is a
+    true snapshot that stays valid while training continues.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().clone()
+    if isinstance(state, dict):
+        return {key: clone_state(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(clone_state(value) for value in state)
+    return state
+
+
+def capture_rng_state() -> Dict:
+    """torch and numpy global RNG states, stored as tensors and numbers so they load with weights_only=True"""
+    algorithm, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        'torch': torch.get_rng_state(),
+        'numpy': {'algorithm': algorithm, 'keys': torch.from_numpy(keys.astype(np.int64)), 'pos': int(pos),
+                  'has_gauss': int(has_gauss), 'cached_gaussian': float(cached_gaussian)}
+    }
+
+
+def restore_rng_state(state: Dict):
+    """Inverse of capture_rng_state"""
+    torch.set_rng_state(state['torch'])
+    numpy_state = state['numpy']
+    np.random.set_state((numpy_state['algorithm'], numpy_state['keys'].numpy().astype(np.uint32),
+                         numpy_state['pos'], numpy_state['has_gauss'], numpy_state['cached_gaussian']))
+
+
+def save_atomic(obj: Any, filepath: str):
+    """torch.save to a temporary file and rename it, so a crash mid-write never leaves a truncated checkpoint"""
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    tmp_filepath = f'{filepath}.tmp'
+    torch.save(obj, tmp_filepath)
+    os.replace(tmp_filepath, filepath)
+
+
+class AsyncCheckpointWriter:
+    """Write checkpoints from a background thread so training does not wait on disk I/O.
+
+    The caller passes an already cloned snapshot (see clone_state), which the
+    writer owns from then on. At most one write is pending: submitting while a
+    previous snapshot is still queued replaces it, since only the newest
+    checkpoint matters. An error raised by a write is re-raised by the next
+    submit(), flush() or close().
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = None
+        self._writing = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, snapshot: Any, filepath: str):
+        """Queue snapshot to be written to filepath"""
+        with self._condition:
+            self._raise_error()
+            self._pending = (snapshot, filepath)
+            self._condition.notify_all()
+
+    def flush(self):
+        """Block until every submitted snapshot has been written"""
+        with self._condition:
+            while self._pending is not None or self._writing:
+                self._condition.wait()
+            self._raise_error()
+
+    def close(self):
+        """Write the pending snapshot, if any, and stop the thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        with self._condition:
+            self._raise_error()
+
+    def __enter__(self) -> 'AsyncCheckpointWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                (snapshot, filepath), self._pending = self._pending, None
+                self._writing = True
+            try:
+                save_atomic(snapshot, filepath)
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple
+import torch
+
+
+def mini_batch_kmeans(x: torch.Tensor, num_clusters: int, batch_size: int = 1024,
+                      num_iters: int = 100, seed: int = 36) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Cluster the rows of x with vectorized mini-batch k-means (Sculley, 2010)
+
+    Each iteration assigns one random mini-batch to its nearest centers and moves
+    every center towards the mean of its assigned points with a per-center
+    learning rate of 1 / (points seen so far).
+
+    Returns:
+        (centers, assignments): (num_clusters, D) centers and the cluster id of every row
+    """
+    num_rows = x.size(0)
+    num_clusters = min(num_clusters, num_rows)
+    generator = torch.Generator().manual_seed(seed)
+    centers = x[torch.randperm(num_rows, generator=generator)[:num_clusters]].clone()
+    counts = torch.zeros(num_clusters)
+
+    for _ in range(num_iters):
+        batch = x[torch.randint(num_rows, (min(batch_size, num_rows),), generator=generator)]
+        nearest = torch.cdist(batch, centers).argmin(dim=1)
+        batch_counts = torch.bincount(nearest, minlength=num_clusters).float()
+        batch_sums = torch.zeros_like(centers).index_add_(0, nearest, batch)
+        counts += batch_counts
+        seen = batch_counts > 0
+        # c <- c + (sum - n * c) / total_seen, i.e. a running mean over all assigned points
+        centers[seen] += (batch_sums[seen] - batch_counts[seen].unsqueeze(1) * centers[seen]) / counts[seen].unsqueeze(1)
+
+    assignments = torch.cat([torch.cdist(chunk, centers).argmin(dim=1) for chunk in x.split(65536)])
+    return centers, assignments
+
+
+class CohortCache:
+    """Precomputed top-N course lists per (student cluster, semester bucket).
+
+    Students are clustered on their final embeddings; a cluster's score for a
+    course is centroid . course, which equals the mean score of its members.
+    Buckets cover both semester filter modes: ('upto', s) for semester_filter=0
+    and a student in semester s, and ('in', f) for semester_filter=f > 0.
+    Memory scales with num_clusters x num_buckets x top_n, not with students.
+    """
+    def __init__(self, num_clusters: int = 64, top_n: int = 50, batch_size: int = 1024,
+                 num_iters: int = 100, seed: int = 36):
+        self.num_clusters = num_clusters
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.num_iters = num_iters
+        self.seed = seed
+        self.assignments = None
+        self.bucket_index: Dict[Tuple[str, int], int] = {}
+        self.top_courses = None
+        self.top_scores = None
+        self.model_version = None
+
+    def build(self, model) -> 'CohortCache':
+        """Cluster the model's user embeddings and precompute every cohort list"""
+        user_embedding, item_embedding = model.get_embeddings()
+        centers, self.assignments = mini_batch_kmeans(user_embedding, self.num_clusters, self.batch_size,
+                                                      self.num_iters, self.seed)
+
+        buckets = [('upto', s) for s in torch.unique(model.student_semesters).tolist()]
+        buckets += [('in', f) for f in sorted(model.semester_course_masks)]
+        self.bucket_index = {bucket: i for i, bucket in enumerate(buckets)}
+        allowed = torch.stack([model.course_semesters <= s if mode == 'upto' else model.semester_course_masks[s]
+                               for mode, s in buckets])
+
+        with torch.no_grad():
+            scores = torch.matmul(centers, item_embedding.T)
+            # (clusters, buckets, courses) with disallowed courses pushed to -inf
+            scores = scores.unsqueeze(1).masked_fill(~allowed.unsqueeze(0), -float('inf'))
+            self.top_scores, self.top_courses = torch.topk(scores, min(self.top_n, model.num_courses), dim=2)
+        self.model_version = model.model_version
+        return self
+
+    @classmethod
+    def from_snapshot(cls, state: Dict) -> 'CohortCache':
+        """Restore the cohort tables saved by serving_snapshot.save_snapshot"""
+        cache = cls(top_n=state['top_courses'].size(2))
+        cache.num_clusters = state['top_courses'].size(0)
+        cache.assignments = state['assignments']
+        cache.bucket_index = {(mode, int(s)): i for i, (mode, s) in enumerate(state['buckets'])}
+        cache.top_courses = state['top_courses']
+        cache.top_scores = state['top_scores']
+        cache.model_version = state['model_version']
+        return cache
+
+    def recommend(self, model, student_id: int, semester_filter: int = 0, k: int = 10) -> List[Dict]:
+        """Return the student's cohort list for the filter, minus the student's own enrolled courses
+
+        The caller rebuilds the cache when model_version differs from the model's (see main.py).
+        """
+        model.check_student_id(student_id)
+        if semester_filter > 0:
+            bucket = self.bucket_index.get(('in', semester_filter))
+        else:
+            bucket = self.bucket_index.get(('upto', int(model.student_semesters[student_id])))
+        if bucket is None:
+            return []
+
+        cluster = int(self.assignments[student_id])
+        enrolled = model.user_positive_items.get(student_id, ())
+        course_ids, scores = [], []
+        for course_id, score in zip(self.top_courses[cluster, bucket].tolist(),
+                                    self.top_scores[cluster, bucket].tolist()):
+            if len(course_ids) == k:
+                break
+            if course_id not in enrolled:
+                course_ids.append(course_id)
+                scores.append(score)
+        return model.format_recommendations(course_ids, scores)
@@ -0,0 +1,194 @@
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+import contextlib
+import time
+import warnings
+
+import torch
+import torch.nn as nn
+
+# A backend is used only if it matches eager mode and beats it in the warm-up benchmark
+BACKENDS = ('compile', 'torchscript')
+
+
+class _Entry(NamedTuple):
+    signature: Tuple
+    forward: Callable
+    backend: str          # 'compile', 'torchscript' or 'eager'
+    seconds: float        # warm-up time per call of the chosen forward
+    eager_seconds: float
+
+
+def input_signature(inputs: Sequence[torch.Tensor]) -> Tuple:
+    """Layout, shape and (for sparse inputs) number of stored values of every input"""
+    return tuple((t.layout, tuple(t.shape), t.values().numel() if t.layout != torch.strided else None)
+                 for t in inputs)
+
+
+def flatten_output(output) -> torch.Tensor:
+    """One tensor out of a recommender's output: (users, items) for LightGCN/KGAT, embeddings for GCN/GraphSAGE"""
+    return torch.cat(output, dim=0) if isinstance(output, (tuple, list)) else output
+
+
+def compile_module(module: nn.Module, backend: str, inputs: Sequence[torch.Tensor]) -> Callable:
+    """Compile module with one backend
+
+    'compile' is torch.compile without dynamic shapes; it compiles on the first
+    call. 'torchscript' traces module in its current mode on inputs.
+    """
+    if backend == 'compile':
+        return torch.compile(module, dynamic=False)
+    if backend == 'torchscript':
+        with warnings.catch_warnings():
+            # Tracing is deprecated in favour of torch.compile, but remains the fallback when compile fails
+            warnings.simplefilter('ignore', category=FutureWarning)
+            warnings.simplefilter('ignore', category=torch.jit.TracerWarning)
+            return torch.jit.trace(module, tuple(inputs), check_trace=False)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+class CompiledForward:
+    """Opt-in compiled forward pass of a recommender over a fixed (static-shape) graph.
+
+    Calling it runs module(*inputs) through the fastest of torch.compile
+    (inductor, dynamic=False), a torch.jit.trace and eager mode. Training and
+    eval mode are built separately, on their first call (or by warm_up()),
+    because dropout makes them different graphs. A build:
+
+      * times eager mode, forward + backward in training mode;
+      * tries each backend: compiles it, checks its eval-mode output against
+        eager mode (a backend that fails or disagrees is skipped) and times it;
+      * keeps the fastest of them if it beats eager mode by min_speedup, else eager mode.
+
+    Compiled graphs are specialized to the shapes of the inputs they were built
+    with. When the graph changes (different shape or number of edges), the next
+    call rebuilds, so a compiled forward is never run on shapes it was not
+    checked on. Parameters are shared with module: optimizer steps and
+    load_state_dict() apply to the compiled forward as well. Warm-up runs under
+    a forked RNG and leaves the parameters' gradients as it found them.
+    """
+    def __init__(self, module: nn.Module, backends: Sequence[str] = BACKENDS, warmup_steps: int = 5,
+                 min_speedup: float = 1.05, rtol: float = 1e-4, atol: float = 1e-5, verbose: bool = True):
+        """
+        Args:
+            module: LightGCN/GCN/GraphSAGE/KGAT recommender
+            backends: backends to try, in order ('compile', 'torchscript'); empty runs eager mode
+            warmup_steps: calls timed per candidate after its first (compiling) call
+            min_speedup: speedup over eager mode a backend needs to be used, so timing noise
+                on a small graph does not swap in a backend that is not actually faster
+            rtol, atol: tolerance of the eval-mode comparison with eager mode
+            verbose: print the backend chosen by every build and the warm-up timings
+        """
+        unknown = set(backends) - set(BACKENDS)
+        if unknown:
+            raise ValueError(f"Unknown backends {sorted(unknown)}; expected a subset of {BACKENDS}")
+        self.module = module
+        self.backends = tuple(backends)
+        self.warmup_steps = warmup_steps
+        self.min_speedup = min_speedup
+        self.rtol = rtol
+        self.atol = atol
+        self.verbose = verbose
+        self._entries: Dict[bool, _Entry] = {}
+        # Backends whose eval-mode output matched eager mode, per input signature
+        self._verified: Dict[Tuple, Tuple[str, ...]] = {}
+        self._compiled_module = None
+
+    def __call__(self, *inputs: torch.Tensor):
+        return self.warm_up(inputs, self.module.training).forward(*inputs)
+
+    def backend(self, training: bool) -> Optional[str]:
+        """Backend in use for training or eval mode, None before its first build"""
+        entry = self._entries.get(training)
+        return entry.backend if entry is not None else None
+
+    def warm_up(self, inputs: Sequence[torch.Tensor], training: bool) -> _Entry:
+        """Build (compile, check and benchmark) the forward of one mode, unless built for inputs of this signature"""
+        signature = input_signature(inputs)
+        entry = self._entries.get(training)
+        if entry is not None and entry.signature == signature:
+            return entry
+        was_training = self.module.training
+        try:
+            if training and signature not in self._verified:
+                # Dropout makes training-mode outputs incomparable: verify the backends in eval mode first
+                self.warm_up(inputs, training=False)
+            self.module.train(training)
+            with torch.random.fork_rng(), _preserved_grads(self.module):
+                entry = self._build(tuple(inputs), signature, training)
+        finally:
+            self.module.train(was_training)
+        self._entries[training] = entry
+        if self.verbose:
+            mode = 'training' if training else 'eval'
+            unit = 'step' if training else 'call'
+            if entry.backend == 'eager':
+                print(f"  Forward ({mode}): eager {entry.eager_seconds * 1000:.2f}ms per {unit}, "
+                      f"no backend was {self.min_speedup:.2f}x faster")
+            else:
+                print(f"  Forward ({mode}): {entry.backend} {entry.seconds * 1000:.2f}ms "
+                      f"vs eager {entry.eager_seconds * 1000:.2f}ms per {unit}")
+        return entry
+
+    def _build(self, inputs: Tuple[torch.Tensor, ...], signature: Tuple, training: bool) -> _Entry:
+        eager_seconds = self._time(self.module, inputs, training)
+        candidates = self._verified[signature] if training else self.backends
+        verified, best = [], _Entry(signature, self.module, 'eager', eager_seconds, eager_seconds)
+        for backend in candidates:
+            try:
+                forward = self._compile(backend, inputs)
+                if not training and not self._matches_eager(forward, inputs):
+                    warnings.warn(f"{backend} forward differs from eager mode; not using it")
+                    continue
+                verified.append(backend)
+                seconds = self._time(forward, inputs, training)
+            except Exception as e:
+                warnings.warn(f"{backend} forward failed ({type(e).__name__}: {e}); not using it")
+                continue
+            if seconds < best.seconds and seconds * self.min_speedup < eager_seconds:
+                best = _Entry(signature, forward, backend, seconds, eager_seconds)
+        if not training:
+            self._verified[signature] = tuple(verified)
+        return best
+
+    def _compile(self, backend: str, inputs: Tuple[torch.Tensor, ...]) -> Callable:
+        if backend == 'compile':
+            # One compiled module serves both modes; dynamo guards on the training flag and the shapes
+            if self._compiled_module is None:
+                self._compiled_module = compile_module(self.module, backend, inputs)
+            return self._compiled_module
+        # A trace records one mode and one graph: it is rebuilt for every mode and signature
+        return compile_module(self.module, backend, inputs)
+
+    def _matches_eager(self, forward: Callable, inputs: Tuple[torch.Tensor, ...]) -> bool:
+        with torch.no_grad():
+            expected, actual = flatten_output(self.module(*inputs)), flatten_output(forward(*inputs))
+        return expected.shape == actual.shape and torch.allclose(actual, expected, rtol=self.rtol, atol=self.atol)
+
+    def _time(self, forward: Callable, inputs: Tuple[torch.Tensor, ...], training: bool) -> float:
+        """Seconds per call after one untimed (compiling) call; forward + backward in training mode"""
+        def step():
+            if training:
+                flatten_output(forward(*inputs)).sum().backward()
+            else:
+                with torch.no_grad():
+                    forward(*inputs)
+
+        step()
+        start = time.perf_counter()
+        for _ in range(self.warmup_steps):
+            step()
+        return (time.perf_counter() - start) / max(self.warmup_steps, 1)
+
+
+@contextlib.contextmanager
+def _preserved_grads(module: nn.Module):
+    """Restore the .grad of every parameter on exit, so warm-up backward passes leave no trace"""
+    parameters = list(module.parameters())
+    grads = [p.grad for p in parameters]
+    for p in parameters:
+        p.grad = None
+    try:
+        yield
+    finally:
+        for p, grad in zip(parameters, grads):
+            p.grad = grad
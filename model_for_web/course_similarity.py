@@ -0,0 +1,88 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+class CourseSimilarityIndex:
+    """Precomputed item-item top-M neighbour table for "related courses".
+
+    Similarity is the cosine of the final course embeddings, optionally blended
+    with normalized co-enrollment counts:
+        sim(i, j) = (1 - w) * cos(e_i, e_j) + w * co(i, j) / sqrt(n_i * n_j)
+    where co(i, j) counts students enrolled in both courses and n_i counts the
+    students enrolled in course i. Neighbours are stored as (num_courses, top_m)
+    arrays, so answering a query is a single row slice.
+    """
+    def __init__(self, top_m: int = 20, co_enrollment_weight: float = 0.0, chunk_size: int = 4096):
+        """
+        Args:
+            top_m: number of neighbours kept per course
+            co_enrollment_weight: blend weight w of co-enrollment similarity (0 disables it)
+            chunk_size: number of courses whose similarity rows are computed at once
+        """
+        self.top_m = top_m
+        self.co_enrollment_weight = co_enrollment_weight
+        self.chunk_size = chunk_size
+        self.neighbors = None
+        self.scores = None
+        self.model_version = None
+
+    def build(self, model) -> 'CourseSimilarityIndex':
+        """Compute the neighbour table from the model's cached course embeddings"""
+        _, item_embedding = model.get_embeddings()
+        items = F.normalize(item_embedding, dim=1)
+        num_courses = items.size(0)
+        top_m = min(self.top_m, num_courses - 1)
+
+        co_enrollment = None
+        if self.co_enrollment_weight > 0:
+            co_enrollment, course_counts = self._co_enrollment_counts(model)
+
+        neighbors, scores = [], []
+        with torch.no_grad():
+            for start in range(0, num_courses, self.chunk_size):
+                rows = torch.arange(start, min(start + self.chunk_size, num_courses))
+                sim = torch.matmul(items[rows], items.T)
+                if co_enrollment is not None:
+                    co = co_enrollment.index_select(0, rows).to_dense()
+                    co = co / torch.sqrt(course_counts[rows].unsqueeze(1) * course_counts.unsqueeze(0))
+                    sim = (1 - self.co_enrollment_weight) * sim + self.co_enrollment_weight * co
+                sim[torch.arange(len(rows)), rows] = -float('inf')
+                top_scores, top_items = torch.topk(sim, top_m, dim=1)
+                neighbors.append(top_items)
+                scores.append(top_scores)
+
+        self.neighbors = torch.cat(neighbors).numpy().astype(np.int32)
+        self.scores = torch.cat(scores).numpy().astype(np.float32)
+        self.model_version = model.model_version
+        return self
+
+    @classmethod
+    def from_snapshot(cls, state: Dict) -> 'CourseSimilarityIndex':
+        """Restore the neighbour table saved by serving_snapshot.save_snapshot"""
+        index = cls(top_m=state['neighbors'].size(1))
+        index.neighbors = state['neighbors'].numpy()
+        index.scores = state['scores'].numpy()
+        index.model_version = state['model_version']
+        return index
+
+    def related(self, course_id: int, k: int = 10) -> List[Dict]:
+        """Return the k courses most similar to course_id"""
+        if not 0 <= course_id < len(self.neighbors):
+            raise ValueError(f"Unknown course_id: {course_id}")
+        k = min(k, self.neighbors.shape[1])
+        return [{'rank': i + 1, 'course_id': int(c), 'score': float(s)}
+                for i, (c, s) in enumerate(zip(self.neighbors[course_id, :k], self.scores[course_id, :k]))]
+
+    @staticmethod
+    def _co_enrollment_counts(model) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return the sparse (courses, courses) co-enrollment matrix and per-course enrollment counts"""
+        pairs = {(e['student_id'], e['course_id']) for e in model.data['enrollments'] if e['is_enrolled'] == 1}
+        # LongTensor([]).T has shape (0,), not (2, 0)
+        indices = torch.LongTensor(sorted(pairs)).T if pairs else torch.empty((2, 0), dtype=torch.long)
+        enrolled = torch.sparse_coo_tensor(indices, torch.ones(indices.size(1)),
+                                           (model.num_students, model.num_courses)).coalesce()
+        co_enrollment = torch.sparse.mm(enrolled.T.coalesce(), enrolled).coalesce()
+        course_counts = torch.bincount(indices[1], minlength=model.num_courses).float().clamp(min=1.0)
+        return co_enrollment, course_counts
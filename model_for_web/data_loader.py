@@ -110,7 +110,7 @@ class DataLoader:
     
     @staticmethod
     def load_recommendation_requests(filepath: str = './data/recommendation_requests.json'):
-        """Load recommendation requests from a JSON file.
+        """Load recommendation requests from a JSON or JSON Lines file.
         
         Expected JSON format:
         [
@@ -118,8 +118,12 @@ class DataLoader:
             {"student_id": 10, "semester_filter": 5},
             ...
         ]
+        Files ending in '.jsonl' hold one such object per line instead.
         
         Returns:
             List of dictionaries containing 'student_id' and 'semester_filter' keys.
         """
+        if filepath.endswith('.jsonl'):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
         return DataLoader._load_json_file(filepath)
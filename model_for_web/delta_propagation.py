@@ -0,0 +1,110 @@
+from typing import List, Optional, Tuple
+import numpy as np
+import torch
+
+from graph_builder import GraphBuilder
+from basic_gnn_models import LightGCNRecommender
+
+
+class LightGCNDeltaPropagator:
+    """Incrementally refresh LightGCN embeddings after a few edges change.
+
+    LGConv computes x_{l+1}[i] = sum_j x_l[j] / sqrt(deg(i) * deg(j)) over the
+    neighbours j of i. When the edges of a set of touched nodes T change, only
+    the degrees of T change, so layer 1 differs on T and its neighbours, layer 2
+    on that set and its neighbours, and so on. After NUM_LAYERS hops the
+    affected frontier is usually a small fraction of the graph, and only those
+    rows are recomputed from the cached per-layer outputs.
+    """
+    def __init__(self, model: LightGCNRecommender, edge_index: torch.Tensor):
+        """
+        Args:
+            model: trained LightGCN model (weights are not modified)
+            edge_index: current bidirectional edge_index of the homogeneous graph
+        """
+        self.model = model
+        self.num_users = model.num_users
+        self.num_nodes = model.num_users + model.num_items
+        self.layer_outputs: List[torch.Tensor] = []
+        self.final_embeddings: Optional[torch.Tensor] = None
+        self._set_graph(edge_index)
+
+    def refresh(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Run a full propagation and cache every layer output"""
+        self.model.eval()
+        with torch.no_grad():
+            self.layer_outputs = [x.detach().clone() for x in self.model.propagate_layers(self.edge_index)]
+            self.final_embeddings = torch.stack(self.layer_outputs, dim=0).mean(dim=0)
+        return self.user_embedding, self.item_embedding
+
+    @property
+    def user_embedding(self) -> torch.Tensor:
+        return self.final_embeddings[:self.num_users]
+
+    @property
+    def item_embedding(self) -> torch.Tensor:
+        return self.final_embeddings[self.num_users:]
+
+    def update(self, new_edge_index: torch.Tensor, touched_nodes, verify: bool = False,
+               atol: float = 1e-5) -> np.ndarray:
+        """Patch the cached embeddings after the graph changed around `touched_nodes`.
+
+        Args:
+            new_edge_index: edge_index after the change (same node numbering)
+            touched_nodes: node ids whose incident edges were added or removed
+            verify: if True, compare the patched tables against a full forward pass
+            atol: absolute tolerance used by `verify`
+        Returns:
+            Sorted array of node ids whose final embeddings were recomputed.
+        """
+        if self.final_embeddings is None:
+            self.refresh()
+
+        if new_edge_index.numel() > 0 and int(new_edge_index.max()) >= self.num_nodes:
+            raise ValueError("Incremental update does not support adding new nodes; rebuild the model instead")
+
+        self._set_graph(new_edge_index)
+        touched = np.unique(np.asarray(list(touched_nodes), dtype=np.int64))
+        if len(touched) == 0:
+            return touched
+
+        with torch.no_grad():
+            affected = touched
+            for layer in range(1, len(self.layer_outputs)):
+                # Rows of layer l depend on layer l-1 of their neighbours
+                affected = GraphBuilder.k_hop_nodes(self.indptr, self.indices, affected, 1)
+                self.layer_outputs[layer][torch.from_numpy(affected)] = self._propagate_rows(
+                    affected, self.layer_outputs[layer - 1])
+
+            rows = torch.from_numpy(affected)
+            stacked = torch.stack([x[rows] for x in self.layer_outputs], dim=0)
+            self.final_embeddings[rows] = stacked.mean(dim=0)
+
+        if verify:
+            self.model.eval()
+            with torch.no_grad():
+                users, items = self.model(self.edge_index)
+            full = torch.cat([users, items], dim=0)
+            max_diff = (full - self.final_embeddings).abs().max().item()
+            if max_diff > atol:
+                raise RuntimeError(f"Incremental LightGCN update diverged from full forward (max abs diff {max_diff:.2e})")
+        return affected
+
+    def _set_graph(self, edge_index: torch.Tensor):
+        """Cache CSR adjacency and symmetric-normalization factors for edge_index"""
+        self.edge_index = edge_index
+        self.indptr, self.indices = GraphBuilder.build_csr_adjacency(edge_index, self.num_nodes)
+        deg = np.diff(self.indptr).astype(np.float32)
+        deg_inv_sqrt = np.zeros_like(deg)
+        np.power(deg, -0.5, out=deg_inv_sqrt, where=deg > 0)
+        self.deg_inv_sqrt = torch.from_numpy(deg_inv_sqrt)
+
+    def _propagate_rows(self, rows: np.ndarray, x_prev: torch.Tensor) -> torch.Tensor:
+        """Compute one LGConv step for the given destination rows only"""
+        row_pos, cols = GraphBuilder.gather_csr_rows(self.indptr, self.indices, rows)
+        row_pos = torch.from_numpy(row_pos)
+        cols = torch.from_numpy(cols)
+        rows_t = torch.from_numpy(rows)
+        weight = self.deg_inv_sqrt[rows_t][row_pos] * self.deg_inv_sqrt[cols]
+        out = torch.zeros(len(rows), x_prev.size(1), dtype=x_prev.dtype)
+        return out.index_add_(0, row_pos, x_prev[cols] * weight.unsqueeze(1))
@@ -0,0 +1,87 @@
+from typing import Dict, Hashable, Iterable, List
+import numpy as np
+
+
+class IdMapping:
+    """Bidirectional mapping between external identifiers and dense model rows.
+
+    External ids (student or course codes, backend document ids, ...) map to
+    contiguous rows 0..n-1 of the embedding tables. Lookups are a dict hit in
+    one direction and a list/array gather in the other; new ids are appended
+    at the next free row, so existing rows never move.
+    """
+    def __init__(self, external_ids: Iterable[Hashable] = ()):
+        """external_ids[row] is the id of each row; raises ValueError on a missing or repeated id"""
+        self._external_ids: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._external_array = None
+        for row, external_id in enumerate(external_ids):
+            if external_id is None:
+                raise ValueError(f"Row {row} has no external id")
+            if external_id in self._rows:
+                raise ValueError(f"External id {external_id!r} is repeated at rows {self._rows[external_id]} and {row}")
+            self.append(external_id)
+
+    @classmethod
+    def from_records(cls, records: List[Dict], key_field: str, row_field: str) -> 'IdMapping':
+        """Build the mapping from dataset records, e.g. students keyed by 'student_code' with rows in 'student_id'
+
+        Records without a key fall back to their row number as the external id.
+        Every row 0..len(records)-1 must be given by exactly one record and every
+        key must be unique; otherwise a ValueError is raised, since skipping an id
+        would shift all the rows after it.
+        """
+        external_ids = [None] * len(records)
+        for record in records:
+            row = int(record[row_field])
+            if not 0 <= row < len(records):
+                raise ValueError(f"{row_field}={row} is not a dense row index for {len(records)} records")
+            if external_ids[row] is not None:
+                raise ValueError(f"{row_field}={row} is given by more than one record")
+            key = record.get(key_field)
+            external_ids[row] = str(key) if key is not None else str(row)
+        return cls(external_ids)
+
+    def append(self, external_id: Hashable) -> int:
+        """Return the row of external_id, assigning the next row when it is new"""
+        row = self._rows.get(external_id)
+        if row is None:
+            row = len(self._external_ids)
+            self._rows[external_id] = row
+            self._external_ids.append(external_id)
+            self._external_array = None
+        return row
+
+    def row(self, external_id: Hashable) -> int:
+        """Row of one external id; raises KeyError when unknown"""
+        try:
+            return self._rows[external_id]
+        except KeyError:
+            raise KeyError(f"Unknown id: {external_id!r}")
+
+    def rows(self, external_ids: Iterable[Hashable]) -> np.ndarray:
+        """Rows of many external ids as an int64 array"""
+        return np.fromiter((self.row(external_id) for external_id in external_ids), dtype=np.int64)
+
+    def external_id(self, row: int) -> Hashable:
+        return self._external_ids[row]
+
+    def external_ids(self, rows) -> np.ndarray:
+        """External ids of many rows, gathered from a cached object array"""
+        if self._external_array is None:
+            self._external_array = np.empty(len(self._external_ids), dtype=object)
+            self._external_array[:] = self._external_ids
+        return self._external_array[np.asarray(rows, dtype=np.int64)]
+
+    def __contains__(self, external_id: Hashable) -> bool:
+        return external_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._external_ids)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IdMapping) and self._external_ids == other._external_ids
+
+    def state_dict(self) -> List[Hashable]:
+        """External ids in row order; enough to rebuild the mapping with IdMapping(...)"""
+        return list(self._external_ids)
@@ -1,11 +1,17 @@
 import os
 import sys
+import threading
 from data_generator import DataGenerator, save_generated_dataset_json
 from graph_builder import GraphBuilder
 from data_preprocessor import DataPreprocessor
 from data_loader import DataLoader
 import json
 from model import CourseRecommendationModel
+from serving_cache import RankingPaginator, SingleFlight
+from serving_policy import TierSelector
+from cohort_cache import CohortCache
+from course_similarity import CourseSimilarityIndex
+from serving_snapshot import is_snapshot_current, load_snapshot, snapshot_mismatches
 
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -73,13 +79,217 @@ VALID_SPLIT = config.get('VALID_SPLIT', 0.1)
 
 EARLY_STOPPING_PATIENCE = config.get('EARLY_STOPPING_PATIENCE', 10)
 EARLY_STOPPING_MIN_DELTA = config.get('EARLY_STOPPING_MIN_DELTA', 0.0001)
+# Full-batch training (one propagation per epoch): true, false, or null to pick it for graphs
+# with at most FULL_BATCH_MAX_NODES nodes. Full-batch runs use FULL_BATCH_LR instead of the model's lr
+FULL_BATCH = config.get('FULL_BATCH', False)
+FULL_BATCH_MAX_NODES = config.get('FULL_BATCH_MAX_NODES', 10000)
+FULL_BATCH_LR = config.get('FULL_BATCH_LR', 0.02)
+# Resumable training checkpoint, rewritten every TRAINING_CHECKPOINT_INTERVAL epochs
+TRAINING_CHECKPOINT_FILEPATH = config.get('TRAINING_CHECKPOINT_FILEPATH', './models/training_checkpoint.pt')
+TRAINING_CHECKPOINT_INTERVAL = config.get('TRAINING_CHECKPOINT_INTERVAL', 10)
+IS_RESUME_TRAINING = config.get('IS_RESUME_TRAINING', False)
 
 # Evaluation / models
 K_LIST = config.get('K_LIST', [1,3,5])
 EMBEDDING_DIM = config.get('EMBEDDING_DIM', 128)
 NUM_LAYERS = config.get('NUM_LAYERS', 5)
+MODEL_TYPE = config.get('MODEL_TYPE', 'lightgcn')
+# Propagate LightGCN/GCN over a cached normalized sparse adjacency (SpMM) instead of edge_index
+SPARSE_PROPAGATION = config.get('SPARSE_PROPAGATION', True)
 EVAL_INTERVAL = config.get('EVAL_INTERVAL', 10)
 TOP_K = config.get('TOP_K', 10)
+# Run full-graph forward passes through torch.compile / TorchScript when that beats eager mode (see compiled_forward.py)
+COMPILED_FORWARD = config.get('COMPILED_FORWARD', False)
+# GCN/GraphSAGE: score a student from their num_layers-hop subgraph and the cached course table instead of
+# full-graph embeddings (see CourseRecommendationModel.compute_local_embeddings); ignored for other models
+LOCAL_INFERENCE = config.get('LOCAL_INFERENCE', False)
+
+# Serving caches
+RANKING_CACHE_SIZE = config.get('RANKING_CACHE_SIZE', 10000)
+RANKING_CACHE_TTL = config.get('RANKING_CACHE_TTL', 300.0)
+RANKING_CACHE_MAX_RANKED = config.get('RANKING_CACHE_MAX_RANKED', 200)
+# Degrade from GNN scoring to the popularity list when the deadline is nearly spent or the server is busy
+GNN_TIER_MIN_TIME_REMAINING = config.get('GNN_TIER_MIN_TIME_REMAINING', 0.05)
+GNN_TIER_MAX_IN_FLIGHT = config.get('GNN_TIER_MAX_IN_FLIGHT', 8)
+# Cohort tier: top-N lists per (k-means cluster of student embeddings, semester bucket)
+COHORT_NUM_CLUSTERS = config.get('COHORT_NUM_CLUSTERS', 32)
+COHORT_TOP_N = config.get('COHORT_TOP_N', 50)
+COHORT_TIER_MIN_TIME_REMAINING = config.get('COHORT_TIER_MIN_TIME_REMAINING', 0.01)
+# Related courses: top-M neighbours by embedding cosine, blended with co-enrollment (0 disables the blend)
+RELATED_COURSES_TOP_M = config.get('RELATED_COURSES_TOP_M', 20)
+RELATED_COURSES_CO_ENROLLMENT_WEIGHT = config.get('RELATED_COURSES_CO_ENROLLMENT_WEIGHT', 0.3)
+# Serving snapshot written by serving_snapshot.py; workers boot from it while it matches the checkpoint and dataset
+SERVING_SNAPSHOT_FILEPATH = config.get('SERVING_SNAPSHOT_FILEPATH', './models/serving_snapshot.pt')
+# Traffic capture for replay_traffic.py: an empty directory disables it
+TRAFFIC_CAPTURE_DIR = config.get('TRAFFIC_CAPTURE_DIR', '')
+TRAFFIC_CAPTURE_MAX_BYTES = config.get('TRAFFIC_CAPTURE_MAX_BYTES', 64 * 1024 * 1024)
+TRAFFIC_CAPTURE_BACKUP_COUNT = config.get('TRAFFIC_CAPTURE_BACKUP_COUNT', 10)
+
+# Serving state: the inference-only model is built once per process and shared by all requests
+_serving_model = None
+_cohort_cache = None
+_course_similarity = None
+_serving_model_lock = threading.Lock()
+_ranking_paginator = RankingPaginator(max_entries=RANKING_CACHE_SIZE, ttl=RANKING_CACHE_TTL,
+                                      max_ranked=RANKING_CACHE_MAX_RANKED, local_inference=LOCAL_INFERENCE)
+# Identical concurrent requests (same student, filter, k, cursor and model version) share one computation
+_single_flight = SingleFlight()
+_tier_selector = TierSelector([
+    ('gnn', GNN_TIER_MIN_TIME_REMAINING, GNN_TIER_MAX_IN_FLIGHT),
+    ('cohort', COHORT_TIER_MIN_TIME_REMAINING, None),
+    ('popularity', 0.0, None),
+])
+
+def get_serving_model() -> CourseRecommendationModel:
+    """Build the serving state once (from a current snapshot when available) and return the cached serving model"""
+    global _serving_model, _cohort_cache, _course_similarity
+    if _serving_model is None:
+        with _serving_model_lock:
+            if _serving_model is None:
+                snapshot = _load_current_snapshot()
+                if snapshot is not None:
+                    _serving_model = CourseRecommendationModel.from_snapshot(snapshot)
+                    _cohort_cache = CohortCache.from_snapshot(snapshot['cohort'])
+                    _course_similarity = CourseSimilarityIndex.from_snapshot(snapshot['related'])
+                    print(f"Serving model loaded from snapshot '{SERVING_SNAPSHOT_FILEPATH}'")
+                else:
+                    _serving_model, _cohort_cache, _course_similarity = build_serving_state()
+                    print(f"Serving model loaded from '{TRAINED_MODEL_FILEPATH}'")
+    return _serving_model
+
+def build_serving_state():
+    """Load the dataset and checkpoint and build (model, cohort cache, course similarity index) from scratch"""
+    preprocessed_data = DataLoader.load_preprocessed_dataset(filepath=PREPROCESSED_DATASET_FILEPATH)
+    model = CourseRecommendationModel.from_checkpoint(
+        data=preprocessed_data, filepath=TRAINED_MODEL_FILEPATH,
+        embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS, model_type=MODEL_TYPE,
+        using_unenrolled_for_test=USING_UNENROLLED_FOR_TEST, unenrolled_rate_in_graph=UNENROLLED_RATE_IN_GRAPH,
+        sparse_propagation=SPARSE_PROPAGATION, compiled=COMPILED_FORWARD)
+    cohort_cache = CohortCache(num_clusters=COHORT_NUM_CLUSTERS, top_n=COHORT_TOP_N).build(model)
+    course_similarity = CourseSimilarityIndex(
+        top_m=RELATED_COURSES_TOP_M,
+        co_enrollment_weight=RELATED_COURSES_CO_ENROLLMENT_WEIGHT).build(model)
+    return model, cohort_cache, course_similarity
+
+def _load_current_snapshot():
+    """Return the serving snapshot, or None when it is missing, unreadable, older than its sources
+    or built with another MODEL_TYPE, EMBEDDING_DIM, NUM_LAYERS or SPARSE_PROPAGATION"""
+    if not SERVING_SNAPSHOT_FILEPATH or not os.path.exists(SERVING_SNAPSHOT_FILEPATH):
+        return None
+    try:
+        snapshot = load_snapshot(SERVING_SNAPSHOT_FILEPATH)
+    except Exception as e:
+        print(f"Ignoring serving snapshot '{SERVING_SNAPSHOT_FILEPATH}': {e}")
+        return None
+    if not is_snapshot_current(snapshot):
+        print(f"Ignoring stale serving snapshot '{SERVING_SNAPSHOT_FILEPATH}' (checkpoint or dataset changed)")
+        return None
+    mismatches = snapshot_mismatches(snapshot, {'model_type': MODEL_TYPE, 'embedding_dim': EMBEDDING_DIM,
+                                                'num_layers': NUM_LAYERS, 'sparse_propagation': SPARSE_PROPAGATION})
+    if mismatches:
+        print(f"Ignoring stale serving snapshot '{SERVING_SNAPSHOT_FILEPATH}' (built with {'; '.join(mismatches)})")
+        return None
+    return snapshot
+
+def serve_recommendations(student_id: int, semester_filter: int = 0, k: int = TOP_K):
+    """Answer one recommendation request with the cached serving model"""
+    model = get_serving_model()
+    return model.recommend_courses(student_id, semester_filter, k=k if k > 0 else TOP_K,
+                                   is_save_recommendations=IS_SAVE_RECOMMENDATIONS,
+                                   filepath_prefix=RECOMMENDATIONS_FILEPATH_PREFIX,
+                                   local_inference=LOCAL_INFERENCE and model.local_inference_available)
+
+def serve_recommendations_page(student_id: int, semester_filter: int = 0, k: int = TOP_K, cursor: str = ''):
+    """Answer one page of recommendations; returns (recommendations, next_cursor)"""
+    model = get_serving_model()
+    k = k if k > 0 else TOP_K
+    key = ('page', student_id, semester_filter, k, cursor, model.model_version)
+    return _single_flight.do(key, _ranking_paginator.page, model, student_id, semester_filter, k=k, cursor=cursor)
+
+def serve_multi_semester_recommendations(student_id: int, semester_filters=None, k: int = TOP_K):
+    """Answer a multi-semester request; an empty semester_filters means every semester in SEMESTER_RANGE"""
+    semester_filters = _expand_semester_filters(semester_filters)
+    model = get_serving_model()
+    k = k if k > 0 else TOP_K
+    key = ('multi', student_id, tuple(semester_filters), k, model.model_version)
+    return _single_flight.do(key, model.recommend_courses_multi_semester, student_id, semester_filters, k=k)
+
+def serve_with_fallback(student_id: int, semester_filter: int = 0, k: int = TOP_K, cursor: str = '',
+                        semester_filters=None, multi_semester: bool = False, time_remaining=None):
+    """Serve a request from the tier picked by the remaining deadline and current load
+
+    Args:
+        time_remaining: seconds left before the caller's deadline, or None without a deadline
+    Returns:
+        (recommendations, next_cursor, tier)
+    """
+    # Validate once up front so every tier rejects a bad student_id the same way, whatever the load
+    get_serving_model().check_student_id(student_id)
+    with _tier_selector.track() as in_flight:
+        # Follow-up pages are slices of a cached ranking, cheaper than any fallback
+        tier = 'gnn' if cursor else _tier_selector.choose(time_remaining, in_flight)
+        next_cursor = ''
+        k = k if k > 0 else TOP_K
+        if tier == 'gnn':
+            if multi_semester:
+                recommendations = serve_multi_semester_recommendations(student_id, semester_filters, k)
+            else:
+                recommendations, next_cursor = serve_recommendations_page(student_id, semester_filter, k, cursor)
+        else:
+            model = get_serving_model()
+            if tier == 'cohort':
+                cohort_cache = _current_cohort_cache(model)
+                ranker = lambda f: cohort_cache.recommend(model, student_id, f, k)
+            else:
+                ranker = lambda f: model.recommend_popular(student_id, f, k)
+            if multi_semester:
+                recommendations = {f: ranker(f) for f in _expand_semester_filters(semester_filters)}
+            else:
+                recommendations = ranker(semester_filter)
+        _tier_selector.record(tier)
+    return recommendations, next_cursor, tier
+
+def resolve_student_id(student_id: int = 0, student_code: str = '') -> int:
+    """Map an external student code to its model row; without a code student_id is already a row"""
+    return get_serving_model().resolve_student(student_code) if student_code else student_id
+
+def resolve_course_id(course_id: int = 0, course_code: str = '') -> int:
+    """Map an external course code to its model row; without a code course_id is already a row"""
+    return get_serving_model().resolve_course(course_code) if course_code else course_id
+
+def serve_related_courses(course_id: int, k: int = TOP_K):
+    """Answer a "courses similar to X" request from the precomputed neighbour table"""
+    model = get_serving_model()
+    if _course_similarity.model_version != model.model_version:
+        # Embeddings changed since the table was built (e.g. enrollment updates); rebuild once
+        with _serving_model_lock:
+            if _course_similarity.model_version != model.model_version:
+                _course_similarity.build(model)
+    return _course_similarity.related(course_id, k if k > 0 else TOP_K)
+
+def _current_cohort_cache(model):
+    """Return the cohort cache, rebuilt once when the embeddings changed since it was built"""
+    if _cohort_cache.model_version != model.model_version:
+        # Enrollment updates move the student embeddings, and so the cluster assignments
+        with _serving_model_lock:
+            if _cohort_cache.model_version != model.model_version:
+                _cohort_cache.build(model)
+    return _cohort_cache
+
+def _expand_semester_filters(semester_filters=None):
+    """An empty list of semester filters means every semester in SEMESTER_RANGE"""
+    if not semester_filters:
+        return list(range(SEMESTER_RANGE[0], SEMESTER_RANGE[1] + 1))
+    return [int(f) for f in semester_filters]
+
+def get_serving_stats():
+    """Counters describing the serving process (request deduplication, ranking cache size)"""
+    return {
+        'model_version': get_serving_model().model_version,
+        'single_flight': _single_flight.stats(),
+        'ranking_cache_entries': len(_ranking_paginator.rankings),
+        'tiers': _tier_selector.stats()
+    }
 
 def call_model_recommendation_system(student_id=1, semester_filter=0, k=10):  
     # Step 1: Generate dataset if needed
@@ -215,16 +425,22 @@ def call_model_recommendation_system(student_id=1, semester_filter=0, k=10):
         print(f"  - Courses: {len(preprocessed_data['courses'])}")
         print(f"  - Enrollments: {len(preprocessed_data['enrollments'])}")
 
-    # Step 4: Train model
+    # Step 4: Train model (recommendation-only runs skip the optimizer and data splits)
     model = CourseRecommendationModel(data=preprocessed_data, embedding_dim=EMBEDDING_DIM, num_layers=NUM_LAYERS,
                  using_unenrolled_for_test=USING_UNENROLLED_FOR_TEST, unenrolled_rate_in_graph=UNENROLLED_RATE_IN_GRAPH,
-                 test_split=TEST_SPLIT, valid_split=VALID_SPLIT)
+                 test_split=TEST_SPLIT, valid_split=VALID_SPLIT, model_type=MODEL_TYPE,
+                 inference_only=not (IS_TRAIN_MODEL or IS_EVAL_MODEL), sparse_propagation=SPARSE_PROPAGATION,
+                 compiled=COMPILED_FORWARD)
     if IS_TRAIN_MODEL:
         print(f"\n[4] Training model...")
         model.train(num_epochs=NUM_EPOCHS, batch_size=BATCH_SIZE,
                 num_negative=NUM_NEGATIVE,
                 is_eval_during_training=True, ks=K_LIST,
-                is_save_model=True, filepath=TRAINED_MODEL_FILEPATH)
+                is_save_model=True, filepath=TRAINED_MODEL_FILEPATH,
+                full_batch=FULL_BATCH, full_batch_max_nodes=FULL_BATCH_MAX_NODES, full_batch_lr=FULL_BATCH_LR,
+                checkpoint_filepath=TRAINING_CHECKPOINT_FILEPATH, checkpoint_interval=TRAINING_CHECKPOINT_INTERVAL,
+                resume_from=TRAINING_CHECKPOINT_FILEPATH
+                if IS_RESUME_TRAINING and os.path.exists(TRAINING_CHECKPOINT_FILEPATH) else None)
     else:
         model.load_model(TRAINED_MODEL_FILEPATH)
         print(f"\n[4] Loaded trained model from '{TRAINED_MODEL_FILEPATH}'")
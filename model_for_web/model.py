@@ -1,4 +1,4 @@
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 import torch
 from collections import defaultdict
 from sklearn.model_selection import train_test_split
@@ -11,12 +11,19 @@ import time
 
 from graph_builder import GraphBuilder
 from basic_gnn_models import LightGCNRecommender, GCNRecommender, GraphSAGERecommender, KGATRecommender
+from batch_producer import BatchProducer
+from checkpointing import AsyncCheckpointWriter, capture_rng_state, clone_state, restore_rng_state, save_atomic
+from compiled_forward import CompiledForward
+from delta_propagation import LightGCNDeltaPropagator
+from id_mapping import IdMapping
+from serving_snapshot import CsrRows
 
 class CourseRecommendationModel:
     """Main recommendation system with multiple model support"""
     def __init__(self, data: Dict, embedding_dim: int = 64, num_layers: int = 3,
                  using_unenrolled_for_test: bool = False, unenrolled_rate_in_graph: float = 0.0,
-                 test_split: float = 0.2, valid_split: float = 0.1, model_type: str = 'lightgcn'):
+                 test_split: float = 0.2, valid_split: float = 0.1, model_type: str = 'lightgcn',
+                 inference_only: bool = False, sparse_propagation: bool = True, compiled: bool = False):
         """
         Args:
             data: Course dataset
@@ -27,6 +34,13 @@ class CourseRecommendationModel:
             test_split: Proportion of data to use for testing
             valid_split: Proportion of data to use for validation
             model_type: Type of GNN model to use ('lightgcn', 'gcn', 'graphsage', 'kgat')
+            inference_only: Skip the optimizer and the train/valid/test split; only build
+                the exclusion index needed to serve recommendations
+            sparse_propagation: Propagate with a cached normalized sparse adjacency (SpMM)
+                instead of message passing over edge_index (not used by KGAT)
+            compiled: Run full-graph forward passes (training, validation, evaluation and the
+                serving embedding refresh) through CompiledForward: torch.compile, else a
+                TorchScript trace, whichever beats eager mode in its warm-up benchmark
         """
         self.data = data
         self.embedding_dim = embedding_dim
@@ -39,6 +53,8 @@ class CourseRecommendationModel:
         self.test_split = test_split
         self.valid_split = valid_split
         self.model_type = model_type
+        self.inference_only = inference_only
+        self.sparse_propagation = sparse_propagation
         
         # Determine if features are needed based on model type
         self.use_features = model_type in ['gcn', 'graphsage']
@@ -50,19 +66,98 @@ class CourseRecommendationModel:
 
         self.num_students = len(data['students'])
         self.num_courses = len(data['courses'])
+        # External student codes / course ids <-> dense rows of the embedding tables. Course codes are
+        # not unique (a re-opened course keeps its code), so courses are keyed on course_id
+        self.student_id_map = IdMapping.from_records(data['students'], 'student_code', 'student_id')
+        self.course_id_map = IdMapping.from_records(data['courses'], 'course_id', 'course_id')
+        self._build_course_code_index(self._course_codes(data['courses']))
+        self._build_semester_index()
+        self._build_popularity_index()
         
         # Build model
         self.model = self._build_model()
-        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
+        self.learning_rate = 0.001
+        self.optimizer = None if inference_only else torch.optim.Adam(self.model.parameters(), lr=self.learning_rate)
+        self.compiled_forward = CompiledForward(self.model) if compiled else None
+
+        # Final embedding tables cached for serving; filled lazily by get_embeddings().
+        # model_version changes whenever the served embeddings change.
+        self.model_version = 0
+        self.user_embedding_cache = None
+        self.item_embedding_cache = None
+        self.delta_propagator = None
+        # CSR adjacency (indptr, indices) used for k-hop lookups; built lazily
+        self.adjacency_csr = None
         
-        # Prepare training data
-        self._prepare_training_data()
+        # Prepare training data (serving only needs the enrolled courses to exclude)
+        if inference_only:
+            self.model.eval()
+            self._build_exclusion_index()
+        else:
+            self._prepare_training_data()
+
+    @classmethod
+    def from_checkpoint(cls, data: Dict, filepath: str, **kwargs) -> 'CourseRecommendationModel':
+        """Build an inference-only model from a saved checkpoint and warm its embedding cache
+
+        Args:
+            data: Course dataset the checkpoint was trained on
+            filepath: Path to the saved model state
+            **kwargs: Remaining constructor arguments (embedding_dim, num_layers, model_type, ...)
+        """
+        model = cls(data, inference_only=True, **kwargs)
+        model.load_model(filepath)
+        model.refresh_embeddings()
+        return model
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> 'CourseRecommendationModel':
+        """Build a read-only serving model from a loaded serving snapshot (see serving_snapshot.py)
+
+        No dataset, graph or network is constructed: embeddings, masks and
+        exclusions are used directly from the (memory-mapped) snapshot tensors.
+        Methods that need the graph or the weights raise a RuntimeError.
+        """
+        meta = snapshot['meta']
+        model = cls.__new__(cls)
+        model.data = None
+        model.graph_builder = None
+        model.graph = None
+        model.model = None
+        model.optimizer = None
+        model.compiled_forward = None
+        model.inference_only = True
+        model.sparse_propagation = False
+        model.model_type = meta['model_type']
+        model.use_features = model.model_type in ['gcn', 'graphsage']
+        model.embedding_dim = snapshot['user_embedding'].size(1)
+        model.num_layers = meta['num_layers']
+        model.num_students = meta['num_students']
+        model.num_courses = meta['num_courses']
+        model.student_id_map = IdMapping(snapshot['student_ids'])
+        model.course_id_map = IdMapping(snapshot['course_ids'])
+        model._build_course_code_index(snapshot['course_codes'])
+        model.student_semesters = snapshot['student_semesters']
+        model.course_semesters = snapshot['course_semesters']
+        model.semester_course_masks = {int(s): mask for s, mask in
+                                       zip(snapshot['mask_semesters'].tolist(), snapshot['semester_course_masks'])}
+        model.course_popularity = snapshot['course_popularity']
+        model.user_positive_items = CsrRows(snapshot['exclusion_indptr'].numpy(), snapshot['exclusion_indices'].numpy())
+        model.model_version = meta['model_version']
+        model.user_embedding_cache = snapshot['user_embedding']
+        model.item_embedding_cache = snapshot['item_embedding']
+        model.delta_propagator = None
+        model.adjacency_csr = None
+        return model
 
     def train(self, num_epochs: int = 50, batch_size: int = 256,
             num_negative: int = 1,
             is_eval_during_training: bool = False, ks: List[int] = [1, 3, 10],
             is_save_model: bool = True, filepath: str = "./model/final_model_state.pth",
-            early_stopping_patience: int = 10, early_stopping_min_delta: float = 0.0001):
+            early_stopping_patience: int = 10, early_stopping_min_delta: float = 0.0001,
+            full_batch: Optional[bool] = False, full_batch_max_nodes: int = 10000, full_batch_lr: float = 0.02,
+            checkpoint_filepath: Optional[str] = None, checkpoint_interval: int = 10,
+            resume_from: Optional[str] = None):
         """Train the recommendation model with early stopping support
         
         Args:
@@ -75,121 +170,143 @@ class CourseRecommendationModel:
             filepath: Path to save the model
             early_stopping_patience: Number of epochs to wait for improvement before stopping
             early_stopping_min_delta: Minimum change in validation loss to qualify as an improvement
+            full_batch: Take one optimizer step per epoch over all training pairs, so the graph is
+                propagated once per epoch instead of once per batch. Off by default; None picks
+                full-batch automatically when the graph has at most full_batch_max_nodes nodes.
+                Mini-batch training keeps the optimizer at self.learning_rate.
+            full_batch_max_nodes: Largest graph trained full-batch when full_batch is None
+            full_batch_lr: Learning rate used in full-batch mode, which takes one step per epoch
+                instead of one per batch
+            checkpoint_filepath: Write a resumable checkpoint (weights, optimizer, RNG states, epoch and
+                early-stopping counters) here every checkpoint_interval epochs and when training ends.
+                Snapshots are cloned in the training thread and written by a background thread.
+            checkpoint_interval: Epochs between periodic checkpoints
+            resume_from: Checkpoint written through checkpoint_filepath to continue training from
         """
+        if self.inference_only:
+            raise RuntimeError("Cannot train a model constructed with inference_only=True")
         best_val_loss = float('inf')
         best_model_state = None
         patience_counter = 0
         start_time = time.time()
         stop_epoch = num_epochs
+        self._invalidate_embeddings()
+        # Draw validation negatives once for this run (see _validation_negatives)
+        self.valid_negatives = None
+        start_epoch = 0
+        if resume_from is not None:
+            start_epoch, best_val_loss, patience_counter, best_model_state = self._restore_checkpoint(resume_from)
+        if full_batch is None:
+            full_batch = self.graph.num_nodes <= full_batch_max_nodes
+        if full_batch:
+            batch_size = max(len(self.train_samples), 1)
+        for group in self.optimizer.param_groups:
+            group['lr'] = full_batch_lr if full_batch else self.learning_rate
+        print(f"Training {'full-batch' if full_batch else f'in mini-batches of {batch_size}'} "
+              f"over {self.graph.num_nodes} nodes")
 
-        for epoch in range(num_epochs):
-            self.model.train(mode=True)
+        # Build the sampler index here rather than lazily from both the producer and validation threads
+        if self.positive_keys is None:
+            self._build_negative_sampling_index()
+        if self.compiled_forward is not None:
+            # Compile and benchmark before the first epoch (eval mode is built too, for validation)
+            self.compiled_forward.warm_up(self._forward_inputs(), training=True)
+        with BatchProducer(self.train_samples, batch_size, num_negative, self._negative_sampling,
+                           num_epochs - start_epoch, shuffle=not full_batch) as producer, \
+                AsyncCheckpointWriter() as checkpoint_writer:
+            for epoch in range(start_epoch, num_epochs):
+                self.model.train(mode=True)
 
-            total_loss = 0
-            num_batches = 0
+                total_loss = 0
+                num_batches = 0
             
-            # Shuffle training samples
-            train_samples = self.train_samples.copy()
-            np.random.shuffle(train_samples)
-            
-            for i in range(0, len(train_samples), batch_size):
-                batch = train_samples[i:i + batch_size]
-                user_ids = [s[0] for s in batch]
-                positive_items = [s[1] for s in batch]
-                
-                # Negative sampling
-                negative_samples = self._negative_sampling(user_ids, num_negative)
-                negative_items = [s[1] for s in negative_samples]
-                
-                # Forward pass
-                if self.model_type in ['lightgcn', 'kgat']:
-                    user_embedding, item_embedding = self.model(self.graph.edge_index)
-                    users = user_embedding[user_ids]
-                    positive_items_embedding = item_embedding[positive_items]
-                    negative_items_embedding = item_embedding[negative_items]  
-                else:  # GCN, GraphSAGE
-                    embeddings = self.model(self.graph.x, self.graph.edge_index)
-                    users = embeddings[user_ids]
-                    positive_items_embedding = embeddings[[p + self.num_students for p in positive_items]]
-                    negative_items_embedding = embeddings[[n + self.num_students for n in negative_items]]
+                # Batches are shuffled with randperm and negatives sampled by the producer thread,
+                # overlapping with the forward/backward pass of the previous batch
+                for user_ids, positive_items, negative_items in producer.epoch():
+                    # Forward pass
+                    if self.model_type in ['lightgcn', 'kgat']:
+                        user_embedding, item_embedding = self._full_graph_forward()
+                        users = user_embedding[user_ids]
+                        positive_items_embedding = item_embedding[positive_items]
+                        negative_items_embedding = item_embedding[negative_items]  
+                    else:  # GCN, GraphSAGE
+                        embeddings = self._full_graph_forward()
+                        users = embeddings[user_ids]
+                        positive_items_embedding = embeddings[positive_items + self.num_students]
+                        negative_items_embedding = embeddings[negative_items + self.num_students]
                 
-                # BPR loss supporting multiple negatives per positive
-                # negative_items_embedding currently shape: (batch_size * num_negative, emb_dim)
-                # Reshape to (batch_size, num_negative, emb_dim) to align with users
-                if num_negative > 0:
-                    # Ensure we have the expected number of negatives
-                    expected = len(user_ids) * num_negative
-                    if negative_items_embedding.size(0) != expected:
-                        raise RuntimeError(
-                            f"Negative sampling size mismatch: got {negative_items_embedding.size(0)}, expected {expected}."
-                        )
-                    negative_items_embedding = negative_items_embedding.view(len(user_ids), num_negative, -1)
-                else:
-                    raise ValueError("num_negative must be >= 1")
-
-                # positive scores: (batch, 1)
-                positive_scores = (users * positive_items_embedding).sum(dim=1, keepdim=True)
-                # negative scores: (batch, num_negative)
-                negative_scores = (users.unsqueeze(1) * negative_items_embedding).sum(dim=2)
-                # BPR: average over all negatives
-                loss = -F.logsigmoid(positive_scores - negative_scores).mean()
+                    # BPR loss supporting multiple negatives per positive
+                    # negative_items_embedding currently shape: (batch_size * num_negative, emb_dim)
+                    # Reshape to (batch_size, num_negative, emb_dim) to align with users
+                    if num_negative > 0:
+                        # Ensure we have the expected number of negatives
+                        expected = len(user_ids) * num_negative
+                        if negative_items_embedding.size(0) != expected:
+                            raise RuntimeError(
+                                f"Negative sampling size mismatch: got {negative_items_embedding.size(0)}, expected {expected}."
+                            )
+                        negative_items_embedding = negative_items_embedding.view(len(user_ids), num_negative, -1)
+                    else:
+                        raise ValueError("num_negative must be >= 1")
+
+                    # positive scores: (batch, 1)
+                    positive_scores = (users * positive_items_embedding).sum(dim=1, keepdim=True)
+                    # negative scores: (batch, num_negative)
+                    negative_scores = (users.unsqueeze(1) * negative_items_embedding).sum(dim=2)
+                    # BPR: average over all negatives
+                    loss = -F.logsigmoid(positive_scores - negative_scores).mean()
                 
-                # Backward pass
-                self.optimizer.zero_grad()
-                loss.backward()
-                self.optimizer.step()
+                    # Backward pass
+                    self.optimizer.zero_grad()
+                    loss.backward()
+                    self.optimizer.step()
                 
-                total_loss += loss.item()
-                num_batches += 1
-            train_loss = total_loss / num_batches
+                    total_loss += loss.item()
+                    num_batches += 1
+                train_loss = total_loss / num_batches
             
-            # Compute validation loss for early stopping
-            val_loss = self._compute_validation_loss(batch_size, num_negative)
+                # Compute validation loss for early stopping
+                val_loss = self._compute_validation_loss(num_negative)
             
-            # Evaluate during training if requested
-            if is_eval_during_training:
-                eval_results = self.evaluate(ks)
-                eval_str = ', '.join([f"Hit@{k}: {eval_results[f'hit@{k}']:.4f}, NDCG@{k}: {eval_results[f'ndcg@{k}']:.4f}" for k in ks])
-                print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f} \n {eval_str} \n MRR: {eval_results['mrr']:.4f}")
-            else:
-                print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
+                # Evaluate during training if requested
+                if is_eval_during_training:
+                    eval_results = self.evaluate(ks)
+                    eval_str = ', '.join([f"Hit@{k}: {eval_results[f'hit@{k}']:.4f}, NDCG@{k}: {eval_results[f'ndcg@{k}']:.4f}" for k in ks])
+                    print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f} \n {eval_str} \n MRR: {eval_results['mrr']:.4f}")
+                else:
+                    print(f"Epoch {epoch+1}/{num_epochs} - Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
             
-            # Early stopping logic
-            if val_loss < best_val_loss - early_stopping_min_delta:
-                best_val_loss = val_loss
-                best_model_state = self.model.state_dict().copy()
-                patience_counter = 0
-                print(f"  → Validation loss improved to {val_loss:.4f}. Saving best model.")
-            else:
-                patience_counter += 1
-                print(f"  → No improvement. Patience: {patience_counter}/{early_stopping_patience}")
+                # Early stopping logic
+                if val_loss < best_val_loss - early_stopping_min_delta:
+                    best_val_loss = val_loss
+                    best_model_state = clone_state(self.model.state_dict())
+                    patience_counter = 0
+                    print(f"  → Validation loss improved to {val_loss:.4f}. Saving best model.")
+                else:
+                    patience_counter += 1
+                    print(f"  → No improvement. Patience: {patience_counter}/{early_stopping_patience}")
                 
-                if patience_counter >= early_stopping_patience:
-                        print(f"Early stopping triggered after {epoch+1} epochs.")
-                        # Restore best model
-                        if best_model_state is not None:
-                            self.model.load_state_dict(best_model_state)
-                            print("Restored best model from early stopping.")
-                        stop_epoch = epoch + 1
-                        break
-
-        # if is_save_model:
-            # # Save final (or best) model state into a file
-            # # Ensure parent directory exists to avoid IO errors (e.g., on Kaggle)
-            # import os
-            # parent = os.path.dirname(filepath) or '.'
-            # try:
-            #     os.makedirs(parent, exist_ok=True)
-            # except Exception:
-            #     # If creating directories fails, continue and let torch.save raise the error
-            #     pass
-
-            # if best_model_state is not None:
-            #     torch.save(best_model_state, filepath)
-            #     print(f"Best model state saved to '{filepath}'")
-            # else:
-            #     torch.save(self.model.state_dict(), filepath)
-            #     print(f"Final model state saved to '{filepath}'")
+                    if patience_counter >= early_stopping_patience:
+                            print(f"Early stopping triggered after {epoch+1} epochs.")
+                            # Restore best model
+                            if best_model_state is not None:
+                                self.model.load_state_dict(best_model_state)
+                                print("Restored best model from early stopping.")
+                            stop_epoch = epoch + 1
+                            break
+
+                if checkpoint_filepath and (epoch + 1) % checkpoint_interval == 0:
+                    checkpoint_writer.submit(self._training_checkpoint(epoch + 1, best_val_loss, patience_counter,
+                                                                       best_model_state), checkpoint_filepath)
+
+            if checkpoint_filepath and num_epochs > start_epoch:
+                checkpoint_writer.submit(self._training_checkpoint(epoch + 1, best_val_loss, patience_counter,
+                                                                   best_model_state), checkpoint_filepath)
+
+        if is_save_model:
+            # Save the best (or final) weights together with the id mappings
+            self.save_model(filepath, best_model_state)
+            print(f"{'Best' if best_model_state is not None else 'Final'} model state saved to '{filepath}'")
 
         # If training finished without triggering early stopping, record final epoch
         if not hasattr(self, 'stop_epoch'):
@@ -227,6 +344,8 @@ class CourseRecommendationModel:
         if isinstance(model_state, dict):
             if 'state_dict' in model_state:
                 state_dict = model_state['state_dict']
+                if 'id_maps' in model_state:
+                    self._check_id_maps(model_state['id_maps'], filepath)
             elif 'model_state' in model_state:
                 state_dict = model_state['model_state']
             else:
@@ -296,17 +415,89 @@ class CourseRecommendationModel:
 
             print('\n'.join(msg_lines))
 
+        self._invalidate_embeddings()
+
+    def save_model(self, filepath: str, state_dict: Dict = None):
+        """Save the model state together with the student/course id mappings
+
+        Args:
+            filepath: Destination checkpoint path
+            state_dict: State to save instead of the current weights (e.g. the best early-stopping state)
+        """
+        save_atomic({
+            'state_dict': state_dict if state_dict is not None else self.model.state_dict(),
+            'id_maps': self._id_maps_state()
+        }, filepath)
+
+    def _id_maps_state(self) -> Dict[str, List[str]]:
+        return {'students': self.student_id_map.state_dict(), 'courses': self.course_id_map.state_dict()}
+
+    def _training_checkpoint(self, epoch: int, best_val_loss: float, patience_counter: int,
+                             best_model_state: Optional[Dict]) -> Dict:
+        """Cloned snapshot of everything train() needs to continue after `epoch` completed epochs
+
+        The weights are stored under 'state_dict' like save_model, so load_model also accepts it.
+        best_model_state and valid_negatives are shared rather than cloned: they are replaced,
+        never modified in place.
+        """
+        return {
+            'state_dict': clone_state(self.model.state_dict()),
+            'id_maps': self._id_maps_state(),
+            'model_type': self.model_type,
+            'epoch': epoch,
+            'optimizer': clone_state(self.optimizer.state_dict()),
+            'rng': capture_rng_state(),
+            'early_stopping': {'best_val_loss': best_val_loss, 'patience_counter': patience_counter},
+            'best_state_dict': best_model_state,
+            'valid_negatives': self.valid_negatives
+        }
+
+    def _restore_checkpoint(self, filepath: str) -> Tuple[int, float, int, Optional[Dict]]:
+        """Load a _training_checkpoint; returns (epoch, best_val_loss, patience_counter, best_model_state)"""
+        checkpoint = torch.load(filepath, weights_only=True)
+        if checkpoint['model_type'] != self.model_type:
+            raise ValueError(f"Checkpoint '{filepath}' is for model type '{checkpoint['model_type']}', "
+                             f"not '{self.model_type}'")
+        self._check_id_maps(checkpoint['id_maps'], filepath)
+        self.model.load_state_dict(checkpoint['state_dict'])
+        self.optimizer.load_state_dict(checkpoint['optimizer'])
+        restore_rng_state(checkpoint['rng'])
+        self.valid_negatives = checkpoint['valid_negatives']
+        self._invalidate_embeddings()
+        early_stopping = checkpoint['early_stopping']
+        print(f"Resuming from '{filepath}' after epoch {checkpoint['epoch']}")
+        return (checkpoint['epoch'], early_stopping['best_val_loss'], early_stopping['patience_counter'],
+                checkpoint['best_state_dict'])
+
+    def resolve_student(self, student_code: str) -> int:
+        """Return the model row of an external student code; raises ValueError when unknown"""
+        if student_code not in self.student_id_map:
+            raise ValueError(f"Unknown student_code: {student_code}")
+        return self.student_id_map.row(student_code)
+
+    def check_student_id(self, student_id: int) -> int:
+        """Return student_id if it is a model row; raises ValueError otherwise (negative rows would wrap around)"""
+        if not 0 <= student_id < self.num_students:
+            raise ValueError(f"student_id {student_id} is out of range [0, {self.num_students})")
+        return student_id
+
+    def resolve_course(self, course_code: str) -> int:
+        """Return the model row of an external course code; raises ValueError when unknown or ambiguous"""
+        rows = self.course_rows_by_code.get(course_code)
+        if not rows:
+            raise ValueError(f"Unknown course_code: {course_code}")
+        if len(rows) > 1:
+            raise ValueError(f"course_code {course_code} is shared by course_ids {rows}; pass course_id instead")
+        return rows[0]
+
     def evaluate(self, ks: List[int] = [1, 3, 10]) -> Dict[str, float]:
         """Evaluate on test set for multiple k values"""
+        if self.inference_only:
+            raise RuntimeError("Cannot evaluate a model constructed with inference_only=True (no test split)")
         self.model.eval()
         
         with torch.no_grad():
-            if self.model_type in ['lightgcn', 'kgat']:
-                user_embedding, item_embedding = self.model(self.graph.edge_index)
-            else:
-                embeddings = self.model(self.graph.x, self.graph.edge_index)
-                user_embedding = embeddings[:self.num_students]
-                item_embedding = embeddings[self.num_students:]
+            user_embedding, item_embedding = self._compute_embeddings()
         
         test_users = list(set([s[0] for s in self.test_samples]))
         metrics = {f'hit@{k}': [] for k in ks}
@@ -358,68 +549,24 @@ class CourseRecommendationModel:
     
     def recommend_courses(self, student_id: int, semester_filter: int = 0,
                           k: int = 10,
-                          is_save_recommendations: bool = True, filepath_prefix: str = './data/recommendations') -> List[Dict]:
-        """Recommend top-k courses for a student that are at or below their current semester level"""
-        self.model.eval()
-        
-        # Get student's current semester
-        student_info = next(s for s in self.data['students'] if s['student_id'] == student_id)
-        student_semester = student_info['semester']
-        
+                          is_save_recommendations: bool = True, filepath_prefix: str = './data/recommendations',
+                          local_inference: bool = False) -> List[Dict]:
+        """Recommend top-k courses for a student that are at or below their current semester level
+
+        With local_inference=True (GCN/GraphSAGE only) the student vector is computed
+        on its num_layers-hop subgraph and scored against the cached course embeddings,
+        so no full-graph forward pass runs per request (see get_item_embeddings).
+        """
         with torch.no_grad():
-            if self.model_type in ['lightgcn', 'kgat']:
-                user_embedding, item_embedding = self.model(self.graph.edge_index)
-            else:
-                embeddings = self.model(self.graph.x, self.graph.edge_index)
-                user_embedding = embeddings[:self.num_students]
-                item_embedding = embeddings[self.num_students:]
-            
             # Compute scores
-            user_vec = user_embedding[student_id]
-            scores = torch.matmul(item_embedding, user_vec)
-            
-            # Remove already enrolled courses
-            enrolled_courses = list(self.user_positive_items[student_id])
-            scores[enrolled_courses] = -float('inf')
+            user_vec, item_embedding = self._student_and_item_embeddings(student_id, local_inference)
+            scores = torch.matmul(item_embedding, user_vec).unsqueeze(0)
             
-            # Remove courses from higher semesters
-            for course_id in range(len(scores)):
-                course_info = next(c for c in self.data['courses'] if c['course_id'] == course_id)
-
-                if semester_filter > 0:
-                    if course_info['semester'] != semester_filter:
-                        scores[course_id] = -float('inf')
-                else:
-                    if course_info['semester'] > student_semester:
-                        scores[course_id] = -float('inf')
-            
-            # Get more recommendations than needed in case some are filtered
-            top_scores, candidate_items = torch.topk(scores, min(k * 2, len(scores)))
-            candidate_items = candidate_items.cpu().numpy()
-            top_scores = top_scores.cpu().numpy()
-            
-            # Filter and take only top k valid recommendations
-            valid_items = []
-            valid_scores = []
-            for idx, (item, score) in enumerate(zip(candidate_items, top_scores)):
-                if score > -float('inf') and len(valid_items) < k:
-                    valid_items.append(item)
-                    valid_scores.append(float(score))  # Convert to Python float
-            
-            top_k_items = valid_items
-            top_scores = valid_scores
+            # Remove already enrolled courses and courses outside the semester filter
+            scores = self._mask_scores(scores, torch.LongTensor([student_id]), semester_filter)
+            top_scores, top_k_items = torch.topk(scores[0], min(k, scores.size(1)))
         
-        # Format recommendations
-        recommendations = []
-        for idx, (course_id, score) in enumerate(zip(top_k_items, top_scores)):
-            # Ensure plain Python types for JSON serialization
-            py_course_id = int(course_id)  # cast possible numpy/int64
-            py_score = float(score)
-            recommendations.append({
-                'rank': int(idx + 1),
-                'course_id': py_course_id,
-                'score': py_score
-            })
+        recommendations = self.format_recommendations(top_k_items.tolist(), top_scores.tolist())
 
         if is_save_recommendations:
             # Save recommendations to a file
@@ -441,11 +588,210 @@ class CourseRecommendationModel:
             print(f"Recommendations saved to '{filepath}'")
         return recommendations
 
+    def recommend_popular(self, student_id: int, semester_filter: int = 0, k: int = 10) -> List[Dict]:
+        """Cheap fallback: most-enrolled courses with the same exclusions as recommend_courses
+
+        Scores are enrollment counts; no embeddings or model forward are needed.
+        """
+        self.check_student_id(student_id)
+        scores = self.course_popularity.clone().unsqueeze(0)
+        scores = self._mask_scores(scores, torch.LongTensor([student_id]), semester_filter)
+        top_scores, top_items = torch.topk(scores[0], min(k, self.num_courses))
+        return self.format_recommendations(top_items.tolist(), top_scores.tolist())
+
+    def rank_courses(self, student_id: int, semester_filter: int = 0,
+                     limit: int = None, local_inference: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (course_ids, scores) of the student's allowed courses in ranked order
+
+        Same exclusions and local_inference option as recommend_courses; at most
+        `limit` entries (all when None).
+        """
+        with torch.no_grad():
+            user_vec, item_embedding = self._student_and_item_embeddings(student_id, local_inference)
+            scores = torch.matmul(item_embedding, user_vec).unsqueeze(0)
+            scores = self._mask_scores(scores, torch.LongTensor([student_id]), semester_filter)[0]
+            limit = self.num_courses if limit is None else min(limit, self.num_courses)
+            top_scores, top_items = torch.topk(scores, limit)
+        valid = top_scores > -float('inf')
+        return top_items[valid].numpy(), top_scores[valid].numpy()
+
+    def recommend_courses_batch(self, student_ids: List[int], semester_filter: int = 0,
+                                k: int = 10) -> List[List[Dict]]:
+        """Recommend top-k courses for many students sharing one semester_filter
+
+        Scores the whole batch with one matmul and one masked top-k. Returns one
+        recommendation list per student, in the same format as recommend_courses.
+        """
+        with torch.no_grad():
+            user_embedding, item_embedding = self.get_embeddings()
+            student_ids = torch.as_tensor(student_ids, dtype=torch.long)
+            scores = torch.matmul(user_embedding[student_ids], item_embedding.T)
+            scores = self._mask_scores(scores, student_ids, semester_filter)
+            top_scores, top_items = torch.topk(scores, min(k, scores.size(1)), dim=1)
+        return [self.format_recommendations(items, item_scores)
+                for items, item_scores in zip(top_items.tolist(), top_scores.tolist())]
+
+    def recommend_courses_multi_semester(self, student_id: int, semester_filters: List[int],
+                                         k: int = 10) -> Dict[int, List[Dict]]:
+        """Recommend top-k courses for one student under several semester filters at once
+
+        The score vector is computed once and every filter is applied as a
+        precomputed course mask, so all lists come from a single batched top-k.
+        Returns a dict mapping each semester filter to its recommendation list.
+        """
+        self.check_student_id(student_id)
+        semester_filters = [int(f) for f in semester_filters]
+        with torch.no_grad():
+            user_embedding, item_embedding = self.get_embeddings()
+            student = torch.LongTensor([student_id])
+            scores = torch.matmul(item_embedding, user_embedding[student_id]).unsqueeze(0)
+            self._mask_enrolled(scores, student)
+            allowed = torch.cat([self._semester_allowed(student, f) for f in semester_filters], dim=0)
+            scores = scores.expand(len(semester_filters), -1).masked_fill(~allowed, -float('inf'))
+            top_scores, top_items = torch.topk(scores, min(k, scores.size(1)), dim=1)
+        return {f: self.format_recommendations(items, item_scores)
+                for f, items, item_scores in zip(semester_filters, top_items.tolist(), top_scores.tolist())}
+
+    def get_embeddings(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return cached (user_embedding, item_embedding), running a full forward pass if needed"""
+        if self.user_embedding_cache is None or self.item_embedding_cache is None:
+            self.refresh_embeddings()
+        return self.user_embedding_cache, self.item_embedding_cache
+
+    def refresh_embeddings(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Recompute and cache the final embedding tables over the full graph"""
+        self._require_graph('refresh_embeddings')
+        self.model.eval()
+        if self.model_type == 'lightgcn':
+            # Keep per-layer outputs so small graph changes can be patched incrementally
+            self.delta_propagator = LightGCNDeltaPropagator(self.model, self.graph.edge_index)
+            self.user_embedding_cache, self.item_embedding_cache = self.delta_propagator.refresh()
+        else:
+            with torch.no_grad():
+                self.user_embedding_cache, self.item_embedding_cache = self._compute_embeddings()
+        return self.user_embedding_cache, self.item_embedding_cache
+
+    def get_item_embeddings(self) -> torch.Tensor:
+        """Return the cached item embedding table without computing the user table
+
+        For GCN/GraphSAGE a cold table is computed on the course nodes' num_layers-hop
+        subgraph, once per model version; other models fall back to get_embeddings().
+        """
+        if self.item_embedding_cache is None:
+            if not self.local_inference_available:
+                return self.get_embeddings()[1]
+            course_nodes = np.arange(self.num_students, self.num_students + self.num_courses)
+            self.item_embedding_cache = self.compute_local_embeddings(course_nodes)
+        return self.item_embedding_cache
+
+    @property
+    def local_inference_available(self) -> bool:
+        """Whether compute_local_embeddings can run: GCN/GraphSAGE with the graph loaded"""
+        return self.model_type in ['gcn', 'graphsage'] and self.graph is not None
+
+    def compute_local_user_embedding(self, student_id: int) -> torch.Tensor:
+        """Compute one student's embedding from its num_layers-hop subgraph only (GCN/GraphSAGE)"""
+        return self.compute_local_embeddings([student_id])[0]
+
+    def compute_local_embeddings(self, node_ids) -> torch.Tensor:
+        """Compute the embeddings of some nodes from their num_layers-hop subgraph only (GCN/GraphSAGE).
+
+        The convolutions run on the induced subgraph around the nodes, so the
+        cost depends on the neighbourhood size rather than the graph size. GCN
+        reuses full-graph degrees for its normalization, which keeps the result
+        identical to the full forward pass.
+        """
+        if self.model_type not in ['gcn', 'graphsage']:
+            raise ValueError(f"Local inference is only supported for 'gcn' and 'graphsage', not '{self.model_type}'")
+        self._require_graph('local inference')
+        if self.adjacency_csr is None:
+            self.adjacency_csr = GraphBuilder.build_csr_adjacency(self.graph.edge_index, self.graph.num_nodes)
+        indptr, indices = self.adjacency_csr
+
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        nodes = GraphBuilder.k_hop_nodes(indptr, indices, node_ids, self.num_layers)
+        # Induced subgraph: keep entries whose source also lies inside the neighbourhood
+        row_pos, cols = GraphBuilder.gather_csr_rows(indptr, indices, nodes)
+        col_pos = np.searchsorted(nodes, cols)
+        inside = col_pos < len(nodes)
+        inside[inside] = nodes[col_pos[inside]] == cols[inside]
+        local_edge_index = torch.from_numpy(np.stack([col_pos[inside], row_pos[inside]]))
+        centers = torch.from_numpy(np.searchsorted(nodes, node_ids))
+        x = self.graph.x[torch.from_numpy(nodes)]
+
+        self.model.eval()
+        with torch.no_grad():
+            if self.model_type == 'gcn':
+                # Self loops plus symmetric normalization with the full-graph degrees
+                loops = torch.arange(len(nodes))
+                local_edge_index = torch.cat([local_edge_index, torch.stack([loops, loops])], dim=1)
+                deg_inv_sqrt = torch.from_numpy(np.diff(indptr)[nodes] + 1.0).float().pow(-0.5)
+                edge_weight = deg_inv_sqrt[local_edge_index[0]] * deg_inv_sqrt[local_edge_index[1]]
+                out = self.model.forward_normalized(x, local_edge_index, edge_weight)
+            else:
+                out = self.model(x, local_edge_index)
+        return out[centers]
+
+    def _student_and_item_embeddings(self, student_id: int,
+                                     local_inference: bool) -> Tuple[torch.Tensor, torch.Tensor]:
+        """(student vector, item table): local inference never touches the user table"""
+        if local_inference:
+            return self.compute_local_user_embedding(student_id), self.get_item_embeddings()
+        user_embedding, item_embedding = self.get_embeddings()
+        return user_embedding[student_id], item_embedding
+
+    def apply_enrollment_changes(self, added: List[Tuple[int, int]] = (), removed: List[Tuple[int, int]] = (),
+                                 verify: bool = False) -> int:
+        """Add/remove enrolled (student_id, course_id) edges and refresh the cached embeddings.
+
+        For LightGCN only the nodes within num_layers hops of the touched students
+        and courses are recomputed; other models fall back to a full forward pass.
+
+        Args:
+            added: enrolled (student_id, course_id) pairs to add to the graph
+            removed: enrolled (student_id, course_id) pairs to remove from the graph
+            verify: if True, check the incremental result against a full forward pass
+        Returns:
+            Number of nodes whose embeddings were recomputed.
+        """
+        self._require_graph('apply_enrollment_changes')
+        added = [(int(s), int(c)) for s, c in added]
+        removed = [(int(s), int(c)) for s, c in removed]
+        self.graph.edge_index = self._edit_edge_index(added, removed)
+        self.adjacency_csr = None
+        self.model_version += 1
+
+        for student_id, course_id in added:
+            self.user_positive_items[student_id].add(course_id)
+        for student_id, course_id in removed:
+            self.user_positive_items[student_id].discard(course_id)
+        self.positive_keys = None
+
+        if self.model_type == 'lightgcn' and self.delta_propagator is not None:
+            touched = set()
+            for student_id, course_id in added + removed:
+                touched.add(student_id)
+                touched.add(course_id + self.num_students)
+            affected = self.delta_propagator.update(self.graph.edge_index, touched, verify=verify)
+            return len(affected)
+
+        self.refresh_embeddings()
+        return self.num_students + self.num_courses
+
     def update_graph(self, new_graph: Union[Data, HeteroData]):
         """Update the graph with new data while preserving model weights"""
         self.heterogeneous_graph = new_graph
         self._prepare_training_data()
 
+    def _propagation_graph(self) -> torch.Tensor:
+        """Graph argument for the model's forward: the cached normalized sparse adjacency, or edge_index"""
+        if not self.sparse_propagation or self.model_type == 'kgat':
+            return self.graph.edge_index
+        # LGConv and GCNConv use symmetric normalization (GCNConv with self loops), SAGEConv a neighbour mean
+        normalization, add_self_loops = {'lightgcn': ('sym', False), 'gcn': ('sym', True),
+                                         'graphsage': ('mean', False)}[self.model_type]
+        return self.graph_builder.get_normalized_adjacency(self.graph.edge_index, normalization, add_self_loops)
+
     def _build_model(self):
         """Build the specified model"""
         if self.model_type == 'lightgcn':
@@ -470,52 +816,179 @@ class CourseRecommendationModel:
         else:
             raise ValueError(f"Unknown model type: {self.model_type}")
     
-    def _compute_validation_loss(self, batch_size: int = 256, num_negative: int = 1) -> float:
-        """Compute validation loss on validation set for early stopping."""
+    def _compute_embeddings(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Run the model over the full graph and return (user_embedding, item_embedding)"""
+        output = self._full_graph_forward()
+        if self.model_type in ['lightgcn', 'kgat']:
+            return output
+        return output[:self.num_students], output[self.num_students:]
+
+    def _forward_inputs(self) -> Tuple[torch.Tensor, ...]:
+        """Arguments of the model's full-graph forward"""
+        if self.model_type in ['lightgcn', 'kgat']:
+            return (self._propagation_graph(),)
+        return (self.graph.x, self._propagation_graph())
+
+    def _full_graph_forward(self):
+        """Model output over the full graph, through the compiled forward when enabled"""
+        forward = self.model if self.compiled_forward is None else self.compiled_forward
+        return forward(*self._forward_inputs())
+
+    def _mask_scores(self, scores: torch.Tensor, student_ids: torch.Tensor, semester_filter: int = 0) -> torch.Tensor:
+        """Set scores (num_students x num_courses) of excluded courses to -inf in place
+
+        Excludes each student's enrolled courses, then either every course not in
+        `semester_filter` (when > 0) or courses above the student's own semester.
+        """
+        self._mask_enrolled(scores, student_ids)
+        scores.masked_fill_(~self._semester_allowed(student_ids, semester_filter), -float('inf'))
+        return scores
+
+    def _mask_enrolled(self, scores: torch.Tensor, student_ids: torch.Tensor) -> torch.Tensor:
+        """Set the scores of each student's enrolled courses to -inf in place"""
+        rows, cols = [], []
+        for row, student_id in enumerate(student_ids.tolist()):
+            enrolled = self.user_positive_items.get(student_id, ())
+            rows.extend([row] * len(enrolled))
+            cols.extend(enrolled)
+        if rows:
+            scores[rows, cols] = -float('inf')
+        return scores
+
+    def _semester_allowed(self, student_ids: torch.Tensor, semester_filter: int = 0) -> torch.Tensor:
+        """Boolean mask of courses allowed by the semester filter, broadcastable to (num_students, num_courses)"""
+        if semester_filter > 0:
+            allowed = self.semester_course_masks.get(semester_filter)
+            if allowed is None:
+                allowed = torch.zeros(self.num_courses, dtype=torch.bool)
+            return allowed.unsqueeze(0)
+        return self.course_semesters.unsqueeze(0) <= self.student_semesters[student_ids].unsqueeze(1)
+
+    @staticmethod
+    def format_recommendations(course_ids: List[int], scores: List[float]) -> List[Dict]:
+        """Turn ranked (course_id, score) pairs into recommendation dicts, dropping masked entries"""
+        recommendations = []
+        for course_id, score in zip(course_ids, scores):
+            if score == -float('inf'):
+                break
+            # Ensure plain Python types for JSON serialization
+            recommendations.append({
+                'rank': len(recommendations) + 1,
+                'course_id': int(course_id),
+                'score': float(score)
+            })
+        return recommendations
+
+    def _build_semester_index(self):
+        """Index student and course semesters by id so semester filters are vectorized"""
+        self.student_semesters = torch.zeros(self.num_students, dtype=torch.long)
+        for s in self.data['students']:
+            self.student_semesters[s['student_id']] = int(s.get('semester', 0))
+        self.course_semesters = torch.zeros(self.num_courses, dtype=torch.long)
+        for c in self.data['courses']:
+            self.course_semesters[c['course_id']] = int(c.get('semester', 0))
+        # Precomputed "course belongs to semester s" masks for semester_filter > 0
+        self.semester_course_masks = {int(semester): self.course_semesters == semester
+                                      for semester in torch.unique(self.course_semesters).tolist()}
+
+    def _build_popularity_index(self):
+        """Count enrollments per course for the popularity fallback ranker"""
+        self.course_popularity = torch.zeros(self.num_courses, dtype=torch.float32)
+        course_ids = [e['course_id'] for e in self.data['enrollments'] if e['is_enrolled'] == 1]
+        if course_ids:
+            self.course_popularity.index_add_(0, torch.LongTensor(course_ids), torch.ones(len(course_ids)))
+
+    @staticmethod
+    def _course_codes(courses: List[Dict]) -> List[str]:
+        """Course code of every row; courses without one fall back to their row number"""
+        codes = [None] * len(courses)
+        for course in courses:
+            code = course.get('course_code')
+            codes[int(course['course_id'])] = str(code) if code is not None else str(course['course_id'])
+        return codes
+
+    def _build_course_code_index(self, course_codes: List[str]):
+        """Map each course code to the rows carrying it, in row order"""
+        self.course_codes = list(course_codes)
+        self.course_rows_by_code: Dict[str, List[int]] = {}
+        for row, code in enumerate(self.course_codes):
+            self.course_rows_by_code.setdefault(code, []).append(row)
+
+    def _check_id_maps(self, id_maps: Dict[str, List[str]], filepath: str):
+        """Warn when the checkpoint's rows belong to different students/courses than the dataset's rows"""
+        for name, id_map in (('students', self.student_id_map), ('courses', self.course_id_map)):
+            saved = id_maps.get(name, [])
+            shared = min(len(saved), len(id_map))
+            mismatched = sum(1 for row in range(shared) if saved[row] != id_map.external_id(row))
+            if mismatched or len(saved) != len(id_map):
+                print(f"Warning: checkpoint '{filepath}' maps {len(saved)} {name}, the dataset {len(id_map)}; "
+                      f"{mismatched} shared row(s) hold a different id")
+
+    def _require_graph(self, operation: str):
+        if self.graph is None:
+            raise RuntimeError(f"{operation} needs the graph and weights; this model was booted from a "
+                               f"read-only serving snapshot")
+
+    def _invalidate_embeddings(self):
+        """Drop cached serving embeddings after the weights change"""
+        self.model_version += 1
+        self.user_embedding_cache = None
+        self.item_embedding_cache = None
+        self.delta_propagator = None
+
+    def _edit_edge_index(self, added: List[Tuple[int, int]], removed: List[Tuple[int, int]]) -> torch.Tensor:
+        """Return a copy of the bidirectional edge_index with enrollment edges added/removed"""
+        edge_index = self.graph.edge_index
+        keep = torch.ones(edge_index.size(1), dtype=torch.bool)
+        src, dst = edge_index
+        for student_id, course_id in removed:
+            course_node = course_id + self.num_students
+            # Remove one occurrence of each direction
+            for a, b in ((student_id, course_node), (course_node, student_id)):
+                match = ((src == a) & (dst == b) & keep).nonzero(as_tuple=True)[0]
+                if len(match) == 0:
+                    raise ValueError(f"Enrollment ({student_id}, {course_id}) is not in the graph")
+                keep[match[0]] = False
+        edge_index = edge_index[:, keep]
+
+        if added:
+            students = torch.LongTensor([s for s, _ in added])
+            courses = torch.LongTensor([c + self.num_students for _, c in added])
+            new_edges = torch.stack([torch.cat([students, courses]), torch.cat([courses, students])])
+            edge_index = torch.cat([edge_index, new_edges], dim=1)
+        return edge_index
+
+    def _validation_negatives(self, num_negative: int) -> torch.Tensor:
+        """(num_valid, num_negative) validation negatives, sampled once per training run and then reused"""
+        if self.valid_negatives is None or self.valid_negatives.size(1) != num_negative:
+            user_ids = torch.LongTensor([user_id for user_id, _ in self.valid_samples])
+            self.valid_negatives = self._negative_sampling(user_ids, num_negative).view(-1, num_negative)
+        return self.valid_negatives
+
+    def _compute_validation_loss(self, num_negative: int = 1) -> float:
+        """Compute validation BPR loss for early stopping.
+
+        The weights do not change during validation, so the graph is propagated
+        once and the loss is computed over the whole validation set in one shot.
+        Negatives are fixed for the whole run, so epoch-to-epoch changes in the
+        loss reflect the weights only.
+        """
+        if len(self.valid_samples) == 0:
+            return float('inf')
+        if num_negative < 1:
+            raise ValueError("num_negative must be >= 1")
         self.model.eval()
-        total_val_loss = 0
-        num_batches = 0
-        
+
         with torch.no_grad():
-            for i in range(0, len(self.valid_samples), batch_size):
-                batch = self.valid_samples[i:i + batch_size]
-                user_ids = [s[0] for s in batch]
-                positive_items = [s[1] for s in batch]
-                
-                # Negative sampling for validation
-                negative_samples = self._negative_sampling(user_ids, num_negative)
-                negative_items = [s[1] for s in negative_samples]
-                
-                # Forward pass
-                if self.model_type in ['lightgcn', 'kgat']:
-                    user_embedding, item_embedding = self.model(self.graph.edge_index)
-                    users = user_embedding[user_ids]
-                    positive_items_embedding = item_embedding[positive_items]
-                    negative_items_embedding = item_embedding[negative_items]
-                else:  # GCN, GraphSAGE
-                    embeddings = self.model(self.graph.x, self.graph.edge_index)
-                    users = embeddings[user_ids]
-                    positive_items_embedding = embeddings[[p + self.num_students for p in positive_items]]
-                    negative_items_embedding = embeddings[[n + self.num_students for n in negative_items]]
-                
-                # Reshape negatives
-                if num_negative > 0:
-                    expected = len(user_ids) * num_negative
-                    if negative_items_embedding.size(0) == expected:
-                        negative_items_embedding = negative_items_embedding.view(len(user_ids), num_negative, -1)
-                    else:
-                        # Handle edge case where batch doesn't divide evenly
-                        continue
-                
-                # Compute BPR loss
-                positive_scores = (users * positive_items_embedding).sum(dim=1, keepdim=True)
-                negative_scores = (users.unsqueeze(1) * negative_items_embedding).sum(dim=2)
-                loss = -F.logsigmoid(positive_scores - negative_scores).mean()
-                
-                total_val_loss += loss.item()
-                num_batches += 1
-        
-        return total_val_loss / num_batches if num_batches > 0 else float('inf')
+            user_embedding, item_embedding = self._compute_embeddings()
+            valid = torch.LongTensor(self.valid_samples)
+            user_ids, positive_items = valid[:, 0], valid[:, 1]
+            negative_items = self._validation_negatives(num_negative)
+
+            users = user_embedding[user_ids]
+            positive_scores = (users * item_embedding[positive_items]).sum(dim=1, keepdim=True)
+            negative_scores = (users.unsqueeze(1) * item_embedding[negative_items]).sum(dim=2)
+            return -F.logsigmoid(positive_scores - negative_scores).mean().item()
     
     def _prepare_training_data(self):
         """Prepare train/validation/test split"""
@@ -603,21 +1076,55 @@ class CourseRecommendationModel:
                 self.valid_samples = [positive_samples[i] for i in valid_idx.tolist()]
                 self.test_samples = [positive_samples[i] for i in test_idx.tolist()]
             
+        self.train_samples = torch.LongTensor(self.train_samples).view(-1, 2)
+        self.valid_negatives = None
+
         # Create user-item matrix for negative sampling
+        self._build_exclusion_index(positive_samples)
+
+    def _build_exclusion_index(self, positive_samples: List[Tuple[int, int]] = None):
+        """Build user_positive_items (courses excluded from a student's recommendations)
+
+        Defaults to every enrolled (student_id, course_id) pair in the dataset.
+        """
+        if positive_samples is None:
+            positive_samples = [(e['student_id'], e['course_id']) for e in self.data['enrollments']
+                                if e['is_enrolled'] == 1]
         self.user_positive_items = defaultdict(set)
         for student_id, course_id in positive_samples:
             self.user_positive_items[student_id].add(course_id)
+        # Sorted positive keys for the vectorized negative sampler; built on first use
+        self.positive_keys = None
 
-    def _negative_sampling(self, user_ids: List[int], num_negative: int = 1) -> List[Tuple[int, int]]:
-        """Sample negative items for users"""
-        negative_samples = []
-        for user_id in user_ids:
-            positive_items = self.user_positive_items[user_id]
+    def _negative_sampling(self, user_ids: List[int], num_negative: int = 1,
+                           rng: Optional[np.random.RandomState] = None) -> torch.Tensor:
+        """Sample num_negative items per user that are not among the user's positives
+
+        All candidates are drawn at once; collisions with a positive are found by
+        binary search in the sorted (user * num_courses + item) keys and only those
+        are redrawn. Returns a LongTensor of len(user_ids) * num_negative item ids,
+        grouped by user. rng defaults to the global numpy RNG.
+        """
+        rng = np.random if rng is None else rng
+        if self.positive_keys is None:
+            self._build_negative_sampling_index()
+        users = np.repeat(np.asarray(user_ids, dtype=np.int64), num_negative)
+        if self.saturated_users and not self.saturated_users.isdisjoint(users.tolist()):
+            raise ValueError("Cannot sample negatives for a user who is positive on every course")
 
-            for _ in range(num_negative):
-                negative_item = np.random.randint(0, self.num_courses)
-                while negative_item in positive_items:
-                    negative_item = np.random.randint(0, self.num_courses)
+        items = rng.randint(0, self.num_courses, size=len(users))
+        pending = np.arange(len(users))
+        while len(pending) and len(self.positive_keys):
+            keys = users[pending] * self.num_courses + items[pending]
+            positions = np.minimum(np.searchsorted(self.positive_keys, keys), len(self.positive_keys) - 1)
+            pending = pending[self.positive_keys[positions] == keys]
+            items[pending] = rng.randint(0, self.num_courses, size=len(pending))
+        return torch.from_numpy(items)
 
-                negative_samples.append((user_id, negative_item))
-        return negative_samples
\ No newline at end of file
+    def _build_negative_sampling_index(self):
+        """Sorted (user * num_courses + item) keys of every positive pair, used by _negative_sampling"""
+        pairs = [(user_id, item) for user_id, items in self.user_positive_items.items() for item in items]
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self.positive_keys = np.unique(pairs[:, 0] * self.num_courses + pairs[:, 1])
+        counts = np.bincount(self.positive_keys // self.num_courses) if len(self.positive_keys) else np.zeros(0)
+        self.saturated_users = set(np.nonzero(counts >= self.num_courses)[0].tolist())
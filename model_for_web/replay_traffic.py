@@ -0,0 +1,114 @@
+import argparse
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+import grpc
+import numpy as np
+
+import service_pb2
+import service_pb2_grpc
+from traffic_capture import load_captured_requests
+
+
+def replay(records: List[Dict], target: str = 'localhost:50051', speed: float = 1.0,
+           timeout: float = 5.0) -> Dict:
+    """Re-drive captured requests against a running server, preserving their relative timing
+
+    Requests are sent open-loop: each one is issued at its captured offset divided
+    by `speed`, whether or not earlier responses have arrived, so bursts are
+    reproduced as bursts. A speed of 0 sends everything as fast as possible.
+
+    Returns:
+        summary with latency percentiles in milliseconds, error and tier counts
+    """
+    channel = grpc.insecure_channel(target)
+    grpc.channel_ready_future(channel).result(timeout=timeout)
+    stub = service_pb2_grpc.MLServiceStub(channel)
+
+    latencies, errors, tiers = [], Counter(), Counter()
+    lock = threading.Lock()
+    pending = threading.Semaphore(0)
+    max_lag = 0.0
+
+    def on_done(future, sent_at):
+        latency = time.perf_counter() - sent_at
+        with lock:
+            if future.exception() is not None:
+                errors[future.exception().code().name] += 1
+            else:
+                latencies.append(latency)
+                tiers[future.result().tier or 'unknown'] += 1
+        pending.release()
+
+    start = time.perf_counter()
+    first_ts = records[0]['ts'] if records else 0.0
+    for record in records:
+        if speed > 0:
+            due = start + (record['ts'] - first_ts) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        request = service_pb2.StudentInfo(
+            student_id=record['student_id'], semester_filter=record['semester_filter'], k=record['k'],
+            semester_filters=record['semester_filters'], all_semesters=record['all_semesters'],
+            cursor=record['cursor'], student_code=record.get('student_code', ''))
+        sent_at = time.perf_counter()
+        future = stub.RecommendationService.future(request, timeout=timeout)
+        future.add_done_callback(lambda f, sent_at=sent_at: on_done(f, sent_at))
+
+    for _ in records:
+        pending.acquire()
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    summary = {
+        'requests': len(records),
+        'succeeded': len(latencies),
+        'errors': dict(errors),
+        'tiers': dict(tiers),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(records) / elapsed if elapsed > 0 else float('inf'),
+        'max_schedule_lag_ms': max_lag * 1000
+    }
+    if len(latencies_ms):
+        for p in (50, 90, 99, 99.9):
+            summary[f'p{p}_ms'] = float(np.percentile(latencies_ms, p))
+        summary['max_ms'] = float(latencies_ms.max())
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured recommendation traffic against a server')
+    parser.add_argument('--capture', required=True, help='Capture directory, file or glob of .jsonl files')
+    parser.add_argument('--target', default='localhost:50051', help='Server address')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed multiplier (1 = real time, 10 = ten times faster, 0 = unthrottled)')
+    parser.add_argument('--timeout', type=float, default=5.0, help='Per-request deadline in seconds')
+    parser.add_argument('--limit', type=int, default=0, help='Replay only the first N captured requests')
+    args = parser.parse_args()
+
+    records = load_captured_requests(args.capture)
+    if args.limit > 0:
+        records = records[:args.limit]
+    if not records:
+        print(f"No captured requests found in '{args.capture}'")
+        return
+    span = records[-1]['ts'] - records[0]['ts']
+    print(f"Replaying {len(records)} request(s) captured over {span:.1f}s at {args.speed:g}x against {args.target}")
+
+    summary = replay(records, target=args.target, speed=args.speed, timeout=args.timeout)
+    print(f"Finished in {summary['elapsed_s']:.2f}s - {summary['throughput_rps']:.0f} requests/s, "
+          f"max schedule lag {summary['max_schedule_lag_ms']:.1f}ms")
+    print(f"Succeeded: {summary['succeeded']}, errors: {summary['errors'] or 0}, tiers: {summary['tiers']}")
+    if summary['succeeded']:
+        print("Latency (ms): " + ", ".join(f"{name[:-3]}={summary[name]:.2f}"
+                                           for name in ('p50_ms', 'p90_ms', 'p99_ms', 'p99.9_ms', 'max_ms')))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,21 +8,55 @@ import sys
 import os
 
 
-from main import call_model_recommendation_system
+from main import get_serving_model, get_serving_stats, serve_related_courses, serve_with_fallback
+from main import resolve_course_id, resolve_student_id
+from main import TRAFFIC_CAPTURE_DIR, TRAFFIC_CAPTURE_MAX_BYTES, TRAFFIC_CAPTURE_BACKUP_COUNT
+from traffic_capture import TrafficRecorder
 
 
 class MLService(service_pb2_grpc.MLServiceServicer):
+    def __init__(self, recorder: TrafficRecorder = None):
+        self.recorder = recorder
+
     def RecommendationService(self, request, context):
-        student_id = request.student_id
+        if self.recorder is not None:
+            self.recorder.record(request)
         semester_filter = request.semester_filter
         k = request.k
-        recommendations = call_model_recommendation_system(student_id, semester_filter, k)
+        # Multi-semester mode returns one top-k list per semester: {"<semester>": [...], ...}
+        multi_semester = bool(request.semester_filters) or request.all_semesters
+        try:
+            student_id = resolve_student_id(request.student_id, request.student_code)
+            recommendations, next_cursor, tier = serve_with_fallback(
+                student_id, semester_filter, k, cursor=request.cursor,
+                semester_filters=list(request.semester_filters), multi_semester=multi_semester,
+                time_remaining=context.time_remaining())
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         response = json.dumps(recommendations)
-        return service_pb2.CoursesInfo(data=response)
+        return service_pb2.CoursesInfo(data=response, next_cursor=next_cursor, tier=tier)
+
+    def RelatedCourses(self, request, context):
+        try:
+            course_id = resolve_course_id(request.course_id, request.course_code)
+            related = serve_related_courses(course_id, request.k)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        return service_pb2.CoursesInfo(data=json.dumps(related))
+
+    def ServingStats(self, request, context):
+        return service_pb2.CoursesInfo(data=json.dumps(get_serving_stats()))
     
 def serve():
+    # Build the serving model before accepting traffic so the first request is not slow
+    get_serving_model()
+    recorder = None
+    if TRAFFIC_CAPTURE_DIR:
+        recorder = TrafficRecorder(TRAFFIC_CAPTURE_DIR, max_bytes=TRAFFIC_CAPTURE_MAX_BYTES,
+                                   backup_count=TRAFFIC_CAPTURE_BACKUP_COUNT)
+        print(f"Capturing recommendation traffic to '{recorder.filepath}'")
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    service_pb2_grpc.add_MLServiceServicer_to_server(MLService(), server)
+    service_pb2_grpc.add_MLServiceServicer_to_server(MLService(recorder), server)
     server.add_insecure_port('[::]:50051')
     server.start()
     print("gRPC server started on port 50051")
@@ -31,6 +65,8 @@ def serve():
             time.sleep(86400)  # Sleep for one day
     except KeyboardInterrupt:
         server.stop(0)
+        if recorder is not None:
+            recorder.close()
 
 if __name__ == '__main__':
     serve()
\ No newline at end of file
@@ -24,17 +24,21 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rservice.proto\"E\n\x0bStudentInfo\x12\x12\n\nstudent_id\x18\x01 \x01(\x05\x12\x17\n\x0fsemester_filter\x18\x02 \x01(\x05\x12\t\n\x01k\x18\x03 \x01(\x05\"\x1b\n\x0b\x43oursesInfo\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\t2@\n\tMLService\x12\x33\n\x15RecommendationService\x12\x0c.StudentInfo\x1a\x0c.CoursesInfob\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rservice.proto\"\x9c\x01\n\x0bStudentInfo\x12\x12\n\nstudent_id\x18\x01 \x01(\x05\x12\x17\n\x0fsemester_filter\x18\x02 \x01(\x05\x12\t\n\x01k\x18\x03 \x01(\x05\x12\x18\n\x10semester_filters\x18\x04 \x03(\x05\x12\x15\n\rall_semesters\x18\x05 \x01(\x08\x12\x0e\n\x06\x63ursor\x18\x06 \x01(\t\x12\x14\n\x0cstudent_code\x18\x07 \x01(\t\"?\n\nCourseInfo\x12\x11\n\tcourse_id\x18\x01 \x01(\x05\x12\t\n\x01k\x18\x02 \x01(\x05\x12\x13\n\x0b\x63ourse_code\x18\x03 \x01(\t\"\x0e\n\x0cStatsRequest\">\n\x0b\x43oursesInfo\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\t\x12\x13\n\x0bnext_cursor\x18\x02 \x01(\t\x12\x0c\n\x04tier\x18\x03 \x01(\t2\x9a\x01\n\tMLService\x12\x33\n\x15RecommendationService\x12\x0c.StudentInfo\x1a\x0c.CoursesInfo\x12+\n\x0eRelatedCourses\x12\x0b.CourseInfo\x1a\x0c.CoursesInfo\x12+\n\x0cServingStats\x12\r.StatsRequest\x1a\x0c.CoursesInfob\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'service_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_STUDENTINFO']._serialized_start=17
-  _globals['_STUDENTINFO']._serialized_end=86
-  _globals['_COURSESINFO']._serialized_start=88
-  _globals['_COURSESINFO']._serialized_end=115
-  _globals['_MLSERVICE']._serialized_start=117
-  _globals['_MLSERVICE']._serialized_end=181
+  _globals['_STUDENTINFO']._serialized_start=18
+  _globals['_STUDENTINFO']._serialized_end=174
+  _globals['_COURSEINFO']._serialized_start=176
+  _globals['_COURSEINFO']._serialized_end=239
+  _globals['_STATSREQUEST']._serialized_start=241
+  _globals['_STATSREQUEST']._serialized_end=255
+  _globals['_COURSESINFO']._serialized_start=257
+  _globals['_COURSESINFO']._serialized_end=319
+  _globals['_MLSERVICE']._serialized_start=322
+  _globals['_MLSERVICE']._serialized_end=476
 # @@protoc_insertion_point(module_scope)
@@ -39,6 +39,16 @@ class MLServiceStub(object):
                 request_serializer=service__pb2.StudentInfo.SerializeToString,
                 response_deserializer=service__pb2.CoursesInfo.FromString,
                 _registered_method=True)
+        self.RelatedCourses = channel.unary_unary(
+                '/MLService/RelatedCourses',
+                request_serializer=service__pb2.CourseInfo.SerializeToString,
+                response_deserializer=service__pb2.CoursesInfo.FromString,
+                _registered_method=True)
+        self.ServingStats = channel.unary_unary(
+                '/MLService/ServingStats',
+                request_serializer=service__pb2.StatsRequest.SerializeToString,
+                response_deserializer=service__pb2.CoursesInfo.FromString,
+                _registered_method=True)
 
 
 class MLServiceServicer(object):
@@ -50,6 +60,20 @@ class MLServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RelatedCourses(self, request, context):
+        """Courses most similar to CourseInfo.course_id, as a JSON list in CoursesInfo.data
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ServingStats(self, request, context):
+        """Serving counters as a JSON object in CoursesInfo.data
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_MLServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +82,16 @@ def add_MLServiceServicer_to_server(servicer, server):
                     request_deserializer=service__pb2.StudentInfo.FromString,
                     response_serializer=service__pb2.CoursesInfo.SerializeToString,
             ),
+            'RelatedCourses': grpc.unary_unary_rpc_method_handler(
+                    servicer.RelatedCourses,
+                    request_deserializer=service__pb2.CourseInfo.FromString,
+                    response_serializer=service__pb2.CoursesInfo.SerializeToString,
+            ),
+            'ServingStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.ServingStats,
+                    request_deserializer=service__pb2.StatsRequest.FromString,
+                    response_serializer=service__pb2.CoursesInfo.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'MLService', rpc_method_handlers)
@@ -95,3 +129,57 @@ class MLService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def RelatedCourses(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MLService/RelatedCourses',
+            service__pb2.CourseInfo.SerializeToString,
+            service__pb2.CoursesInfo.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ServingStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MLService/ServingStats',
+            service__pb2.StatsRequest.SerializeToString,
+            service__pb2.CoursesInfo.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,169 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import base64
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after insertion"""
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        """
+        Args:
+            max_entries: maximum number of entries kept; the least recently used is evicted first
+            ttl: lifetime of an entry in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RankingPaginator:
+    """Serve "show more" pages from a short-lived cached ranking.
+
+    The first page ranks up to `max_ranked` allowed courses once and caches them
+    under (student_id, semester_filter, model_version). The returned cursor is an
+    opaque token holding that key and the next offset, so follow-up pages are
+    slices of the cached ordering. If the entry expired or the model changed,
+    the ranking is recomputed with the current model and paging continues
+    from the same offset.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, max_ranked: int = 200,
+                 local_inference: bool = False):
+        """local_inference: rank with model.rank_courses(local_inference=True) where the model supports it"""
+        self.rankings = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.max_ranked = max_ranked
+        self.local_inference = local_inference
+
+    def page(self, model, student_id: int = 0, semester_filter: int = 0, k: int = 10,
+             cursor: str = '') -> Tuple[List[Dict], str]:
+        """Return (recommendations, next_cursor); next_cursor is '' on the last page
+
+        A cursor continues the request it was issued for: a ValueError is raised
+        when its student_id or semester_filter differs from the request's.
+        """
+        if not 0 <= student_id < model.num_students:
+            raise ValueError(f"student_id {student_id} is out of range [0, {model.num_students})")
+        offset = 0
+        if cursor:
+            cursor_student_id, cursor_semester_filter, offset = self.decode_cursor(cursor)
+            if (cursor_student_id, cursor_semester_filter) != (student_id, semester_filter):
+                raise ValueError(f"Recommendation cursor belongs to student_id {cursor_student_id} and "
+                                 f"semester_filter {cursor_semester_filter}, not to this request")
+
+        key = (student_id, semester_filter, model.model_version)
+        ranking = self.rankings.get(key)
+        if ranking is None:
+            local_inference = self.local_inference and model.local_inference_available
+            course_ids, scores = model.rank_courses(student_id, semester_filter, limit=self.max_ranked,
+                                                    local_inference=local_inference)
+            ranking = (course_ids.astype(np.int32), scores.astype(np.float32))
+            self.rankings.put(key, ranking)
+
+        course_ids, scores = ranking
+        end = offset + k
+        recommendations = [{'rank': offset + i + 1, 'course_id': int(c), 'score': float(s)}
+                           for i, (c, s) in enumerate(zip(course_ids[offset:end], scores[offset:end]))]
+        next_cursor = self.encode_cursor(student_id, semester_filter, end) if end < len(course_ids) else ''
+        return recommendations, next_cursor
+
+    @staticmethod
+    def encode_cursor(student_id: int, semester_filter: int, offset: int) -> str:
+        payload = json.dumps([int(student_id), int(semester_filter), int(offset)], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, int, int]:
+        try:
+            student_id, semester_filter, offset = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            student_id, semester_filter, offset = int(student_id), int(semester_filter), int(offset)
+        except Exception:
+            raise ValueError(f"Invalid recommendation cursor: {cursor!r}")
+        if offset < 0:
+            raise ValueError(f"Invalid recommendation cursor: {cursor!r} (negative offset)")
+        return student_id, semester_filter, offset
+
+
+class SingleFlight:
+    """Collapse identical concurrent calls onto one computation.
+
+    The first caller for a key runs the function; callers arriving with the same
+    key while it is in flight wait and receive the same result (or exception).
+    Nothing is cached once the call completes.
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls: Dict[Hashable, 'SingleFlight._Call'] = {}
+        self._lock = threading.Lock()
+        self.num_calls = 0
+        self.num_executions = 0
+        self.num_deduplicated = 0
+
+    def do(self, key: Hashable, fn, *args, **kwargs):
+        with self._lock:
+            self.num_calls += 1
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = SingleFlight._Call()
+                self._calls[key] = call
+                self.num_executions += 1
+            else:
+                self.num_deduplicated += 1
+
+        if is_leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'calls': self.num_calls,
+                'executions': self.num_executions,
+                'deduplicated': self.num_deduplicated,
+                'in_flight': len(self._calls)
+            }
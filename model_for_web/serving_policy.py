@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
+from contextlib import contextmanager
+import threading
+
+
+class TierSelector:
+    """Pick a ranker tier per request from the remaining deadline and current load.
+
+    Tiers are ordered from best (most expensive) to cheapest. Each tier declares
+    the minimum remaining deadline in seconds it needs and the maximum number of
+    requests in flight it tolerates (None means no limit). A request gets the
+    first tier whose requirements hold; the last tier is always accepted.
+    """
+    def __init__(self, tiers: List[Tuple[str, float, Optional[int]]]):
+        """
+        Args:
+            tiers: (name, min_time_remaining, max_in_flight) tuples, best tier first
+        """
+        if not tiers:
+            raise ValueError("At least one tier is required")
+        self.tiers = tiers
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.tier_counts = defaultdict(int)
+
+    @contextmanager
+    def track(self):
+        """Count the enclosed request as in flight; yields the in-flight count including it"""
+        with self._lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        try:
+            yield in_flight
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def choose(self, time_remaining: Optional[float], in_flight: int) -> str:
+        """Return the name of the tier to use
+
+        Args:
+            time_remaining: seconds left before the request deadline (None when there is no deadline)
+            in_flight: number of requests currently being served, this one included
+        """
+        for name, min_time_remaining, max_in_flight in self.tiers[:-1]:
+            if time_remaining is not None and time_remaining < min_time_remaining:
+                continue
+            if max_in_flight is not None and in_flight > max_in_flight:
+                continue
+            return name
+        return self.tiers[-1][0]
+
+    def record(self, tier: str):
+        with self._lock:
+            self.tier_counts[tier] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'in_flight': self._in_flight, 'tier_counts': dict(self.tier_counts)}
@@ -0,0 +1,154 @@
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+from checkpointing import save_atomic
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+
+class CsrRows:
+    """Read-only per-row sets stored as CSR arrays, with the dict.get interface of user_positive_items
+
+    `rows.get(student_id, ())` returns the student's course ids as an array slice,
+    which supports len(), iteration and `in` like the set it replaces.
+    """
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_sets(cls, sets: Dict[int, set], num_rows: int) -> 'CsrRows':
+        counts = np.zeros(num_rows, dtype=np.int64)
+        for row, values in sets.items():
+            counts[row] = len(values)
+        indptr = np.zeros(num_rows + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=np.int64)
+        for row, values in sets.items():
+            indices[indptr[row]:indptr[row + 1]] = sorted(values)
+        return cls(indptr, indices)
+
+    def get(self, row: int, default=()):
+        if not 0 <= row < len(self.indptr) - 1:
+            return default
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def __getitem__(self, row: int):
+        return self.get(row)
+
+
+def save_snapshot(filepath: str, model, cohort_cache=None, course_similarity=None,
+                  sources: Optional[Dict[str, str]] = None):
+    """Serialize the fully initialized serving state into one memory-mappable file
+
+    Args:
+        filepath: destination file; written to a temporary name and renamed, so readers never see a partial file
+        model: inference-ready CourseRecommendationModel (embeddings are computed if needed)
+        cohort_cache: optional built CohortCache
+        course_similarity: optional built CourseSimilarityIndex
+        sources: optional {name: filepath} of the inputs (checkpoint, dataset) recorded with their mtimes
+    """
+    user_embedding, item_embedding = model.get_embeddings()
+    semesters = sorted(model.semester_course_masks)
+    exclusions = model.user_positive_items
+    if not isinstance(exclusions, CsrRows):
+        exclusions = CsrRows.from_sets(exclusions, model.num_students)
+
+    snapshot = {
+        'meta': {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'model_version': model.model_version,
+            'model_type': model.model_type,
+            'embedding_dim': model.embedding_dim,
+            'num_layers': model.num_layers,
+            'sparse_propagation': model.sparse_propagation,
+            'num_students': model.num_students,
+            'num_courses': model.num_courses,
+            'created_at': time.time(),
+            'sources': {name: [path, os.path.getmtime(path)] for name, path in (sources or {}).items()}
+        },
+        'user_embedding': user_embedding.detach().contiguous().clone(),
+        'item_embedding': item_embedding.detach().contiguous().clone(),
+        'student_semesters': model.student_semesters.clone(),
+        'course_semesters': model.course_semesters.clone(),
+        'course_popularity': model.course_popularity.clone(),
+        'mask_semesters': torch.LongTensor(semesters),
+        'semester_course_masks': torch.stack([model.semester_course_masks[s] for s in semesters]),
+        'exclusion_indptr': torch.from_numpy(exclusions.indptr.copy()),
+        'exclusion_indices': torch.from_numpy(exclusions.indices.copy()),
+        'student_ids': model.student_id_map.state_dict(),
+        'course_ids': model.course_id_map.state_dict(),
+        'course_codes': list(model.course_codes)
+    }
+    if cohort_cache is not None:
+        snapshot['cohort'] = {
+            'assignments': cohort_cache.assignments.clone(),
+            'buckets': [[mode, s] for mode, s in cohort_cache.bucket_index],
+            'top_courses': cohort_cache.top_courses.contiguous().clone(),
+            'top_scores': cohort_cache.top_scores.contiguous().clone(),
+            'model_version': cohort_cache.model_version
+        }
+    if course_similarity is not None:
+        snapshot['related'] = {
+            'neighbors': torch.from_numpy(course_similarity.neighbors.copy()),
+            'scores': torch.from_numpy(course_similarity.scores.copy()),
+            'model_version': course_similarity.model_version
+        }
+
+    save_atomic(snapshot, filepath)
+
+
+def load_snapshot(filepath: str) -> Dict:
+    """Memory-map a snapshot file; tensors are paged in lazily and shared between worker processes"""
+    snapshot = torch.load(filepath, mmap=True, weights_only=True)
+    format_version = snapshot['meta']['format_version']
+    if format_version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {format_version} in '{filepath}' "
+                         f"(expected {SNAPSHOT_FORMAT_VERSION})")
+    return snapshot
+
+
+def is_snapshot_current(snapshot: Dict) -> bool:
+    """True when every recorded source file still has the mtime it had when the snapshot was written"""
+    for path, mtime in snapshot['meta']['sources'].values():
+        if not os.path.exists(path) or os.path.getmtime(path) != mtime:
+            return False
+    return True
+
+
+def snapshot_mismatches(snapshot: Dict, expected: Dict) -> List[str]:
+    """Describe every setting in `expected` (e.g. {'num_layers': 3}) that differs from the snapshot header"""
+    meta = snapshot['meta']
+    return [f"{name}={meta.get(name)!r}, expected {value!r}"
+            for name, value in expected.items() if meta.get(name) != value]
+
+
+def main():
+    from main import build_serving_state, PREPROCESSED_DATASET_FILEPATH, SERVING_SNAPSHOT_FILEPATH, \
+        TRAINED_MODEL_FILEPATH
+
+    parser = argparse.ArgumentParser(description='Write a serving snapshot for fast worker boot')
+    parser.add_argument('--output', default=SERVING_SNAPSHOT_FILEPATH, help='Snapshot file to write')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    model, cohort_cache, course_similarity = build_serving_state()
+    build_time = time.time() - start_time
+    save_snapshot(args.output, model, cohort_cache, course_similarity,
+                  sources={'checkpoint': TRAINED_MODEL_FILEPATH, 'dataset': PREPROCESSED_DATASET_FILEPATH})
+
+    start_time = time.time()
+    load_snapshot(args.output)
+    load_time = time.time() - start_time
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"Serving state built in {build_time:.2f}s; snapshot written to '{args.output}' ({size_mb:.1f} MB), "
+          f"maps in {load_time * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import json
+import os
+
+import pytest
+
+from id_mapping import IdMapping
+
+DATASET_FILEPATH = os.path.join(os.path.dirname(__file__), 'data', 'preprocessed-dataset_500-students_132-courses.json')
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    with open(DATASET_FILEPATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_shipped_dataset_maps_every_row(dataset):
+    students = IdMapping.from_records(dataset['students'], 'student_code', 'student_id')
+    courses = IdMapping.from_records(dataset['courses'], 'course_id', 'course_id')
+    assert len(students) == len(dataset['students'])
+    assert len(courses) == len(dataset['courses'])
+    for student in dataset['students']:
+        assert students.row(str(student['student_code'])) == student['student_id']
+
+
+def test_shipped_course_codes_are_not_unique(dataset):
+    # Re-opened courses keep their code, which is why courses are keyed on course_id
+    with pytest.raises(ValueError, match='repeated'):
+        IdMapping.from_records(dataset['courses'], 'course_code', 'course_id')
+
+
+def test_rejects_missing_and_repeated_rows():
+    with pytest.raises(ValueError, match='no external id'):
+        IdMapping(['a', None, 'c'])
+    with pytest.raises(ValueError, match='more than one record'):
+        IdMapping.from_records([{'code': 'a', 'row': 0}, {'code': 'b', 'row': 0}], 'code', 'row')
+    with pytest.raises(ValueError, match='not a dense row index'):
+        IdMapping.from_records([{'code': 'a', 'row': 1}], 'code', 'row')
@@ -0,0 +1,74 @@
+from typing import Dict, Iterator, List
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+
+class TrafficRecorder:
+    """Append incoming recommendation requests with timestamps to a rotating JSONL log.
+
+    The request thread only formats a small dict and puts it on an in-memory
+    queue; a background listener thread does the file writes and rotation, so
+    capturing adds a few microseconds per request. Files are named
+    `<prefix>.jsonl`, `<prefix>.jsonl.1`, ... with `.1` the most recent rotated file.
+    """
+    def __init__(self, directory: str, prefix: str = 'traffic', max_bytes: int = 64 * 1024 * 1024,
+                 backup_count: int = 10):
+        """
+        Args:
+            directory: folder receiving the capture files (created if missing)
+            max_bytes: size at which the current file is rotated
+            backup_count: number of rotated files kept; older ones are deleted
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.filepath = os.path.join(directory, f'{prefix}.jsonl')
+        self._queue = queue.SimpleQueue()
+        file_handler = logging.handlers.RotatingFileHandler(self.filepath, maxBytes=max_bytes,
+                                                            backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        self._listener = logging.handlers.QueueListener(self._queue, file_handler)
+        self._logger = logging.getLogger(f'traffic_capture.{self.filepath}')
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+        self._listener.start()
+
+    def record(self, request):
+        """Capture one StudentInfo request"""
+        self._logger.info(json.dumps({
+            'ts': time.time(),
+            'student_id': request.student_id,
+            'semester_filter': request.semester_filter,
+            'k': request.k,
+            'semester_filters': list(request.semester_filters),
+            'all_semesters': request.all_semesters,
+            'cursor': request.cursor,
+            'student_code': request.student_code
+        }, separators=(',', ':')))
+
+    def close(self):
+        """Flush pending records and stop the writer thread"""
+        self._listener.stop()
+
+
+def load_captured_requests(path: str) -> List[Dict]:
+    """Read a capture directory, file or glob and return the records sorted by timestamp"""
+    if os.path.isdir(path):
+        filepaths = glob.glob(os.path.join(path, '*.jsonl*'))
+    else:
+        filepaths = glob.glob(path)
+    records = [record for filepath in filepaths for record in _read_jsonl(filepath)]
+    records.sort(key=lambda r: r['ts'])
+    return records
+
+
+def _read_jsonl(filepath: str) -> Iterator[Dict]:
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)